@@ -1,11 +1,122 @@
 """Main module."""
 
-from app.session import ChatSession
+import argparse
+import sys
+from pathlib import Path
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        prog="sai",
+        description="Chat with your Ollama models from the terminal.",
+        epilog="Without -p and with a terminal on stdin, sai starts an interactive chat.",
+    )
+    parser.add_argument(
+        "-p", "--prompt", help="answer a single prompt, printing raw text to stdout"
+    )
+    parser.add_argument(
+        "-i",
+        "--input",
+        metavar="FILE",
+        help="add the contents of FILE to the prompt, or of stdin with -",
+    )
+    parser.add_argument("-m", "--model", help="model to use instead of the configured one")
+    parser.add_argument("-r", "--role", help="role to use instead of the configured one")
+    parser.add_argument(
+        "--no-cache", action="store_true", help="ignore the response cache for this run"
+    )
+    parser.add_argument(
+        "--format",
+        metavar="json|SCHEMA_FILE",
+        help="with -p, answer in JSON, matching the JSON schema of a file if given",
+    )
+    parser.add_argument(
+        "--tools",
+        nargs="?",
+        const="",
+        metavar="NAME,...",
+        help="with -p, let the model call local tools: all of them, or the listed ones",
+    )
+
+    commands = parser.add_subparsers(dest="command")
+    batch = commands.add_parser(
+        "batch",
+        help="run the prompts of a JSONL or CSV file",
+        description=(
+            "Run every prompt of a JSONL or CSV file (fields: prompt, and optionally "
+            "id, role, model) and write the answers to a JSONL file as they complete."
+        ),
+    )
+    batch.add_argument("input", type=Path, help="JSONL or CSV file with the prompts")
+    batch.add_argument(
+        "-o", "--output", type=Path, help="output JSONL file (default: <input>.out.jsonl)"
+    )
+    batch.add_argument(
+        "-c", "--concurrency", type=int, default=4, help="parallel requests per host"
+    )
+    batch.add_argument(
+        "--host",
+        action="append",
+        dest="hosts",
+        help="Ollama URL to use, can be repeated (default: the configured URL)",
+    )
+    batch.add_argument(
+        "--resume", action="store_true", help="skip prompts already answered in the output"
+    )
+    batch.add_argument("-m", "--model", dest="batch_model", help="default model")
+    batch.add_argument("-r", "--role", dest="batch_role", help="default role")
+    batch.add_argument(
+        "--no-cache", action="store_true", dest="batch_no_cache", help="ignore the response cache"
+    )
+    return parser.parse_args(argv)
 
 
 def main() -> None:
     """Main entry point."""
-    session = ChatSession()
+    args = parse_args()
+    if args.command == "batch":
+        from app import batch  # pylint: disable=import-outside-toplevel
+
+        sys.exit(
+            batch.run(
+                input_file=args.input,
+                output_file=args.output or args.input.with_suffix(".out.jsonl"),
+                hosts=args.hosts,
+                concurrency=args.concurrency,
+                model=args.batch_model or args.model,
+                role=args.batch_role or args.role,
+                resume=args.resume,
+                use_cache=not (args.batch_no_cache or args.no_cache),
+            )
+        )
+
+    if args.prompt is not None or args.input is not None or not sys.stdin.isatty():
+        from app import cli  # pylint: disable=import-outside-toplevel
+
+        try:
+            prompt = cli.build_prompt(args.prompt, sys.stdin, args.input)
+        except (OSError, UnicodeDecodeError) as error:
+            print(f"sai: cannot read {args.input}: {error}", file=sys.stderr)
+            sys.exit(cli.EXIT_USAGE)
+        sys.exit(
+            cli.run_once(
+                prompt,
+                args.model,
+                args.role,
+                use_cache=not args.no_cache,
+                response_format=args.format,
+                tools=(
+                    [name for name in args.tools.split(",") if name]
+                    if args.tools is not None
+                    else None
+                ),
+            )
+        )
+
+    from app.session import ChatSession  # pylint: disable=import-outside-toplevel
+
+    session = ChatSession(model=args.model, role=args.role)
     session.run()
 
 
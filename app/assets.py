@@ -7,9 +7,20 @@ Welcome to Sai. Chat with your local LLM models.
 COMMANDS = {
     "/setup": "Settings and preferences",
     "/model": "List and select a model",
-    "/roles": "List and select a role",
+    "/roles [search]": "List and select a role, or search roles by name",
     "/role add": "Add a new custom role",
     "/role delete": "Delete a custom role",
+    "/session save": "Save the conversation and keep saving new messages",
+    "/session load": "Resume a saved conversation",
+    "/session list": "List saved conversations",
+    "/session delete": "Delete a saved conversation",
+    "/stop": "Stop the answer being written, keeping it so far (or press Ctrl-C)",
+    "/stats": "Show response time statistics per model",
+    "/cache": "Show response cache usage and hit rate",
+    "/cache clear": "Remove every cached answer",
+    "/cache bypass": "Skip the response cache for the next message",
+    "/compare <models> [prompt]": "Answer with several comma separated models side by side",
+    "/index <path>": "Index local files to answer with their content",
     "/help": "Show this help message",
     "/quit": "Exit the application",
 }
@@ -0,0 +1,271 @@
+"""Batch mode: run many prompts concurrently and write the answers to a JSONL file."""
+
+import asyncio
+import csv
+import dataclasses
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, TextIO
+
+from app import config
+from app.cache import ResponseCache
+from app.cli import EXIT_ERROR, EXIT_INTERRUPTED, EXIT_OK, EXIT_USAGE
+from app.endpoints import Endpoint
+from app.llm import ContentDelta, OllamaError, OllamaHandler, StreamDone, chat_payload
+from app.roles import RolesManager
+from app.stats import StatsRecorder, TurnMetrics
+from app.utils import lazy_import
+
+if TYPE_CHECKING:
+    import httpx
+else:
+    httpx = lazy_import("httpx")
+
+DEFAULT_CONCURRENCY: int = 4
+
+
+@dataclass
+class BatchItem:
+    """A prompt to run, read from the input file."""
+
+    id: str
+    prompt: str
+    role: str | None = None
+    model: str | None = None
+
+
+@dataclass
+class BatchReport:
+    """Totals of a batch run."""
+
+    total: int = 0
+    skipped: int = 0
+    done: int = 0
+    cached: int = 0
+    errors: int = 0
+    eval_count: int = 0
+    eval_duration: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    def summary(self) -> str:
+        """Human readable summary of the run."""
+        elapsed = time.perf_counter() - self.started
+        finished = self.done + self.errors
+        lines = [
+            f"prompts: {self.total} ({self.skipped} skipped, {self.done} done, "
+            f"{self.cached} cached, {self.errors} errors) in {elapsed:.1f}s",
+            f"throughput: {finished / elapsed if elapsed else 0:.2f} prompts/s, "
+            f"{self.eval_count / elapsed if elapsed else 0:.1f} tokens/s overall",
+        ]
+        if self.eval_duration:
+            per_stream = self.eval_count * 1_000_000_000 / self.eval_duration
+            lines.append(f"generation: {per_stream:.1f} tokens/s per stream")
+        return "\n".join(lines)
+
+
+def read_items(path: Path) -> list[BatchItem]:
+    """Read prompts from a JSONL or CSV file.
+
+    Each record needs a `prompt` and may set `id`, `role` and `model`. Records without
+    an `id` are numbered by their position in the file.
+    """
+    with open(path, encoding="utf-8", newline="") as file_:
+        if path.suffix.lower() == ".csv":
+            records: list[dict[str, Any]] = list(csv.DictReader(file_))
+        else:
+            records = [json.loads(line) for line in file_ if line.strip()]
+    items = []
+    for number, record in enumerate(records, start=1):
+        if not record.get("prompt"):
+            raise ValueError(f"{path}: record {number} has no prompt")
+        items.append(
+            BatchItem(
+                id=str(record.get("id") or number),
+                prompt=record["prompt"],
+                role=record.get("role") or None,
+                model=record.get("model") or None,
+            )
+        )
+    return items
+
+
+def completed_ids(path: Path) -> set[str]:
+    """Ids already answered without error in an output file, to resume a run."""
+    if not path.exists():
+        return set()
+    done = set()
+    with open(path, encoding="utf-8") as file_:
+        for line in file_:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:  # Partial last line of an interrupted run
+                continue
+            if not record.get("error"):
+                done.add(str(record["id"]))
+    return done
+
+
+class BatchRunner:
+    """Dispatches prompts to one or more hosts with a concurrency limit per host."""
+
+    def __init__(
+        self,
+        cfg: config.OllamaConfig,
+        hosts: list[str],
+        concurrency: int,
+        role: str | None = None,
+        cache: ResponseCache | None = None,
+    ) -> None:
+        self.cfg = cfg
+        self.hosts = hosts
+        self.concurrency = concurrency
+        self.roles_manager = RolesManager()
+        self.default_role = role or cfg.role
+        self.cache = cache
+        self.stats = StatsRecorder(log_file=cfg.metrics_file)
+        self.report = BatchReport()
+
+    def _messages(self, item: BatchItem) -> list[dict[str, str]]:
+        role_name = item.role or self.default_role
+        role = self.roles_manager.get_by_name(role_name)
+        if role is None:
+            raise ValueError(f"Role '{role_name}' not found")
+        return [
+            {"role": "system", "content": role.prompt},
+            {"role": "user", "content": item.prompt},
+        ]
+
+    async def _answer(self, handler: OllamaHandler, item: BatchItem) -> dict[str, Any]:
+        """Run one prompt, returning the output record."""
+        model = item.model or self.cfg.model
+        metrics = TurnMetrics(model=model, host=handler.base_url)
+        record: dict[str, Any] = {"id": item.id, "model": model, "host": handler.base_url}
+        started = time.perf_counter()
+        parts: list[str] = []
+        cached = False
+        try:
+            payload = chat_payload(
+                model, self._messages(item), self.cfg.model_settings(model)
+            )
+            events = (
+                self.cache.stream(handler, payload)
+                if self.cache is not None
+                else handler.stream_response(payload=payload)
+            )
+            async for event in events:
+                if metrics.ttft is None:
+                    metrics.ttft = time.perf_counter() - started
+                if isinstance(event, ContentDelta):
+                    parts.append(event.text)
+                elif isinstance(event, StreamDone):
+                    metrics.update_from_ollama(event.data)
+                    metrics.host = event.host or metrics.host
+                    cached = event.cached
+        except (httpx.HTTPError, OllamaError, ValueError) as error:
+            record["error"] = f"{error.__class__.__name__}: {error}"
+            self.report.errors += 1
+            return record
+
+        metrics.wall_time = time.perf_counter() - started
+        self.report.done += 1
+        if cached:
+            self.report.cached += 1
+        else:
+            self.stats.record(metrics)
+            self.report.eval_count += metrics.eval_count
+            self.report.eval_duration += metrics.eval_duration
+        record["response"] = "".join(parts)
+        record["cached"] = cached
+        record["metrics"] = {
+            "ttft": metrics.ttft,
+            "wall_time": metrics.wall_time,
+            "prompt_eval_count": metrics.prompt_eval_count,
+            "eval_count": metrics.eval_count,
+            "tokens_per_second": metrics.tokens_per_second,
+        }
+        return record
+
+    async def _worker(
+        self, handler: OllamaHandler, queue: "asyncio.Queue[BatchItem]", out: TextIO
+    ) -> None:
+        while not queue.empty():
+            item = queue.get_nowait()
+            record = await self._answer(handler, item)
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+
+    async def run(self, items: list[BatchItem], out: TextIO) -> BatchReport:
+        """Answer all items, writing each record to `out` as soon as it completes."""
+        queue: asyncio.Queue[BatchItem] = asyncio.Queue()
+        for item in items:
+            queue.put_nowait(item)
+
+        handlers = [
+            OllamaHandler.from_config(
+                dataclasses.replace(
+                    self.cfg,
+                    base_url=host,
+                    max_connections=max(self.cfg.max_connections, self.concurrency),
+                    max_keepalive_connections=max(
+                        self.cfg.max_keepalive_connections, self.concurrency
+                    ),
+                ),
+                endpoints=[Endpoint(url=host)],
+            )
+            for host in self.hosts
+        ]
+        try:
+            await asyncio.gather(
+                *(
+                    self._worker(handler, queue, out)
+                    for handler in handlers
+                    for _ in range(self.concurrency)
+                )
+            )
+        finally:
+            await asyncio.gather(*(handler.aclose() for handler in handlers))
+        return self.report
+
+
+def run(
+    input_file: Path,
+    output_file: Path,
+    hosts: list[str] | None = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    model: str | None = None,
+    role: str | None = None,
+    resume: bool = False,
+    use_cache: bool = True,
+) -> int:
+    """Run a batch file. Returns the exit status: 0 when every prompt succeeded."""
+    cfg = config.OllamaConfig.load()
+    cfg.model = model or cfg.model
+    try:
+        items = read_items(input_file)
+    except (OSError, ValueError) as error:
+        print(f"sai: {error}", file=sys.stderr)
+        return EXIT_USAGE
+
+    skip = completed_ids(output_file) if resume else set()
+    pending = [item for item in items if item.id not in skip]
+    hosts = hosts or [endpoint.url for endpoint in cfg.endpoint_list()]
+    cache = ResponseCache.from_config(cfg) if use_cache else None
+    runner = BatchRunner(cfg, hosts, max(1, concurrency), role, cache)
+    runner.report.total = len(items)
+    runner.report.skipped = len(items) - len(pending)
+
+    output_file.parent.mkdir(exist_ok=True, parents=True)
+    with open(output_file, "a" if resume else "w", encoding="utf-8") as out:
+        try:
+            asyncio.run(runner.run(pending, out))
+        except KeyboardInterrupt:
+            print(runner.report.summary(), file=sys.stderr)
+            return EXIT_INTERRUPTED
+        finally:
+            if cache is not None:
+                cache.close()
+    print(runner.report.summary(), file=sys.stderr)
+    return EXIT_ERROR if runner.report.errors else EXIT_OK
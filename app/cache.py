@@ -0,0 +1,239 @@
+"""Local cache of answers, keyed by a hash of the request payload.
+
+Answers are stored in a SQLite file under `~/.sai/cache`. When the file grows past its
+size limit, the least recently used answers are evicted.
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import json
+import re
+import time
+from collections.abc import AsyncGenerator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from app.config import CONFIG_DIR, DEFAULT_CACHE_MAX_MB, OllamaConfig
+from app.llm import ContentDelta, OllamaHandler, StreamDone, StreamEvent, ThinkingDelta
+from app.utils import lazy_import
+
+if TYPE_CHECKING:
+    import sqlite3
+else:
+    sqlite3 = lazy_import("sqlite3")
+
+CACHE_DIR = CONFIG_DIR / "cache"
+CACHE_FILE = CACHE_DIR / "responses.sqlite3"
+
+# Request fields that do not change the answer.
+UNKEYED_FIELDS = ("stream", "keep_alive")
+
+REPLAY_TOKEN = re.compile(r"\s*\S+\s*|\s+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    thinking TEXT NOT NULL,
+    content TEXT NOT NULL,
+    done TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+)
+"""
+
+
+def payload_key(payload: dict[str, Any]) -> str:
+    """Hash of the fields of a `/api/chat` payload that determine the answer."""
+    keyed = {key: value for key, value in payload.items() if key not in UNKEYED_FIELDS}
+    text = json.dumps(keyed, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    """A cached answer, as listed by `/cache`."""
+
+    key: str
+    model: str
+    prompt: str
+    size: int
+    hits: int
+    created: float
+    accessed: float
+
+
+class ResponseCache:
+    """Size-bounded LRU cache of answers with hit and miss counters.
+
+    With `replay_rate` set, cached answers are replayed at that many tokens per second
+    instead of all at once.
+    """
+
+    def __init__(
+        self,
+        path: Path = CACHE_FILE,
+        max_mb: float = DEFAULT_CACHE_MAX_MB,
+        replay_rate: float = 0.0,
+    ) -> None:
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.replay_rate = replay_rate
+        self.hits = 0
+        self.misses = 0
+        self._db: "sqlite3.Connection | None" = None
+
+    @classmethod
+    def from_config(cls, cfg: OllamaConfig) -> "ResponseCache | None":
+        """Cache with the configured limits, or None when caching is off."""
+        if not cfg.cache:
+            return None
+        return cls(max_mb=cfg.cache_max_mb, replay_rate=cfg.cache_replay_rate)
+
+    @property
+    def db(self) -> "sqlite3.Connection":
+        """Connection to the cache file, opened on first use."""
+        if self._db is None:
+            self.path.parent.mkdir(exist_ok=True, parents=True)
+            self._db = sqlite3.connect(self.path)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(SCHEMA)
+        return self._db
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """Cached answer for a payload key, marking it as recently used."""
+        row = self.db.execute(
+            "SELECT thinking, content, done FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self.db:
+            self.db.execute(
+                "UPDATE responses SET hits = hits + 1, accessed = ? WHERE key = ?",
+                (time.time(), key),
+            )
+        return {"thinking": row[0], "content": row[1], "done": json.loads(row[2])}
+
+    def put(
+        self,
+        key: str,
+        payload: dict[str, Any],
+        thinking: str,
+        content: str,
+        done: dict[str, Any],
+    ) -> None:
+        """Store an answer, evicting the least recently used ones beyond the size limit."""
+        user_messages = [m for m in payload.get("messages", []) if m.get("role") == "user"]
+        prompt = user_messages[-1]["content"] if user_messages else ""
+        done_text = json.dumps(done, ensure_ascii=False)
+        size = len(thinking.encode()) + len(content.encode()) + len(done_text) + len(key)
+        now = time.time()
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, model, prompt, thinking, content, done, size, hits, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?)",
+                (
+                    key,
+                    payload.get("model", ""),
+                    prompt,
+                    thinking,
+                    content,
+                    done_text,
+                    size,
+                    now,
+                    now,
+                ),
+            )
+            self.db.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM ("
+                "  SELECT key, SUM(size) OVER (ORDER BY accessed DESC) AS total FROM responses"
+                " ) WHERE total > ?"
+                ")",
+                (self.max_bytes,),
+            )
+
+    def usage(self) -> tuple[int, int]:
+        """Number of cached answers and their size in bytes."""
+        count, size = self.db.execute("SELECT COUNT(*), SUM(size) FROM responses").fetchone()
+        return count, size or 0
+
+    def entries(self, limit: int = 10) -> list[CacheEntry]:
+        """Most recently used answers."""
+        rows = self.db.execute(
+            "SELECT key, model, prompt, size, hits, created, accessed FROM responses "
+            "ORDER BY accessed DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [CacheEntry(*row) for row in rows]
+
+    def clear(self) -> None:
+        """Remove every cached answer and reset the counters."""
+        with self.db:
+            self.db.execute("DELETE FROM responses")
+        self.db.execute("VACUUM")
+        self.hits = 0
+        self.misses = 0
+
+    def close(self) -> None:
+        """Close the cache file."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def _replay(self, record: dict[str, Any]) -> AsyncGenerator[StreamEvent, Any]:
+        """Events of a cached answer, paced at `replay_rate` tokens per second if set."""
+        delay = 1 / self.replay_rate if self.replay_rate > 0 else 0.0
+        parts = ((ThinkingDelta, record["thinking"]), (ContentDelta, record["content"]))
+        for event_type, text in parts:
+            if not text:
+                continue
+            if not delay:
+                yield event_type(text)
+                continue
+            for token in REPLAY_TOKEN.findall(text):
+                yield event_type(token)
+                await asyncio.sleep(delay)
+        yield StreamDone(record["done"], cached=True)
+
+    async def stream(
+        self, handler: OllamaHandler, payload: dict[str, Any], bypass: bool = False
+    ) -> AsyncGenerator[StreamEvent, Any]:
+        """Stream an answer from the cache, or from Ollama and store it.
+
+        With `bypass`, the cache is not read but the new answer replaces the cached one.
+        An answer is stored once the whole stream has been read, so incomplete streams and
+        answers rejected by the reader, e.g. output that does not match the requested
+        format, are not stored.
+        """
+        key = payload_key(payload)
+        record = None if bypass else self.get(key)
+        if record is not None:
+            async for event in self._replay(record):
+                yield event
+            return
+
+        thinking: list[str] = []
+        content: list[str] = []
+        done: dict[str, Any] | None = None
+        # Closed with this generator, so a cancelled read releases the connection at once.
+        async with contextlib.aclosing(handler.stream_response(payload=payload)) as events:
+            async for event in events:
+                if isinstance(event, ThinkingDelta):
+                    thinking.append(event.text)
+                elif isinstance(event, ContentDelta):
+                    content.append(event.text)
+                elif isinstance(event, StreamDone):
+                    done = event.data
+                yield event
+        if done is not None and content:
+            self.put(key, payload, "".join(thinking), "".join(content), done)
@@ -0,0 +1,167 @@
+"""Cached catalogue of the models available in Ollama."""
+
+import asyncio
+import json
+import os
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from app.config import CONFIG_DIR
+from app.llm import OllamaError, OllamaHandler
+from app.utils import lazy_import
+
+if TYPE_CHECKING:
+    import httpx
+else:
+    httpx = lazy_import("httpx")
+
+CATALOG_FILE = CONFIG_DIR / "models.json"
+CATALOG_TTL: float = 300.0
+
+
+@dataclass
+class ModelInfo:
+    """Metadata of a model, from `/api/tags` and `/api/show`."""
+
+    name: str
+    digest: str = ""
+    size: int = 0
+    family: str = ""
+    quantization: str = ""
+    context_length: int | None = None
+
+    @classmethod
+    def from_tags(cls, item: dict[str, Any]) -> "ModelInfo":
+        """Build from a `/api/tags` entry."""
+        details = item.get("details") or {}
+        return cls(
+            name=item["model"],
+            digest=item.get("digest", ""),
+            size=int(item.get("size") or 0),
+            family=details.get("family", ""),
+            quantization=details.get("quantization_level", ""),
+        )
+
+    def label(self) -> str:
+        """One line description for model pickers."""
+        extras = [f"{self.size / 1e9:.1f} GB"] if self.size else []
+        extras += [value for value in (self.family, self.quantization) if value]
+        if self.context_length:
+            extras.append(f"ctx {self.context_length}")
+        return f"{self.name} ({', '.join(extras)})" if extras else self.name
+
+
+def context_length_from_show(data: dict[str, Any]) -> int | None:
+    """Context length from an `/api/show` response, e.g. `llama.context_length`."""
+    for key, value in (data.get("model_info") or {}).items():
+        if key.endswith(".context_length"):
+            return int(value)
+    return None
+
+
+class ModelCatalog:
+    """Models of an Ollama setup, cached in memory and under `~/.sai`.
+
+    Cached entries are returned at once; when they are older than the TTL they are
+    refreshed in the background. `/api/show` is only called for new models and for
+    models whose digest changed.
+    """
+
+    def __init__(self, key: str, path: Path = CATALOG_FILE, ttl: float = CATALOG_TTL) -> None:
+        self.key = key
+        self.path = path
+        self.ttl = ttl
+        self.models: dict[str, ModelInfo] = {}
+        self.fetched_at: float = 0.0
+        self._refresh_task: asyncio.Task[None] | None = None
+        self._load()
+
+    def _read_file(self) -> dict[str, Any]:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, "rb") as file_:
+                data: dict[str, Any] = json.load(file_)
+                return data
+        except (OSError, ValueError):
+            return {}
+
+    def _load(self) -> None:
+        """Load cached models of this setup from disk."""
+        entry = self._read_file().get(self.key)
+        if not entry:
+            return
+        self.fetched_at = float(entry.get("fetched_at", 0.0))
+        self.models = {item["name"]: ModelInfo(**item) for item in entry.get("models", [])}
+
+    def _save(self) -> None:
+        """Store the catalogue, keeping the entries of other setups."""
+        data = self._read_file()
+        data[self.key] = {
+            "fetched_at": self.fetched_at,
+            "models": [asdict(info) for info in self.models.values()],
+        }
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        tmp_file = self.path.with_suffix(".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as file_:
+            json.dump(data, file_)
+        os.replace(tmp_file, self.path)
+
+    @property
+    def stale(self) -> bool:
+        """Whether the cached models are older than the TTL."""
+        return time.time() - self.fetched_at > self.ttl
+
+    def context_length(self, model: str) -> int | None:
+        """Cached context length of a model."""
+        info = self.models.get(model)
+        return info.context_length if info else None
+
+    async def refresh(self, handler: OllamaHandler) -> None:
+        """Fetch the model list, and `/api/show` for new or changed models."""
+        fresh = {
+            info.name: info
+            for info in map(ModelInfo.from_tags, await handler.list_model_details())
+        }
+        changed = []
+        for name, info in fresh.items():
+            cached = self.models.get(name)
+            if cached and cached.digest == info.digest and cached.context_length:
+                info.context_length = cached.context_length
+            else:
+                changed.append(info)
+
+        shows = await asyncio.gather(
+            *(handler.show_model(info.name) for info in changed), return_exceptions=True
+        )
+        for info, show in zip(changed, shows):
+            if not isinstance(show, BaseException):
+                info.context_length = context_length_from_show(show)
+
+        self.models = fresh
+        self.fetched_at = time.time()
+        self._save()
+
+    async def _refresh_quietly(self, handler: OllamaHandler) -> None:
+        try:
+            await self.refresh(handler)
+        except (httpx.HTTPError, OllamaError, ValueError, KeyError):
+            pass
+
+    async def get(self, handler: OllamaHandler, force: bool = False) -> list[ModelInfo]:
+        """Known models, refreshing in the background when stale.
+
+        The call only waits for Ollama when nothing is cached yet or `force` is set.
+        """
+        if force or not self.models:
+            await self.refresh(handler)
+        elif self.stale and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self._refresh_quietly(handler))
+        return list(self.models.values())
+
+    def cancel(self) -> None:
+        """Stop a background refresh."""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
@@ -0,0 +1,209 @@
+"""Non-interactive mode: one prompt in, raw answer out."""
+
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, TextIO
+
+from app import config
+from app.cache import ResponseCache
+from app.llm import ContentDelta, OllamaError, OllamaHandler, ToolCalls, chat_payload
+from app.roles import RolesManager
+from app.utils import lazy_import
+
+if TYPE_CHECKING:
+    import httpx
+
+    from app.tools import ToolRegistry
+else:
+    httpx = lazy_import("httpx")
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+EXIT_BROKEN_PIPE = 141
+
+
+def build_prompt(prompt: str | None, stdin: TextIO, input_file: str | None = None) -> str:
+    """Combine the `-p` prompt with the contents of `input_file`, "-" for stdin.
+
+    Without a prompt or an input file, the prompt is read from stdin. Otherwise stdin is
+    only read when asked for, so `sai -p` never waits for input that may not end.
+    """
+    if input_file == "-" or (prompt is None and input_file is None):
+        extra = "" if stdin.isatty() else stdin.read()
+    elif input_file is not None:
+        extra = Path(input_file).expanduser().read_text(encoding="utf-8")
+    else:
+        extra = ""
+    return "\n\n".join(part for part in (prompt, extra) if part and part.strip())
+
+
+async def stream_answer(
+    handler: OllamaHandler,
+    payload: dict[str, Any],
+    out: TextIO,
+    cache: ResponseCache | None = None,
+) -> tuple[str, list[dict[str, Any]]]:
+    """Write the answer tokens to `out` as they arrive.
+
+    With a `format` in the payload, the answer is validated while it streams and the request
+    is cancelled at the first character that cannot match it. Returns the answer and the
+    tool calls requested by the model.
+    """
+    # pylint: disable=import-outside-toplevel
+    from app.structured import JSONStreamValidator, validate_stream
+
+    flush = out.isatty()
+    written: list[str] = []
+    calls: list[dict[str, Any]] = []
+    events = (
+        cache.stream(handler, payload)
+        if cache is not None
+        else handler.stream_response(payload=payload)
+    )
+    if "format" in payload:
+        schema = payload["format"] if isinstance(payload["format"], dict) else {}
+        events = validate_stream(events, JSONStreamValidator(schema))
+    try:
+        async for event in events:
+            if isinstance(event, ContentDelta):
+                out.write(event.text)
+                written.append(event.text)
+                if flush:
+                    out.flush()
+            elif isinstance(event, ToolCalls):
+                calls.extend(event.calls)
+    finally:
+        if any(written):
+            out.write("\n")
+        out.flush()
+    return "".join(written), calls
+
+
+async def run_agent(
+    handler: OllamaHandler,
+    payload: dict[str, Any],
+    tools: "ToolRegistry",
+    out: TextIO,
+    max_rounds: int = config.DEFAULT_MAX_TOOL_ROUNDS,
+) -> str:
+    """Answer, running the tools the model calls and sending their results back, until the
+    model answers without calling tools. Returns the final answer."""
+    messages: list[dict[str, Any]] = payload["messages"]
+    for _ in range(max_rounds):
+        text, calls = await stream_answer(handler, payload, out)
+        if not calls:
+            return text
+        for call in calls:
+            function = call.get("function", {})
+            arguments = json.dumps(function.get("arguments", {}))
+            print(f"sai: calling {function.get('name')}({arguments})", file=sys.stderr)
+        messages.append({"role": "assistant", "content": text, "tool_calls": calls})
+        messages.extend(await tools.run(calls))
+    raise OllamaError(f"No final answer after {max_rounds} rounds of tool calls")
+
+
+def load_format(value: str | None) -> str | dict[str, Any] | None:
+    """The `format` of the request: "json", or the JSON schema in the file `value`."""
+    if value is None or value == "json":
+        return value
+    try:
+        schema = json.loads(Path(value).expanduser().read_text(encoding="utf-8"))
+    except (OSError, ValueError) as error:
+        raise ValueError(f"cannot read the schema file {value}: {error}") from error
+    if not isinstance(schema, dict):
+        raise ValueError(f"the schema in {value} is not a JSON object")
+    return schema
+
+
+async def _run_once(
+    cfg: config.OllamaConfig,
+    messages: list[dict[str, str]],
+    use_cache: bool = True,
+    response_format: str | dict[str, Any] | None = None,
+    tools: "ToolRegistry | None" = None,
+) -> int:
+    handler = OllamaHandler.from_config(cfg)
+    # Answers that call tools depend on the tool results, so they are not cached.
+    cache = ResponseCache.from_config(cfg) if use_cache and tools is None else None
+    try:
+        payload = chat_payload(
+            cfg.model,
+            list(messages),
+            cfg.model_settings(),
+            response_format=response_format,
+            tools=tools.schemas() if tools is not None else None,
+        )
+        if tools is not None:
+            await run_agent(handler, payload, tools, sys.stdout, cfg.max_tool_rounds)
+        else:
+            await stream_answer(handler, payload, sys.stdout, cache)
+        return EXIT_OK
+    except (httpx.HTTPError, OllamaError) as error:
+        print(f"sai: {error.__class__.__name__}: {error}", file=sys.stderr)
+        return EXIT_ERROR
+    finally:
+        if cache is not None:
+            cache.close()
+        await handler.aclose()
+
+
+def run_once(
+    prompt: str,
+    model: str | None = None,
+    role: str | None = None,
+    use_cache: bool = True,
+    response_format: str | None = None,
+    tools: list[str] | None = None,
+) -> int:
+    """Answer a single prompt without the interactive interface. Returns the exit status.
+
+    With `use_cache` off, the configured response cache is neither read nor written.
+    `response_format` is "json" or the path of a JSON schema file the answer must match.
+    With `tools`, the model can call the named tools, or all of them if the list is empty.
+    """
+    if not prompt:
+        print("sai: empty prompt", file=sys.stderr)
+        return EXIT_USAGE
+    cfg = config.OllamaConfig.load()
+    try:
+        schema = load_format(response_format)
+    except ValueError as error:
+        print(f"sai: {error}", file=sys.stderr)
+        return EXIT_USAGE
+    registry = None
+    if tools is not None:
+        from app.tools import ToolError, ToolRegistry  # pylint: disable=import-outside-toplevel
+
+        try:
+            registry = ToolRegistry.from_config(cfg, tools)
+        except ToolError as error:
+            print(f"sai: {error}", file=sys.stderr)
+            return EXIT_USAGE
+    cfg.model = model or cfg.model
+    roles_manager = RolesManager()
+    selected = roles_manager.get_by_name(role or cfg.role)
+    if selected is None:
+        if role:
+            print(f"sai: role '{role}' not found", file=sys.stderr)
+            return EXIT_USAGE
+        selected = roles_manager.get_default()
+
+    messages = [
+        {"role": "system", "content": selected.prompt},
+        {"role": "user", "content": prompt},
+    ]
+    try:
+        return asyncio.run(_run_once(cfg, messages, use_cache, schema, registry))
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+    except BrokenPipeError:
+        # The reader went away, e.g. `| head`. Point stdout at devnull so that flushing it
+        # on exit does not fail again.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return EXIT_BROKEN_PIPE
@@ -0,0 +1,209 @@
+"""Several models answering the same messages at once, side by side."""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from rich.console import Console, Group, RenderableType
+from rich.table import Table
+
+from app import config
+from app.llm import (
+    ContentDelta,
+    OllamaError,
+    OllamaHandler,
+    StreamDone,
+    ThinkingDelta,
+    chat_payload,
+)
+from app.render import (
+    THINKING_HEADER,
+    THINKING_SEPARATOR,
+    IncrementalMarkdown,
+    create_scrolling_panel,
+)
+from app.stats import TurnMetrics
+from app.utils import lazy_import
+
+if TYPE_CHECKING:
+    import httpx
+else:
+    httpx = lazy_import("httpx")
+
+MIN_COLUMN_WIDTH: int = 40
+PANEL_VERTICAL_OVERHEAD: int = 3
+
+
+@dataclass
+class Lane:
+    """The answer of one model and its timings."""
+
+    model: str
+    renderer: IncrementalMarkdown
+    metrics: TurnMetrics
+    answer: list[str] = field(default_factory=list)
+    done: bool = False
+    error: str | None = None
+    is_thinking: bool = False
+
+    @property
+    def text(self) -> str:
+        """Answer received so far, without the reasoning."""
+        return "".join(self.answer)
+
+    def subtitle(self) -> str:
+        """Time to first token, generation speed and total time, as far as known."""
+        parts = []
+        if self.metrics.ttft is not None:
+            parts.append(f"ttft {self.metrics.ttft:.2f}s")
+        if self.metrics.tokens_per_second is not None:
+            parts.append(f"{self.metrics.tokens_per_second:.1f} tok/s")
+        if self.done and self.metrics.wall_time:
+            parts.append(f"total {self.metrics.wall_time:.2f}s")
+        return " · ".join(parts) or "waiting..."
+
+    def border_style(self) -> str:
+        """Red on errors, green when complete, yellow while streaming."""
+        if self.error:
+            return "red"
+        return "green" if self.done else "yellow"
+
+
+class ModelComparison:
+    """Streams the answers of several models concurrently into one live display.
+
+    Streams only update their lane; a single loop redraws every lane at most
+    `refresh_rate` times per second, so the rendering cost does not grow with the
+    number of tokens received.
+    """
+
+    def __init__(
+        self,
+        handler: OllamaHandler,
+        cfg: config.OllamaConfig,
+        console: Console,
+        models: list[str],
+        messages: list[dict[str, str]],
+    ) -> None:
+        self.handler = handler
+        self.cfg = cfg
+        self.console = console
+        self.messages = messages
+        self.lanes = [
+            Lane(
+                model=model,
+                renderer=IncrementalMarkdown(console),
+                metrics=TurnMetrics(model=model, host=cfg.base_url),
+            )
+            for model in models
+        ]
+
+    async def _stream(self, lane: Lane) -> None:
+        """Stream the answer of one model into its lane."""
+        started = time.perf_counter()
+        payload = chat_payload(lane.model, self.messages, self.cfg.model_settings(lane.model))
+        try:
+            async for event in self.handler.stream_response(payload=payload):
+                if lane.metrics.ttft is None and not isinstance(event, StreamDone):
+                    lane.metrics.ttft = time.perf_counter() - started
+                if isinstance(event, ThinkingDelta):
+                    if not lane.is_thinking:
+                        lane.renderer.append(THINKING_HEADER)
+                        lane.is_thinking = True
+                    lane.renderer.append(event.text)
+                elif isinstance(event, ContentDelta):
+                    if lane.is_thinking:
+                        lane.renderer.append(THINKING_SEPARATOR)
+                        lane.is_thinking = False
+                    lane.renderer.append(event.text)
+                    lane.answer.append(event.text)
+                elif isinstance(event, StreamDone):
+                    lane.metrics.update_from_ollama(event.data)
+                    lane.metrics.host = event.host or lane.metrics.host
+        except (httpx.HTTPError, OllamaError) as error:
+            lane.error = f"{error.__class__.__name__}: {error}"
+            lane.renderer.append(f"\n\n**{lane.error}**")
+        except asyncio.CancelledError:
+            lane.error = "interrupted"
+            lane.renderer.append("\n\n*Interrupted*")
+            raise
+        finally:
+            lane.metrics.wall_time = time.perf_counter() - started
+            lane.done = True
+
+    def render(self) -> RenderableType:
+        """Lanes side by side when the terminal is wide enough, stacked otherwise."""
+        width = self.console.size.width
+        height = self.console.size.height
+        side_by_side = width // len(self.lanes) >= MIN_COLUMN_WIDTH
+        if side_by_side:
+            column_width = width // len(self.lanes)
+            max_height = max(1, height - PANEL_VERTICAL_OVERHEAD)
+        else:
+            column_width = width
+            max_height = max(1, height // len(self.lanes) - PANEL_VERTICAL_OVERHEAD)
+        options = self.console.options.update_width(column_width)
+        panels = [
+            create_scrolling_panel(
+                renderer=lane.renderer,
+                title=f"[bold]{lane.model}[/bold]",
+                subtitle=lane.subtitle(),
+                border_style=lane.border_style(),
+                max_height=max_height,
+                options=options,
+                expand=True,
+            )
+            for lane in self.lanes
+        ]
+        if not side_by_side:
+            return Group(*panels)
+        grid = Table.grid(expand=True)
+        for _ in panels:
+            grid.add_column(ratio=1)
+        grid.add_row(*panels)
+        return grid
+
+    def summary(self) -> Table:
+        """Timings of every model, fastest total time first."""
+        table = Table(title="Comparison", title_justify="left")
+        table.add_column("Model", style="bold")
+        table.add_column("TTFT", justify="right")
+        table.add_column("tok/s", justify="right")
+        table.add_column("Total", justify="right")
+        table.add_column("Tokens", justify="right")
+        lanes = sorted(self.lanes, key=lambda lane: (bool(lane.error), lane.metrics.wall_time))
+        for lane in lanes:
+            metrics = lane.metrics
+            tokens_per_second = metrics.tokens_per_second
+            table.add_row(
+                lane.model,
+                f"{metrics.ttft:.2f}s" if metrics.ttft is not None else "-",
+                f"{tokens_per_second:.1f}" if tokens_per_second is not None else "-",
+                f"{metrics.wall_time:.2f}s",
+                str(metrics.eval_count) if metrics.eval_count else "-",
+                style="red" if lane.error else None,
+            )
+        return table
+
+    async def run(self) -> list[Lane]:
+        """Stream all answers, returning the lanes once every model is done.
+
+        Cancelling the task stops every stream and keeps the partial answers.
+        """
+        from rich.live import Live  # pylint: disable=import-outside-toplevel
+
+        tasks = [asyncio.create_task(self._stream(lane)) for lane in self.lanes]
+        redraw_interval = 1 / self.cfg.refresh_rate
+        with Live(self.render(), console=self.console, auto_refresh=False) as live:
+            try:
+                pending: set[asyncio.Task[Any]] = set(tasks)
+                while pending:
+                    _, pending = await asyncio.wait(pending, timeout=redraw_interval)
+                    live.update(self.render(), refresh=True)
+            except asyncio.CancelledError:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                live.update(self.render(), refresh=True)
+        return self.lanes
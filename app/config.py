@@ -3,7 +3,7 @@
 import tomllib
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Self
+from typing import Any, Self
 
 import tomli_w
 
@@ -15,10 +15,60 @@ DEFAULT_ROLE = "Virtual Assistant"
 HTTP_TIMEOUT: int = 60
 CLI_REFRESH_TIME: int = 10
 
+DEFAULT_MAX_CONNECTIONS: int = 10
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS: int = 5
+DEFAULT_KEEPALIVE_EXPIRY: float = 300.0
+
+OLLAMA_DEFAULT_NUM_CTX: int = 4096
+CONTEXT_BUDGET_RATIO: float = 0.75
+CONTEXT_STRATEGIES = ("drop", "summarize")
+ROLE_SWITCH_MODES = ("replace", "append")
+RENDER_MODES = ("auto", "live", "plain")
+
+DEFAULT_CACHE_MAX_MB: float = 64.0
+
+DEFAULT_EMBED_MODEL = "nomic-embed-text"
+DEFAULT_RETRIEVAL_TOP_K: int = 4
+DEFAULT_RETRIEVAL_MIN_SCORE: float = 0.3
+
+DEFAULT_TOOL_TIMEOUT: float = 30.0
+DEFAULT_MAX_TOOL_ROUNDS: int = 8
+
 CONFIG_DIR = Path(Path.home() / ".sai")
 CONFIG_FILE = CONFIG_DIR / "config.toml"
 
 
+def _optional_int(value: Any) -> int | None:
+    """Integer setting that may be left unset."""
+    return None if value is None else int(value)
+
+
+@dataclass
+class EndpointConfig:
+    """An Ollama instance from the `endpoints` list of the config file."""
+
+    url: str
+    weight: float = field(default=1.0)
+
+
+@dataclass
+class ModelConfig:
+    """Per-model settings, from the `[models."<name>"]` tables of the config file."""
+
+    context_budget: int | None = field(default=None)
+    num_ctx: int | None = field(default=None)
+    keep_alive: str | int | None = field(default=None)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any], defaults: "ModelConfig") -> Self:
+        """Build settings from a TOML table, falling back to `defaults`."""
+        return cls(
+            context_budget=_optional_int(data.get("context_budget", defaults.context_budget)),
+            num_ctx=_optional_int(data.get("num_ctx", defaults.num_ctx)),
+            keep_alive=data.get("keep_alive", defaults.keep_alive),
+        )
+
+
 @dataclass
 class OllamaConfig:
     """Ollama configuration settings."""
@@ -26,6 +76,30 @@ class OllamaConfig:
     base_url: str
     model: str
     role: str = field(default=DEFAULT_ROLE)
+    http2: bool = field(default=False)
+    max_connections: int = field(default=DEFAULT_MAX_CONNECTIONS)
+    max_keepalive_connections: int = field(default=DEFAULT_MAX_KEEPALIVE_CONNECTIONS)
+    keepalive_expiry: float = field(default=DEFAULT_KEEPALIVE_EXPIRY)
+    metrics_file: Path | None = field(default=None)
+    context_strategy: str = field(default="drop")
+    role_switch: str = field(default="replace")
+    heartbeat_interval: float = field(default=0.0)
+    prefill: bool = field(default=False)
+    render_mode: str = field(default="auto")
+    refresh_rate: float = field(default=CLI_REFRESH_TIME)
+    cache: bool = field(default=False)
+    cache_max_mb: float = field(default=DEFAULT_CACHE_MAX_MB)
+    cache_replay_rate: float = field(default=0.0)
+    embed_model: str = field(default=DEFAULT_EMBED_MODEL)
+    retrieval_top_k: int = field(default=DEFAULT_RETRIEVAL_TOP_K)
+    retrieval_min_score: float = field(default=DEFAULT_RETRIEVAL_MIN_SCORE)
+    tool_files: list[Path] = field(default_factory=list)
+    tool_root: Path | None = field(default=None)
+    tool_timeout: float = field(default=DEFAULT_TOOL_TIMEOUT)
+    max_tool_rounds: int = field(default=DEFAULT_MAX_TOOL_ROUNDS)
+    endpoints: list[EndpointConfig] = field(default_factory=list)
+    model_defaults: ModelConfig = field(default_factory=ModelConfig)
+    models: dict[str, ModelConfig] = field(default_factory=dict)
 
     @classmethod
     def _ensure_config_dir(cls) -> None:
@@ -33,33 +107,118 @@ class OllamaConfig:
         CONFIG_DIR.mkdir(exist_ok=True, parents=True)
 
     @classmethod
-    def _load_toml(cls) -> dict[str, str]:
-        """Load TOML config file if it exists."""
+    def _load_file(cls) -> dict[str, Any]:
+        """Load the whole TOML config file if it exists."""
         if not CONFIG_FILE.exists():
             return {}
         with open(CONFIG_FILE, "rb") as file_:
-            data: dict[str, dict[str, str]] = tomllib.load(file_)
-            return data.get("ollama", {})
+            return tomllib.load(file_)
+
+    @classmethod
+    def _load_toml(cls) -> dict[str, Any]:
+        """Load the `ollama` table of the TOML config file."""
+        data: dict[str, Any] = cls._load_file().get("ollama", {})
+        return data
+
+    @staticmethod
+    def _choice(data: dict[str, Any], key: str, choices: tuple[str, ...]) -> str:
+        """Read a setting that must be one of `choices`, the first one being the default."""
+        value = str(data.get(key, choices[0]))
+        if value not in choices:
+            raise ValueError(f"Invalid {key} '{value}', expected one of: {', '.join(choices)}")
+        return value
 
     @classmethod
     def load(cls) -> Self:
-        """Load config with priority: TOML > env vars > defaults."""
+        """Load config with priority: TOML > defaults."""
         toml_data = cls._load_toml()
+        model_defaults = ModelConfig.from_dict(toml_data, defaults=ModelConfig())
+        models_data: dict[str, dict[str, Any]] = cls._load_file().get("models", {})
+        context_strategy = cls._choice(toml_data, "context_strategy", CONTEXT_STRATEGIES)
+        role_switch = cls._choice(toml_data, "role_switch", ROLE_SWITCH_MODES)
+        render_mode = cls._choice(toml_data, "render_mode", RENDER_MODES)
+        refresh_rate = float(toml_data.get("refresh_rate", CLI_REFRESH_TIME))
+        if refresh_rate <= 0:
+            raise ValueError(f"Invalid refresh_rate {refresh_rate}, expected a positive number")
         return cls(
             base_url=toml_data.get("base_url") or DEFAULT_BASE_URL,
             model=toml_data.get("model") or DEFAULT_MODEL,
             role=toml_data.get("role") or DEFAULT_ROLE,
+            http2=bool(toml_data.get("http2", False)),
+            max_connections=int(toml_data.get("max_connections", DEFAULT_MAX_CONNECTIONS)),
+            max_keepalive_connections=int(
+                toml_data.get("max_keepalive_connections", DEFAULT_MAX_KEEPALIVE_CONNECTIONS)
+            ),
+            keepalive_expiry=float(toml_data.get("keepalive_expiry", DEFAULT_KEEPALIVE_EXPIRY)),
+            metrics_file=(
+                Path(toml_data["metrics_file"]).expanduser()
+                if toml_data.get("metrics_file")
+                else None
+            ),
+            context_strategy=context_strategy,
+            role_switch=role_switch,
+            endpoints=[
+                EndpointConfig(url=item["url"], weight=float(item.get("weight", 1.0)))
+                for item in toml_data.get("endpoints", [])
+            ],
+            heartbeat_interval=float(toml_data.get("heartbeat_interval", 0.0)),
+            prefill=bool(toml_data.get("prefill", False)),
+            render_mode=render_mode,
+            refresh_rate=refresh_rate,
+            cache=bool(toml_data.get("cache", False)),
+            cache_max_mb=float(toml_data.get("cache_max_mb", DEFAULT_CACHE_MAX_MB)),
+            cache_replay_rate=float(toml_data.get("cache_replay_rate", 0.0)),
+            embed_model=toml_data.get("embed_model") or DEFAULT_EMBED_MODEL,
+            retrieval_top_k=int(toml_data.get("retrieval_top_k", DEFAULT_RETRIEVAL_TOP_K)),
+            retrieval_min_score=float(
+                toml_data.get("retrieval_min_score", DEFAULT_RETRIEVAL_MIN_SCORE)
+            ),
+            tool_files=[Path(path).expanduser() for path in toml_data.get("tool_files", [])],
+            tool_root=(
+                Path(toml_data["tool_root"]).expanduser() if toml_data.get("tool_root") else None
+            ),
+            tool_timeout=float(toml_data.get("tool_timeout", DEFAULT_TOOL_TIMEOUT)),
+            max_tool_rounds=int(toml_data.get("max_tool_rounds", DEFAULT_MAX_TOOL_ROUNDS)),
+            model_defaults=model_defaults,
+            models={
+                name: ModelConfig.from_dict(data, defaults=model_defaults)
+                for name, data in models_data.items()
+            },
         )
 
+    def endpoint_list(self) -> list[EndpointConfig]:
+        """Configured endpoints, or the single `base_url` when there are none."""
+        return self.endpoints or [EndpointConfig(url=self.base_url)]
+
+    def model_settings(self, model: str | None = None) -> ModelConfig:
+        """Settings of a model, the current one by default."""
+        return self.models.get(model or self.model, self.model_defaults)
+
+    def context_budget(self, model: str | None = None, context_length: int | None = None) -> int:
+        """Tokens of history to send to a model.
+
+        An explicit `context_budget` wins. Otherwise the budget is a share of the context
+        Ollama runs the model with: `num_ctx` when set, else Ollama's default, never more
+        than the `context_length` the model supports.
+        """
+        settings = self.model_settings(model)
+        if settings.context_budget is not None:
+            return settings.context_budget
+        window = settings.num_ctx or OLLAMA_DEFAULT_NUM_CTX
+        if context_length:
+            window = min(window, context_length)
+        return int(window * CONTEXT_BUDGET_RATIO)
+
     def save(self) -> None:
-        """Persist configuration to TOML file."""
+        """Persist configuration to TOML file, keeping any other settings in it."""
         self._ensure_config_dir()
-        data = {
-            "ollama": {
+        data = self._load_file()
+        data.setdefault("ollama", {}).update(
+            {
                 "base_url": self.base_url,
                 "model": self.model,
                 "role": self.role,
             }
-        }
+        )
         with open(CONFIG_FILE, "wb") as file_:
             tomli_w.dump(data, file_)
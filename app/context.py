@@ -0,0 +1,102 @@
+"""Context window management for the chat history."""
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from app.history import MessageHistory
+
+CHARS_PER_TOKEN: int = 4
+MESSAGE_OVERHEAD_TOKENS: int = 4
+
+SUMMARY_PROMPT = (
+    "Summarize the following conversation in a few sentences. "
+    "Keep names, facts, decisions and open questions. Reply with the summary only."
+)
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+
+
+def estimate_tokens(content: str) -> int:
+    """Rough token count of a message."""
+    return MESSAGE_OVERHEAD_TOKENS + (len(content) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class ContextWindow:
+    """Selects the part of the conversation that fits a token budget.
+
+    The first (system) message is always kept, followed by the newest messages that fit.
+    A later system message, such as a role switch, is kept too when it would be evicted.
+    Older messages are left out of the request; when summarization is enabled they are
+    folded into a rolling summary that is sent in their place.
+    """
+
+    def __init__(self, summarize: bool = False) -> None:
+        self.summarize = summarize
+        self.summary: str | None = None
+        self.summarized_until: int = 1
+        self.first_kept: int = 1
+
+    def select(
+        self, messages: "MessageHistory", budget: int, commit: bool = True
+    ) -> list[dict[str, str]]:
+        """Messages to send to the model for the next turn, within `budget` tokens.
+
+        With `commit=False` the window is only previewed and `first_kept` is left as is.
+        """
+        head = messages[:1]
+        used = messages.tokens(0) if head else 0
+        summary = self.summary_message()
+        if summary:
+            used += estimate_tokens(summary["content"])
+
+        first = len(messages)
+        while first > 1:
+            cost = messages.tokens(first - 1)
+            if used + cost > budget and first < len(messages):
+                break
+            used += cost
+            first -= 1
+        if commit:
+            self.first_kept = first
+
+        if first == 1:
+            return messages[:]
+        pinned = messages.last_system(before=first)
+        return (
+            head
+            + ([summary] if summary else [])
+            + ([pinned] if pinned else [])
+            + messages[first:]
+        )
+
+    def summary_message(self) -> dict[str, str] | None:
+        """Rolling summary as a system message, if there is one."""
+        if not self.summary:
+            return None
+        return {"role": "system", "content": SUMMARY_HEADER + self.summary}
+
+    def pending_summary(self, messages: "MessageHistory") -> list[dict[str, str]]:
+        """Evicted messages that are not part of the rolling summary yet."""
+        if not self.summarize or self.first_kept <= self.summarized_until:
+            return []
+        return messages[self.summarized_until : self.first_kept]
+
+    def summary_request(self, evicted: list[dict[str, str]]) -> list[dict[str, str]]:
+        """Messages asking the model to fold evicted messages into the summary."""
+        transcript = "\n\n".join(f"{m['role']}: {m['content']}" for m in evicted)
+        if self.summary:
+            transcript = f"{SUMMARY_HEADER}{self.summary}\n\n{transcript}"
+        return [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": transcript},
+        ]
+
+    def update_summary(self, summary: str, until: int) -> None:
+        """Store a new rolling summary covering messages up to index `until`."""
+        self.summary = summary.strip() or self.summary
+        self.summarized_until = until
+
+    def reset(self) -> None:
+        """Forget the rolling summary, e.g. when the history is replaced."""
+        self.summary = None
+        self.summarized_until = 1
+        self.first_kept = 1
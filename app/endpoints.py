@@ -0,0 +1,87 @@
+"""Ollama endpoints with health tracking and load-aware routing."""
+
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+BASE_BACKOFF: float = 1.0
+MAX_BACKOFF: float = 60.0
+VIEW_TTL: float = 10.0
+
+
+@dataclass
+class Endpoint:
+    """An Ollama instance and what sai currently knows about it."""
+
+    url: str
+    weight: float = 1.0
+    in_flight: int = 0
+    failures: int = 0
+    ejected_until: float = 0.0
+    models: set[str] = field(default_factory=set)
+    loaded: set[str] = field(default_factory=set)
+    details: list[dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def healthy(self) -> bool:
+        """Whether the endpoint may receive requests."""
+        return time.monotonic() >= self.ejected_until
+
+    @property
+    def load(self) -> float:
+        """Requests in flight relative to the endpoint weight."""
+        return self.in_flight / self.weight
+
+    def mark_failure(self) -> None:
+        """Eject the endpoint, backing off exponentially on repeated failures."""
+        self.failures += 1
+        backoff = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (self.failures - 1))
+        self.ejected_until = time.monotonic() + backoff
+
+    def mark_success(self) -> None:
+        """Bring the endpoint back into rotation."""
+        self.failures = 0
+        self.ejected_until = 0.0
+
+
+class EndpointPool:
+    """Ranks endpoints for a model from a cached view of `/api/tags` and `/api/ps`."""
+
+    def __init__(self, endpoints: list[Endpoint], view_ttl: float = VIEW_TTL) -> None:
+        if not endpoints:
+            raise ValueError("At least one endpoint is required")
+        self.endpoints = endpoints
+        self.view_ttl = view_ttl
+        self.refreshed_at: float | None = None
+
+    @property
+    def primary(self) -> Endpoint:
+        """First configured endpoint."""
+        return self.endpoints[0]
+
+    @property
+    def stale(self) -> bool:
+        """Whether the cached model view should be refreshed."""
+        return self.refreshed_at is None or time.monotonic() - self.refreshed_at > self.view_ttl
+
+    def ranked(self, model: str | None = None) -> list[Endpoint]:
+        """Endpoints in the order they should be tried for `model`.
+
+        Healthy endpoints come first: those with the model loaded, then those that have
+        it, each group by lowest weighted load. Ejected endpoints follow, soonest to
+        recover first, so they are only probed when every healthy one failed.
+        """
+
+        def preference(endpoint: Endpoint) -> tuple[bool, bool, float, float]:
+            return (
+                model not in endpoint.loaded,
+                bool(endpoint.models) and model not in endpoint.models,
+                endpoint.load,
+                -endpoint.weight,
+            )
+
+        healthy = sorted((e for e in self.endpoints if e.healthy), key=preference)
+        ejected = sorted(
+            (e for e in self.endpoints if not e.healthy), key=lambda e: e.ejected_until
+        )
+        return healthy + ejected
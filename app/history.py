@@ -0,0 +1,164 @@
+"""Compact chat history that keeps only the recent messages in memory.
+
+Messages are stored as `__slots__` records with interned role names. Messages that left
+the context window are spilled to an anonymous temporary file, in the same log and
+offsets layout as saved sessions, and read back only when they are needed again, e.g.
+for a summary, a larger context budget or saving the session.
+"""
+
+import json
+import struct
+import sys
+import tempfile
+from collections.abc import Iterable, Iterator
+from typing import IO, overload
+
+from app.context import estimate_tokens
+
+# Offset of the message in the spill log and its estimated tokens.
+SPILL_RECORD = struct.Struct("<QI")
+
+
+class Message:
+    """A chat message, without the per-instance dictionary of a plain object."""
+
+    __slots__ = ("role", "content", "tokens")
+
+    def __init__(self, role: str, content: str) -> None:
+        self.role = sys.intern(role)
+        self.content = content
+        self.tokens = estimate_tokens(content)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, str]) -> "Message":
+        """Create a message from its API representation."""
+        return cls(data["role"], data["content"])
+
+    def to_dict(self) -> dict[str, str]:
+        """API representation of the message."""
+        return {"role": self.role, "content": self.content}
+
+
+class MessageHistory:
+    """List-like history of chat messages, returned as `{"role", "content"}` dicts.
+
+    The first message and the messages after the spilled ones stay in memory. Later
+    system messages, such as role switches, are few and stay in memory too, so the
+    context window can pin them without reading the spill file.
+    """
+
+    def __init__(self, messages: Iterable[dict[str, str]] = ()) -> None:
+        self._resident: list[Message] = [Message.from_dict(m) for m in messages]
+        self._spilled: int = 0
+        self._systems: dict[int, Message] = {}
+        self._log: IO[bytes] | None = None
+        self._offsets: IO[bytes] | None = None
+
+    @property
+    def spilled(self) -> int:
+        """Number of messages stored on disk."""
+        return self._spilled
+
+    def __len__(self) -> int:
+        return len(self._resident) + self._spilled
+
+    def _record(self, index: int) -> Message:
+        """Message at a non-negative index, read from the spill file if needed."""
+        if index == 0 or index > self._spilled:
+            return self._resident[index - self._spilled if index else 0]
+        if index in self._systems:
+            return self._systems[index]
+        assert self._log is not None and self._offsets is not None
+        self._offsets.seek((index - 1) * SPILL_RECORD.size)
+        start, _ = SPILL_RECORD.unpack(self._offsets.read(SPILL_RECORD.size))
+        self._log.seek(start)
+        return Message.from_dict(json.loads(self._log.readline()))
+
+    def _position(self, index: int) -> int:
+        position = index + len(self) if index < 0 else index
+        if not 0 <= position < len(self):
+            raise IndexError("message index out of range")
+        return position
+
+    @overload
+    def __getitem__(self, index: int) -> dict[str, str]: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[dict[str, str]]: ...
+
+    def __getitem__(self, index: int | slice) -> dict[str, str] | list[dict[str, str]]:
+        if isinstance(index, slice):
+            return [self._record(i).to_dict() for i in range(*index.indices(len(self)))]
+        return self._record(self._position(index)).to_dict()
+
+    def __setitem__(self, index: int, message: dict[str, str]) -> None:
+        """Replace a message that is still in memory, e.g. the system prompt."""
+        position = self._position(index)
+        if 0 < position <= self._spilled:
+            raise IndexError("cannot replace a spilled message")
+        self._resident[position - self._spilled if position else 0] = Message.from_dict(message)
+
+    def __iter__(self) -> Iterator[dict[str, str]]:
+        for index in range(len(self)):
+            yield self._record(index).to_dict()
+
+    def append(self, message: dict[str, str]) -> None:
+        """Add a message at the end of the history."""
+        self._resident.append(Message.from_dict(message))
+
+    def pop(self) -> dict[str, str]:
+        """Remove and return the last message, e.g. a question that was never answered."""
+        if not self._resident or (len(self._resident) == 1 and self._spilled):
+            raise IndexError("cannot pop a spilled message")
+        return self._resident.pop().to_dict()
+
+    def tokens(self, index: int) -> int:
+        """Estimated tokens of a message, without reading a spilled message back."""
+        position = self._position(index)
+        if position == 0 or position > self._spilled:
+            return self._record(position).tokens
+        assert self._offsets is not None
+        self._offsets.seek((position - 1) * SPILL_RECORD.size)
+        _, tokens = SPILL_RECORD.unpack(self._offsets.read(SPILL_RECORD.size))
+        return int(tokens)
+
+    def last_system(self, before: int) -> dict[str, str] | None:
+        """Newest system message after the first one and before index `before`."""
+        for position in range(min(before, len(self)) - 1, self._spilled, -1):
+            record = self._resident[position - self._spilled]
+            if record.role == "system":
+                return record.to_dict()
+        spilled = [index for index in self._systems if index < before]
+        return self._systems[max(spilled)].to_dict() if spilled else None
+
+    def spill(self, until: int) -> None:
+        """Move the messages between the first one and index `until` to disk."""
+        count = min(until, len(self)) - 1 - self._spilled
+        if count <= 0:
+            return
+        if self._log is None or self._offsets is None:
+            self._log = tempfile.TemporaryFile()  # pylint: disable=consider-using-with
+            self._offsets = tempfile.TemporaryFile()  # pylint: disable=consider-using-with
+        moved = self._resident[1 : 1 + count]
+        position = self._log.seek(0, 2)
+        lines: list[bytes] = []
+        records: list[bytes] = []
+        for offset, record in enumerate(moved, start=self._spilled + 1):
+            if record.role == "system":
+                self._systems[offset] = record
+            line = json.dumps(record.to_dict(), ensure_ascii=False).encode() + b"\n"
+            lines.append(line)
+            records.append(SPILL_RECORD.pack(position, record.tokens))
+            position += len(line)
+        self._log.write(b"".join(lines))
+        self._offsets.seek(0, 2)
+        self._offsets.write(b"".join(records))
+        del self._resident[1 : 1 + count]
+        self._spilled += count
+
+    def close(self) -> None:
+        """Delete the spill files."""
+        for file_ in (self._log, self._offsets):
+            if file_ is not None:
+                file_.close()
+        self._log = self._offsets = None
@@ -1,57 +1,347 @@
 """LLM module"""
 
+import asyncio
+import functools
+import importlib.util
 import json
-from typing import Any, AsyncGenerator
+import sys
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, AsyncGenerator, AsyncIterator, Self
 
-import httpx
+from app import config
+from app.endpoints import Endpoint, EndpointPool
+from app.utils import lazy_import
+
+if TYPE_CHECKING:
+    import httpx
+else:
+    httpx = lazy_import("httpx")
 
 
 class OllamaError(Exception):
     """Exception raised when Ollama API responded with an error."""
 
 
+@dataclass
+class ThinkingDelta:
+    """Piece of the model reasoning."""
+
+    text: str
+
+
+@dataclass
+class ContentDelta:
+    """Piece of the model answer."""
+
+    text: str
+
+
+@dataclass
+class ToolCalls:
+    """Tools the model asked to call, as `{"function": {"name", "arguments"}}` dicts."""
+
+    calls: list[dict[str, Any]]
+
+
+@dataclass
+class StreamDone:
+    """Final message of a stream, and the endpoint that served it."""
+
+    data: dict[str, Any]
+    host: str = ""
+    cached: bool = False
+
+
+StreamEvent = ThinkingDelta | ContentDelta | ToolCalls | StreamDone
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncGenerator[dict[str, Any], Any]:
+    """Decode newline-delimited JSON from arbitrarily split byte chunks."""
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while (end := buffer.find(b"\n", start)) != -1:
+            line = buffer[start:end]
+            if line.strip():
+                yield json.loads(line)
+            start = end + 1
+        del buffer[:start]
+    if buffer.strip():
+        yield json.loads(buffer)
+
+
+@functools.cache
+def http2_available() -> bool:
+    """Whether the `h2` package needed for HTTP/2 is installed, warning once if it is not."""
+    if importlib.util.find_spec("h2") is not None:
+        return True
+    print(
+        'sai: http2 = true needs the h2 package, install it with `pip install "sai-chat[http2]"`.'
+        " Using HTTP/1.1.",
+        file=sys.stderr,
+    )
+    return False
+
+
+def _error_from_response(body: bytes, status_code: int) -> OllamaError:
+    """Error from a failed response, using Ollama's JSON error message when there is one."""
+    try:
+        message = json.loads(body)["error"]
+    except (ValueError, KeyError, TypeError):
+        message = f"HTTP {status_code}"
+    return OllamaError(message)
+
+
+def chat_payload(
+    model: str,
+    messages: list[dict[str, Any]],
+    settings: config.ModelConfig | None = None,
+    response_format: str | dict[str, Any] | None = None,
+    tools: list[dict[str, Any]] | None = None,
+) -> dict[str, Any]:
+    """Request body for `/api/chat`, with the `keep_alive` and `num_ctx` of the model.
+
+    `response_format` is sent as `format`: `"json"` or a JSON schema the answer must match.
+    """
+    payload: dict[str, Any] = {"model": model, "messages": messages}
+    if settings and settings.keep_alive is not None:
+        payload["keep_alive"] = settings.keep_alive
+    if settings and settings.num_ctx:
+        payload["options"] = {"num_ctx": settings.num_ctx}
+    if response_format is not None:
+        payload["format"] = response_format
+    if tools:
+        payload["tools"] = tools
+    return payload
+
+
 class OllamaHandler:
-    """Handler for interacting with the Ollama API."""
+    """Handler for interacting with the Ollama API.
+
+    The handler owns one keep-alive connection pool per endpoint that is reused by every
+    request, so it must be used from one event loop and closed with `aclose` when done.
+    With several endpoints, each request goes to the least loaded healthy endpoint that
+    has the model loaded, and fails over to the next one while the request is being set up.
+    """
 
-    def __init__(self, url: str, timeout: int) -> None:
-        self.base_url = url
+    def __init__(
+        self,
+        url: str,
+        timeout: int,
+        limits: "httpx.Limits | None" = None,
+        http2: bool = False,
+        endpoints: list[Endpoint] | None = None,
+    ) -> None:
+        self.pool = EndpointPool(endpoints or [Endpoint(url=url)])
+        self.base_url = self.pool.primary.url
         self.timeout = timeout
+        self.limits = limits or httpx.Limits()
+        self.http2 = http2 and http2_available()
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._refresh_task: asyncio.Task[None] | None = None
+
+    @classmethod
+    def from_config(
+        cls, cfg: config.OllamaConfig, endpoints: list[Endpoint] | None = None
+    ) -> Self:
+        """Create a handler with connection pools sized from the config.
+
+        `endpoints` replaces the configured endpoints, e.g. to target a single host.
+        """
+        return cls(
+            url=cfg.base_url,
+            timeout=config.HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=cfg.max_connections,
+                max_keepalive_connections=cfg.max_keepalive_connections,
+                keepalive_expiry=cfg.keepalive_expiry,
+            ),
+            http2=cfg.http2,
+            endpoints=endpoints
+            or [Endpoint(url=e.url, weight=e.weight) for e in cfg.endpoint_list()],
+        )
+
+    def client_for(self, endpoint: Endpoint) -> "httpx.AsyncClient":
+        """Long-lived HTTP client of an endpoint, created on first use."""
+        client = self._clients.get(endpoint.url)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                base_url=endpoint.url,
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2,
+            )
+            self._clients[endpoint.url] = client
+        return client
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        """HTTP client of the primary endpoint."""
+        return self.client_for(self.pool.primary)
+
+    async def aclose(self) -> None:
+        """Close the underlying connection pools."""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        clients, self._clients = list(self._clients.values()), {}
+        await asyncio.gather(*(client.aclose() for client in clients))
+
+    async def _refresh_endpoint(self, endpoint: Endpoint) -> None:
+        """Update which models an endpoint has and has loaded."""
+        client = self.client_for(endpoint)
+        try:
+            tags, running = await asyncio.gather(client.get("/api/tags"), client.get("/api/ps"))
+            endpoint.details = tags.json()["models"]
+            endpoint.models = {item["model"] for item in endpoint.details}
+            endpoint.loaded = {item["model"] for item in running.json().get("models", [])}
+        except (httpx.HTTPError, ValueError, KeyError):
+            endpoint.mark_failure()
+        else:
+            endpoint.mark_success()
+
+    async def refresh_view(self) -> None:
+        """Refresh the cached model view of every endpoint, probing ejected ones too."""
+        await asyncio.gather(*(self._refresh_endpoint(e) for e in self.pool.endpoints))
+        self.pool.refreshed_at = time.monotonic()
+
+    def _ranked(self, model: str | None) -> list[Endpoint]:
+        """Endpoints to try for a model, refreshing a stale view in the background."""
+        if len(self.pool.endpoints) > 1 and self.pool.stale:
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = asyncio.create_task(self.refresh_view())
+        return self.pool.ranked(model)
+
+    async def list_model_details(self) -> list[dict[str, Any]]:
+        """Model entries of `/api/tags`, merged across endpoints."""
+        if len(self.pool.endpoints) == 1:
+            result = await self.client.get(url="/api/tags")
+            models: list[dict[str, Any]] = result.json()["models"]
+            return models
+        await self.refresh_view()
+        healthy = [e for e in self.pool.endpoints if not e.failures]
+        if not healthy:
+            raise httpx.ConnectError("No Ollama endpoint is reachable")
+        details: dict[str, dict[str, Any]] = {}
+        for endpoint in healthy:
+            for item in endpoint.details:
+                details.setdefault(item["model"], item)
+        return sorted(details.values(), key=lambda item: str(item["model"]))
 
     async def list_models(self) -> list[str]:
         """List OLLAMA models"""
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            result = await client.get(url=f"{self.base_url}/api/tags")
-            models = [item["model"] for item in result.json()["models"]]
-            return models
+        return [item["model"] for item in await self.list_model_details()]
+
+    async def show_model(self, model: str) -> dict[str, Any]:
+        """Details of a model from `/api/show`."""
+        endpoint = self._ranked(model)[0]
+        result = await self.client_for(endpoint).post(url="/api/show", json={"model": model})
+        if not result.is_success:
+            raise _error_from_response(result.content, result.status_code)
+        details: dict[str, Any] = result.json()
+        return details
+
+    async def embed(self, model: str, inputs: list[str]) -> list[list[float]]:
+        """Embeddings of `inputs` from `/api/embed`, in the same order."""
+        endpoint = self._ranked(model)[0]
+        result = await self.client_for(endpoint).post(
+            url="/api/embed", json={"model": model, "input": inputs}
+        )
+        if not result.is_success:
+            raise _error_from_response(result.content, result.status_code)
+        embeddings: list[list[float]] = result.json()["embeddings"]
+        return embeddings
+
+    async def preload_model(self, model: str, keep_alive: str | int | None = None) -> bool:
+        """Preload a model into Ollama to get faster response times.
+
+        Also used to keep an idle model loaded, since every request resets its `keep_alive`.
+        """
+        payload: dict[str, Any] = {"model": model}
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        last_error: Exception | None = None
+        for endpoint in self._ranked(model):
+            try:
+                result = await self.client_for(endpoint).post(url="/api/chat", json=payload)
+            except httpx.TransportError as error:
+                endpoint.mark_failure()
+                last_error = error
+                continue
+            loaded = bool(result.json().get("done"))
+            if loaded:
+                endpoint.loaded.add(model)
+                return True
+        if last_error is not None:
+            raise last_error
+        return False
+
+    async def prefill(self, payload: dict[str, Any]) -> dict[str, Any]:
+        """Evaluate the messages of a chat request without generating anything.
+
+        Ollama keeps the evaluated prompt in its cache, so a following request that starts
+        with the same messages only evaluates what was added. Returns Ollama's final
+        message, with the prompt evaluation timings.
+        """
+        options = {**payload.get("options", {}), "num_predict": 0}
+        payload = {**payload, "stream": False, "options": options}
+        endpoint = self._ranked(payload.get("model"))[0]
+        result = await self.client_for(endpoint).post(url="/api/chat", json=payload)
+        if not result.is_success:
+            raise _error_from_response(result.content, result.status_code)
+        data: dict[str, Any] = result.json()
+        return data
+
+    async def _open_stream(self, payload: dict[str, Any]) -> tuple[Endpoint, "httpx.Response"]:
+        """Send a streaming chat request, failing over until an endpoint accepts it."""
+        model = payload.get("model")
+        not_found: OllamaError | None = None
+        last_error: Exception | None = None
+        for endpoint in self._ranked(model):
+            client = self.client_for(endpoint)
+            request = client.build_request("POST", "/api/chat", json=payload)
+            endpoint.in_flight += 1
+            try:
+                response = await client.send(request, stream=True)
+            except httpx.TransportError as error:
+                endpoint.in_flight -= 1
+                endpoint.mark_failure()
+                last_error = error
+                continue
+            if response.is_success:
+                return endpoint, response
+
+            endpoint.in_flight -= 1
+            failure = _error_from_response(await response.aread(), response.status_code)
+            await response.aclose()
+            if response.status_code >= 500:
+                endpoint.mark_failure()
+            if response.status_code == 404:
+                not_found = failure
+            last_error = failure
+        raise not_found or last_error or OllamaError("No Ollama endpoint available")
 
-    async def preload_model(self, model: str) -> bool:
-        """Preload a model into Ollama to get faster response times"""
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            result = await client.post(url=f"{self.base_url}/api/chat", params={"model": model})
-            return result.json().get("done")
-
-    async def stream_response(self, payload: dict[str, Any]) -> AsyncGenerator[str, Any]:
-        """Sends a POST request to the Ollama API and streams the response in real time."""
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            async with client.stream(
-                "POST", f"{self.base_url}/api/chat", json=payload
-            ) as response:
-                md_text = ""
-                is_thinking = False
-                async for chunk in response.aiter_text():
-                    data = json.loads(chunk)
-                    if "error" in data:
-                        raise OllamaError(data["error"])
-                    if not "message" in data:
-                        raise OllamaError(f"No message in response: {chunk}")
-                    if "thinking" in data["message"]:
-                        if not is_thinking:
-                            md_text += "THINKING 🤔: "
-                            is_thinking = True
-                        md_text += data["message"]["thinking"]
-                    else:
-                        if is_thinking:
-                            md_text += "\n\n---\n"
-                            is_thinking = False
-                        md_text += data["message"].get("content", "\n")
-                    yield md_text
+    async def stream_response(self, payload: dict[str, Any]) -> AsyncGenerator[StreamEvent, Any]:
+        """Sends a POST request to the Ollama API and streams the response deltas in real time."""
+        endpoint, response = await self._open_stream(payload)
+        try:
+            async for data in iter_ndjson(response.aiter_bytes()):
+                if "error" in data:
+                    raise OllamaError(data["error"])
+                if "message" not in data:
+                    raise OllamaError(f"No message in response: {data}")
+                message = data["message"]
+                if message.get("thinking"):
+                    yield ThinkingDelta(message["thinking"])
+                if message.get("content"):
+                    yield ContentDelta(message["content"])
+                if message.get("tool_calls"):
+                    yield ToolCalls(message["tool_calls"])
+                if data.get("done"):
+                    endpoint.loaded.add(str(payload.get("model")))
+                    yield StreamDone(data, host=endpoint.url)
+        finally:
+            endpoint.in_flight -= 1
+            await response.aclose()
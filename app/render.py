@@ -0,0 +1,333 @@
+"""Incremental rendering of streamed Markdown."""
+
+import re
+import time
+from dataclasses import dataclass
+
+from rich.console import Console, ConsoleOptions
+from rich.markdown import Markdown
+from rich.panel import Panel
+from rich.segment import Segment, Segments
+
+FENCE_MARKERS = ("```", "~~~")
+LIST_ITEM = re.compile(r"([-*+]|\d+[.)])\s")
+# Top-level lines that end a list: headings, quotes, fences and thematic breaks.
+LIST_END = re.compile(r"#|>|```|~~~|(?:[-*_][ \t]*){3,}$")
+THEMATIC_BREAK = re.compile(r"(?:[-*_][ \t]*){3,}$")
+# Lines that still belong with the block above them when it is rendered alone: quotes and
+# tables continue or merge with it, and a thematic break changes its spacing.
+JOINS_PREVIOUS = re.compile(rf">|\||{THEMATIC_BREAK.pattern}")
+# Reference link definitions, e.g. "[docs]: https://example.com", used anywhere in the text.
+LINK_DEFINITION = re.compile(r"^ {0,3}\[[^\]]+\]:", re.MULTILINE)
+PANEL_HORIZONTAL_OVERHEAD: int = 4
+THINKING_HEADER = "THINKING 🤔: "
+THINKING_SEPARATOR = "\n\n---\n"
+# Share of the time the terminal may spend drawing frames before redraws are spaced out.
+REDRAW_BUDGET: float = 0.25
+# Redraws spaced out further than this fall back to plain text in `auto` mode.
+MAX_REDRAW_INTERVAL: float = 1.0
+# Frames measured before deciding to fall back, so one slow frame does not decide it.
+MIN_MEASURED_FRAMES: int = 3
+FRAME_COST_SMOOTHING: float = 0.3
+
+
+def _starts_new_block(line: str) -> bool:
+    """Whether a complete line after a blank line opens an independent block."""
+    return (
+        not line[0].isspace()
+        and not LIST_ITEM.match(line)
+        and not JOINS_PREVIOUS.match(line.strip())
+    )
+
+
+def _closes_fence(line: str, marker: str) -> bool:
+    """Whether a stripped line closes fenced code opened with `marker`."""
+    return line.startswith(marker) and not line.strip(marker[0])
+
+
+def _list_position(item: re.Match[str]) -> tuple[str, int]:
+    """Delimiter of a list item, e.g. "-" or ".", and its number, 0 for bullets."""
+    marker = item.group(1)
+    return marker[-1], int(marker[:-1] or 0)
+
+
+def _continues(previous: tuple[str, int | None], position: tuple[str, int]) -> bool:
+    """Whether an item is the next one of the same list, so it renders the same alone."""
+    delimiter, number = position
+    if delimiter in ".)":
+        return previous == (delimiter, number - 1)
+    return previous == position
+
+
+def _renumbers(previous: tuple[str, int | None] | None, position: tuple[str, int]) -> bool:
+    """Whether an item belongs to the same list but out of order, so it gets a new number."""
+    return (
+        previous is not None
+        and previous[0] == position[0]
+        and not _continues(previous, position)
+    )
+
+
+@dataclass
+class Block:
+    """Piece of streamed Markdown, with what is needed to render it on its own."""
+
+    text: str
+    # Opening fence line, e.g. "```python\n", when the piece starts inside fenced code.
+    fence: str = ""
+    # Whether the fenced code is still open at the end of the piece.
+    open_fence: bool = False
+    # Whether the piece continues the previous one, e.g. the next list item or more lines
+    # of code, and is drawn right below it instead of after a blank line.
+    joined: bool = False
+
+
+def split_closed_blocks(
+    text: str, fence: str = "", joined: bool = False
+) -> tuple[list[Block], Block]:
+    """Split text into Markdown pieces that can no longer change and the open remainder.
+
+    A block is closed once it is followed by a blank line and a complete line that starts
+    a new top-level block, other than a quote, a table row or a thematic break, unless it
+    ends with a thematic break itself. Blank lines inside fenced code never close a
+    block, and indented lines are kept with the previous block. Long lists and code are
+    split too, so they are not rendered again in full for every token: a list item is
+    closed by the next top-level item while the list is numbered in order, and a line of
+    top-level fenced code by the next complete line that does not close the fence.
+    `fence` and `joined` describe where `text` starts, as given by the returned remainder.
+    """
+    blocks: list[Block] = []
+    start = pos = 0
+    opener = fence
+    marker: str | None = fence.strip()[:3] if fence else None
+    # Delimiter and number of the last item of the current list, with no number once the
+    # list is numbered out of order, as the items are then renumbered when rendered.
+    list_position: tuple[str, int | None] | None = None
+    # Whether the current item holds a nested list, quote or code, which is followed by a
+    # blank line when the next item is rendered with it.
+    nested = False
+    prev_blank = prev_code = prev_break = False
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        top_level = marker is None and bool(stripped) and not line[0].isspace()
+        item = LIST_ITEM.match(line) if top_level and not LIST_END.match(stripped) else None
+        position = _list_position(item) if item else None
+        closing = marker is not None and _closes_fence(stripped, marker)
+        boundary: bool | None = None
+        if pos > start and stripped and line.endswith("\n"):
+            if marker is None and prev_blank and not prev_break and _starts_new_block(line):
+                boundary = False
+            elif (
+                position
+                and list_position
+                and not nested
+                and _continues(list_position, position)
+            ):
+                boundary = True
+            elif opener and prev_code and not closing:
+                boundary = True
+        if boundary is not None:
+            open_fence = marker is not None
+            blocks.append(Block(text[start:pos], fence, open_fence, joined))
+            start, fence, joined = pos, opener if open_fence else "", boundary
+        if top_level:
+            if position:
+                nested = False
+                if _renumbers(list_position, position):
+                    list_position = (position[0], None)
+                else:
+                    list_position = position
+            elif prev_blank or LIST_END.match(stripped):
+                list_position = None
+        elif marker is None and (LIST_ITEM.match(stripped) or LIST_END.match(stripped)):
+            nested = True
+        prev_code = marker is not None and bool(stripped)
+        if stripped:
+            prev_break = marker is None and bool(THEMATIC_BREAK.match(stripped))
+        if marker is None and stripped.startswith(FENCE_MARKERS):
+            marker = stripped[:3]
+            opener = line if line.startswith(FENCE_MARKERS) else ""
+            prev_code = False
+        elif closing:
+            marker, opener, prev_code = None, "", False
+        prev_blank = not stripped and marker is None
+        pos += len(line)
+    return blocks, Block(text[start:], fence, joined=joined)
+
+
+class IncrementalMarkdown:
+    """Markdown document built from streamed text.
+
+    Closed blocks are rendered once and their lines are cached, so every refresh only
+    renders the last block that is still receiving text. Once the text defines a reference
+    link, it is rendered in full instead, as the links can be used in any block.
+    """
+
+    def __init__(self, console: Console) -> None:
+        self.console = console
+        self._blocks: list[Block] = []
+        self._pending: list[str] = []
+        self._open = Block("")
+        self._lines: list[list[Segment]] = []
+        self._rendered_blocks: int = 0
+        self._width: int | None = None
+        self._unsplit = False
+
+    @property
+    def text(self) -> str:
+        """Full Markdown source received so far."""
+        return "".join(block.text for block in self._blocks) + "".join(self._pending)
+
+    def append(self, text: str) -> None:
+        """Add streamed text to the document."""
+        if text:
+            self._pending.append(text)
+
+    def _render_block(self, block: Block, options: ConsoleOptions) -> list[list[Segment]]:
+        """Lines of a piece, without the blank line or code padding that joins it to the
+        pieces before and after it."""
+        lines = self.console.render_lines(Markdown(block.fence + block.text), options)
+        if block.joined:
+            lines = lines[1:]
+        if block.open_fence:
+            lines = lines[:-1]
+        return lines
+
+    def render_lines(
+        self, options: ConsoleOptions, max_height: int | None = None
+    ) -> list[list[Segment]]:
+        """Render the document, returning at most the last `max_height` lines."""
+        if options.max_width != self._width:
+            self._width = options.max_width
+            self._lines = []
+            self._rendered_blocks = 0
+
+        pending = "".join(self._pending)
+        if not self._unsplit and LINK_DEFINITION.search(pending):
+            self._unsplit = True
+            pending = self.text
+            self._blocks, self._lines, self._rendered_blocks = [], [], 0
+        blocks: list[Block] = []
+        if self._unsplit:
+            self._open = Block(pending)
+        else:
+            blocks, self._open = split_closed_blocks(
+                pending, self._open.fence, self._open.joined
+            )
+        self._blocks.extend(blocks)
+        self._pending = [self._open.text] if self._open.text else []
+
+        blank = [Segment(" " * options.max_width)]
+        for block in self._blocks[self._rendered_blocks :]:
+            if self._lines and not block.joined:
+                self._lines.append(blank)
+            self._lines.extend(self._render_block(block, options))
+        self._rendered_blocks = len(self._blocks)
+
+        tail = self._open
+        open_lines = self._render_block(tail, options) if tail.text.strip() else []
+        if open_lines and self._lines and not tail.joined:
+            open_lines.insert(0, blank)
+        if max_height is None:
+            return self._lines + open_lines
+        if len(open_lines) >= max_height:
+            return open_lines[-max_height:]
+        return self._lines[len(open_lines) - max_height :] + open_lines
+
+
+def create_scrolling_panel(
+    renderer: IncrementalMarkdown,
+    title: str,
+    subtitle: str,
+    border_style: str,
+    max_height: int,
+    options: ConsoleOptions,
+    expand: bool = False,
+) -> Panel:
+    """Create a panel showing only the last N lines of markdown content."""
+    inner_options = options.update_width(max(1, options.max_width - PANEL_HORIZONTAL_OVERHEAD))
+    visible_lines = renderer.render_lines(inner_options, max_height=max_height)
+    segments = []
+    for i, line in enumerate(visible_lines):
+        segments.extend(line)
+        if i < len(visible_lines) - 1:
+            segments.append(Segment("\n"))
+
+    return Panel(
+        renderable=Segments(segments),
+        title=title,
+        subtitle=subtitle,
+        title_align="right",
+        padding=(0, 1),
+        border_style=border_style,
+        expand=expand,
+    )
+
+
+class RedrawThrottle:
+    """Paces the redraws of a live panel by how long the terminal takes to draw them.
+
+    Over SSH or in a multiplexer, writing a full frame can take longer than the time
+    between frames. In adaptive mode, the interval between frames starts at
+    `1 / refresh_rate` and grows so that drawing takes at most `REDRAW_BUDGET` of the
+    time, and `too_slow` tells when even `MAX_REDRAW_INTERVAL` is not enough.
+    """
+
+    def __init__(self, refresh_rate: float, adaptive: bool = True) -> None:
+        self.min_interval = 1 / refresh_rate
+        self.interval = self.min_interval
+        self.adaptive = adaptive
+        self.frames = 0
+        self.frame_cost = 0.0
+        self._next_frame = 0.0
+
+    def due(self) -> bool:
+        """Whether the next frame can be drawn now."""
+        return time.monotonic() >= self._next_frame
+
+    def record(self, seconds: float) -> None:
+        """Account for a frame that took `seconds` to draw and schedule the next one."""
+        self.frames += 1
+        if self.frames == 1:
+            self.frame_cost = seconds
+        else:
+            self.frame_cost += FRAME_COST_SMOOTHING * (seconds - self.frame_cost)
+        if self.adaptive:
+            self.interval = max(self.min_interval, self.frame_cost / REDRAW_BUDGET)
+        self._next_frame = time.monotonic() + self.interval
+
+    @property
+    def too_slow(self) -> bool:
+        """Whether live redraws cost too much and the text should be appended instead."""
+        return (
+            self.adaptive
+            and self.frames >= MIN_MEASURED_FRAMES
+            and self.interval > MAX_REDRAW_INTERVAL
+        )
+
+
+class PlainStream:
+    """Streamed text written as it arrives, without moving the cursor back.
+
+    Text is written in batches, at most once per `interval` seconds.
+    """
+
+    def __init__(self, console: Console, interval: float) -> None:
+        self.console = console
+        self.interval = interval
+        self._pending: list[str] = []
+        self._next_write = 0.0
+
+    def append(self, text: str) -> None:
+        """Add text, writing it if the last write is old enough."""
+        self._pending.append(text)
+        if time.monotonic() >= self._next_write:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the text received since the last write."""
+        text = "".join(self._pending)
+        self._pending = []
+        if text:
+            self.console.out(text, end="", highlight=False)
+        self._next_write = time.monotonic() + self.interval
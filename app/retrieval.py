@@ -0,0 +1,498 @@
+"""Retrieval of local document chunks for the chat context.
+
+`/index <path>` splits text files into chunks and embeds them with Ollama. The vectors are
+stored normalized in a memory-mapped float32 file under `~/.sai/index`, so a cosine search
+is a single matrix-vector product. The chunk texts go to a JSONL file with an 8-byte
+offset per chunk, like the session logs.
+
+Re-indexing only embeds files whose content changed. Rows of changed or deleted files are
+left in place and skipped by the search, until they outnumber the live rows and the files
+are compacted. NumPy is only needed for this feature.
+"""
+
+import asyncio
+import hashlib
+import importlib.util
+import json
+import os
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from app.config import CONFIG_DIR
+from app.context import estimate_tokens
+from app.llm import OllamaHandler
+from app.store import OFFSET
+
+if TYPE_CHECKING:
+    import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+
+INDEX_DIR = CONFIG_DIR / "index"
+
+CHUNK_CHARS: int = 1500
+EMBED_BATCH: int = 32
+MAX_FILE_BYTES: int = 2_000_000
+TEXT_SUFFIXES = frozenset(
+    ".c .cfg .cpp .css .csv .go .h .html .ini .java .js .json .md .py .rs .rst .sh .sql "
+    ".toml .ts .txt .yaml .yml".split()
+)
+
+CONTEXT_HEADER = "Excerpts from local files, use them if they are relevant:\n"
+
+
+class IndexLockedError(Exception):
+    """Exception raised when another process is updating the index."""
+
+
+def numpy_available() -> bool:
+    """Whether the optional NumPy dependency is installed."""
+    return importlib.util.find_spec("numpy") is not None
+
+
+def split_chunks(text: str, size: int = CHUNK_CHARS) -> list[str]:
+    """Split text into chunks of up to `size` characters, on paragraph boundaries if possible."""
+    chunks: list[str] = []
+    current = ""
+    for paragraph in text.split("\n\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) + 2 > size:
+            chunks.append(current)
+            current = ""
+        while len(paragraph) > size:
+            chunks.append(paragraph[:size])
+            paragraph = paragraph[size:]
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def iter_files(path: Path) -> Iterator[Path]:
+    """Text files under `path`, skipping hidden files and directories."""
+    if path.is_file():
+        yield path
+        return
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            file_path = Path(root) / name
+            if not name.startswith(".") and file_path.suffix.lower() in TEXT_SUFFIXES:
+                yield file_path
+
+
+@dataclass
+class IndexedFile:
+    """An indexed file and the rows of its chunks."""
+
+    mtime: float
+    size: int
+    sha256: str
+    start: int = 0
+    end: int = 0
+
+
+@dataclass
+class IndexReport:
+    """Outcome of indexing a path."""
+
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    unchanged: int = 0
+    chunks: int = 0
+
+    def summary(self) -> str:
+        """Human readable summary."""
+        return (
+            f"{self.added} files added, {self.updated} updated, {self.removed} removed, "
+            f"{self.unchanged} unchanged. {self.chunks} chunks embedded."
+        )
+
+
+@dataclass
+class Retrieved:
+    """A chunk found by a search."""
+
+    path: str
+    text: str
+    score: float
+
+
+@dataclass
+class _PendingFile:
+    key: str
+    info: IndexedFile
+    chunks: list[str] = field(default_factory=list)
+
+
+class VectorIndex:
+    """Persistent index of document chunks and their embeddings."""
+
+    def __init__(self, root: Path = INDEX_DIR) -> None:
+        self.root = root
+        self.meta_file = root / "index.json"
+        self.vectors_file = root / "vectors.f32"
+        self.chunks_file = root / "chunks.jsonl"
+        self.offsets_file = root / "chunks.idx"
+        self.lock_file = root / "index.lock"
+        self.model: str | None = None
+        self.dim: int = 0
+        self.count: int = 0
+        self.files: dict[str, IndexedFile] = {}
+        self._matrix: "np.ndarray[Any, Any] | None" = None
+        self._alive: "np.ndarray[Any, Any] | None" = None
+        self._load()
+
+    def _load(self) -> None:
+        self._matrix = self._alive = None
+        if not self.meta_file.exists():
+            self.model, self.dim, self.count, self.files = None, 0, 0, {}
+            return
+        with open(self.meta_file, "rb") as file_:
+            data = json.load(file_)
+        self.model = data["model"]
+        self.dim = data["dim"]
+        self.count = data["count"]
+        self.files = {key: IndexedFile(**info) for key, info in data["files"].items()}
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Hold the index lock, so only one process changes the files at a time.
+
+        Other processes only read the rows up to the saved count, so they need no lock.
+        """
+        self.root.mkdir(exist_ok=True, parents=True)
+        with open(self.lock_file, "wb") as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError as error:
+                    raise IndexLockedError(
+                        "the index is being updated by another sai process"
+                    ) from error
+            yield
+
+    def _log_end(self) -> int:
+        """Size of the chunk log up to the end of the last saved row."""
+        if not self.count:
+            return 0
+        with open(self.offsets_file, "rb") as offsets, open(self.chunks_file, "rb") as log:
+            offsets.seek((self.count - 1) * OFFSET.size)
+            (start,) = OFFSET.unpack(offsets.read(OFFSET.size))
+            log.seek(start)
+            return int(start) + len(log.readline())
+
+    def _drop_unsaved_rows(self) -> None:
+        """Truncate rows written after the metadata was last saved.
+
+        `add_file` appends rows before `save` records them, so an interrupted `/index` can
+        leave rows past `count`; new rows must start right after the saved ones. Only
+        called while holding the lock, as the rows may belong to a running `/index`.
+        """
+        sizes = {
+            self.offsets_file: self.count * OFFSET.size,
+            self.vectors_file: self.count * self.dim * 4,
+            self.chunks_file: self._log_end(),
+        }
+        for path, size in sizes.items():
+            if path.exists() and path.stat().st_size > size:
+                os.truncate(path, size)
+
+    def save(self) -> None:
+        """Atomically replace the index metadata."""
+        self.root.mkdir(exist_ok=True, parents=True)
+        data = {
+            "model": self.model,
+            "dim": self.dim,
+            "count": self.count,
+            "files": {key: asdict(info) for key, info in self.files.items()},
+        }
+        tmp_file = self.meta_file.with_suffix(".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as file_:
+            json.dump(data, file_, ensure_ascii=False)
+        os.replace(tmp_file, self.meta_file)
+
+    @property
+    def chunk_count(self) -> int:
+        """Number of searchable chunks."""
+        return sum(info.end - info.start for info in self.files.values())
+
+    def clear(self) -> None:
+        """Remove the whole index."""
+        for path in (self.meta_file, self.vectors_file, self.chunks_file, self.offsets_file):
+            path.unlink(missing_ok=True)
+        self.model = None
+        self.dim = 0
+        self.count = 0
+        self.files = {}
+        self._matrix = self._alive = None
+
+    def add_file(
+        self, key: str, info: IndexedFile, chunks: list[str], vectors: "np.ndarray[Any, Any]"
+    ) -> None:
+        """Append the chunks of a file and their vectors, replacing its previous rows."""
+        import numpy as np  # pylint: disable=import-outside-toplevel
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not self.dim:
+            self.dim = vectors.shape[1]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+
+        self.root.mkdir(exist_ok=True, parents=True)
+        with (
+            open(self.chunks_file, "ab") as log,
+            open(self.offsets_file, "ab") as offsets,
+            open(self.vectors_file, "ab") as vectors_out,
+        ):
+            position = log.tell()
+            lines: list[bytes] = []
+            positions: list[bytes] = []
+            for chunk in chunks:
+                line = json.dumps({"path": key, "text": chunk}, ensure_ascii=False).encode()
+                lines.append(line + b"\n")
+                positions.append(OFFSET.pack(position))
+                position += len(line) + 1
+            log.write(b"".join(lines))
+            offsets.write(b"".join(positions))
+            vectors_out.write(vectors.tobytes())
+
+        info.start, info.end = self.count, self.count + len(chunks)
+        self.files[key] = info
+        self.count = info.end
+        self._matrix = self._alive = None
+
+    def _remove(self, key: str) -> None:
+        del self.files[key]
+        self._alive = None
+
+    def _compact(self) -> None:
+        """Rewrite the files without the rows of changed and deleted files."""
+        import numpy as np  # pylint: disable=import-outside-toplevel
+
+        matrix = self._vectors()
+        positions = np.fromfile(self.offsets_file, dtype="<u8")
+        log_size = self.chunks_file.stat().st_size
+        tmp_files = [
+            path.with_name(path.name + ".tmp")
+            for path in (self.vectors_file, self.chunks_file, self.offsets_file)
+        ]
+        row = 0
+        with (
+            open(self.chunks_file, "rb") as log,
+            open(tmp_files[0], "wb") as vectors_out,
+            open(tmp_files[1], "wb") as log_out,
+            open(tmp_files[2], "wb") as offsets_out,
+        ):
+            for info in sorted(self.files.values(), key=lambda info: info.start):
+                start = int(positions[info.start])
+                end = int(positions[info.end]) if info.end < self.count else log_size
+                shifted = positions[info.start : info.end] - start + log_out.tell()
+                log.seek(start)
+                log_out.write(log.read(end - start))
+                offsets_out.write(shifted.astype("<u8").tobytes())
+                vectors_out.write(np.ascontiguousarray(matrix[info.start : info.end]).tobytes())
+                info.start, info.end = row, row + info.end - info.start
+                row = info.end
+        self._matrix = self._alive = None
+        for tmp_file, path in zip(
+            tmp_files, (self.vectors_file, self.chunks_file, self.offsets_file)
+        ):
+            os.replace(tmp_file, path)
+        self.count = row
+
+    def _vectors(self) -> "np.ndarray[Any, Any]":
+        """Memory-mapped matrix of all rows, one normalized vector each."""
+        import numpy as np  # pylint: disable=import-outside-toplevel
+
+        if self._matrix is None:
+            self._matrix = np.memmap(
+                self.vectors_file, dtype=np.float32, mode="r", shape=(self.count, self.dim)
+            )
+        return self._matrix
+
+    def _alive_rows(self) -> "np.ndarray[Any, Any]":
+        """Mask of the rows that belong to a current file."""
+        import numpy as np  # pylint: disable=import-outside-toplevel
+
+        if self._alive is None:
+            alive = np.zeros(self.count, dtype=bool)
+            for info in self.files.values():
+                alive[info.start : info.end] = True
+            self._alive = alive
+        return self._alive
+
+    def _chunk(self, row: int) -> dict[str, str]:
+        with open(self.offsets_file, "rb") as offsets, open(self.chunks_file, "rb") as log:
+            offsets.seek(row * OFFSET.size)
+            (start,) = OFFSET.unpack(offsets.read(OFFSET.size))
+            log.seek(start)
+            chunk: dict[str, str] = json.loads(log.readline())
+            return chunk
+
+    def nearest(
+        self, query: "np.ndarray[Any, Any]", k: int, min_score: float = 0.0
+    ) -> list[Retrieved]:
+        """The `k` chunks most similar to a query vector, best first."""
+        import numpy as np  # pylint: disable=import-outside-toplevel
+
+        if not self.chunk_count or k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        scores = self._vectors() @ query
+        scores[np.logical_not(self._alive_rows())] = -np.inf
+        k = min(k, self.chunk_count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for row in top:
+            if scores[row] < min_score:
+                break
+            chunk = self._chunk(int(row))
+            results.append(
+                Retrieved(path=chunk["path"], text=chunk["text"], score=float(scores[row]))
+            )
+        return results
+
+    async def search(
+        self, handler: OllamaHandler, query: str, k: int, min_score: float = 0.0
+    ) -> list[Retrieved]:
+        """Chunks most similar to `query`, embedded with the model the index was built with."""
+        if not self.model or not self.chunk_count:
+            return []
+        (vector,) = await handler.embed(self.model, [query])
+        import numpy as np  # pylint: disable=import-outside-toplevel
+
+        return await asyncio.to_thread(
+            self.nearest, np.asarray(vector, dtype=np.float32), k, min_score
+        )
+
+    async def _embed_pending(
+        self, handler: OllamaHandler, pending: list[_PendingFile], report: IndexReport
+    ) -> None:
+        """Embed the chunks of several files in batches and append them to the index."""
+        import numpy as np  # pylint: disable=import-outside-toplevel
+
+        assert self.model is not None
+        texts = [chunk for item in pending for chunk in item.chunks]
+        vectors: list[list[float]] = []
+        for first in range(0, len(texts), EMBED_BATCH):
+            vectors += await handler.embed(self.model, texts[first : first + EMBED_BATCH])
+        matrix = np.asarray(vectors, dtype=np.float32)
+        row = 0
+        for item in pending:
+            if item.key in self.files:
+                self._remove(item.key)
+            self.add_file(item.key, item.info, item.chunks, matrix[row : row + len(item.chunks)])
+            row += len(item.chunks)
+        report.chunks += len(texts)
+        self.save()
+
+    async def add_path(
+        self,
+        handler: OllamaHandler,
+        path: Path,
+        model: str,
+        progress: Callable[[str], None] | None = None,
+    ) -> IndexReport:
+        """Index the text files under `path`, embedding only new and changed ones.
+
+        Files that were indexed under `path` and no longer exist are removed. Switching
+        to another embedding model rebuilds the whole index, since the vectors of
+        different models cannot be compared. Raises `IndexLockedError` if another process
+        is updating the index.
+        """
+        with self._locked():
+            self._load()
+            self._drop_unsaved_rows()
+            return await self._add_path(handler, path, model, progress)
+
+    async def _add_path(
+        self,
+        handler: OllamaHandler,
+        path: Path,
+        model: str,
+        progress: Callable[[str], None] | None = None,
+    ) -> IndexReport:
+        if self.model != model:
+            self.clear()
+            self.model = model
+        report = IndexReport()
+        root = path.resolve()
+        seen: set[str] = set()
+        pending: list[_PendingFile] = []
+        pending_chunks = 0
+        for file_path in iter_files(root):
+            key = str(file_path)
+            seen.add(key)
+            stat = file_path.stat()
+            if stat.st_size > MAX_FILE_BYTES:
+                continue
+            known = self.files.get(key)
+            if known and known.mtime == stat.st_mtime and known.size == stat.st_size:
+                report.unchanged += 1
+                continue
+            data = file_path.read_bytes()
+            digest = hashlib.sha256(data).hexdigest()
+            if known and known.sha256 == digest:
+                known.mtime, known.size = stat.st_mtime, stat.st_size
+                report.unchanged += 1
+                continue
+            try:
+                chunks = split_chunks(data.decode("utf-8"))
+            except UnicodeDecodeError:
+                seen.discard(key)
+                continue
+            if known:
+                report.updated += 1
+            else:
+                report.added += 1
+            info = IndexedFile(mtime=stat.st_mtime, size=stat.st_size, sha256=digest)
+            if not chunks:
+                if known:
+                    self._remove(key)
+                continue
+            pending.append(_PendingFile(key, info, chunks))
+            pending_chunks += len(chunks)
+            if pending_chunks >= EMBED_BATCH:
+                if progress:
+                    progress(f"Embedding {file_path.name}...")
+                await self._embed_pending(handler, pending, report)
+                pending, pending_chunks = [], 0
+        if pending:
+            await self._embed_pending(handler, pending, report)
+
+        prefix = str(root) if root.is_file() else str(root) + os.sep
+        for key in list(self.files):
+            if key not in seen and (key == str(root) or key.startswith(prefix)):
+                self._remove(key)
+                report.removed += 1
+        if self.count - self.chunk_count > self.chunk_count:
+            self._compact()
+        self.save()
+        return report
+
+
+def context_message(results: list[Retrieved], budget: int) -> dict[str, str] | None:
+    """System message with the retrieved chunks that fit `budget` tokens."""
+    parts: list[str] = []
+    used = estimate_tokens(CONTEXT_HEADER)
+    for result in results:
+        part = f"[{result.path}]\n{result.text}"
+        used += estimate_tokens(part)
+        if used > budget:
+            break
+        parts.append(part)
+    if not parts:
+        return None
+    return {"role": "system", "content": CONTEXT_HEADER + "\n\n".join(parts)}
@@ -1,13 +1,19 @@
 """Roles module for managing AI personas."""
 
+import bisect
+import heapq
+import os
 import tomllib
 from dataclasses import dataclass
+from pathlib import Path
 
 import tomli_w
 
 from app.config import CONFIG_DIR
 
 ROLES_FILE = CONFIG_DIR / "roles.toml"
+ROLE_TABLE_HEADER = b"[[roles]]\n"
+SEARCH_LIMIT: int = 20
 
 DEFAULT_ROLE_NAME = "Virtual Assistant"
 
@@ -58,19 +64,56 @@ class Role:
         """Convert role to dictionary for TOML serialization."""
         return {"name": self.name, "prompt": self.prompt}
 
+    def to_toml(self) -> bytes:
+        """TOML table of the role, which can be appended to a roles file."""
+        return ROLE_TABLE_HEADER + tomli_w.dumps(self.to_dict()).encode()
+
 
 class RolesManager:
-    """Manages role storage and retrieval."""
+    """Manages role storage and retrieval.
+
+    Roles are kept in an index by name. The roles file is parsed again only when its
+    modification time or size changed, so edits from other processes show up on the next
+    access. New roles are appended to the file as `[[roles]]` tables; deletions, and
+    additions to files in another layout, replace it atomically.
+    """
+
+    def __init__(self, path: Path = ROLES_FILE) -> None:
+        self.path = path
+        self._index: dict[str, Role] | None = None
+        self._sorted_keys: list[tuple[str, str]] = []
+        self._signature: tuple[int, int] | None = None
+        self._appendable = True
+
+    def _file_signature(self) -> tuple[int, int] | None:
+        """Modification time and size of the roles file, or None when it does not exist."""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
 
-    def __init__(self) -> None:
-        self._roles: list[Role] | None = None
+    @property
+    def index(self) -> dict[str, Role]:
+        """Roles by name, predefined ones first, reloaded when the file changed."""
+        signature = self._file_signature()
+        if self._index is None or signature != self._signature:
+            self._signature = signature
+            self._set_index(self._load_roles())
+        assert self._index is not None
+        return self._index
+
+    def _set_index(self, roles: list[Role]) -> None:
+        index: dict[str, Role] = {}
+        for role in roles:
+            index.setdefault(role.name, role)
+        self._index = index
+        self._sorted_keys = sorted((name.casefold(), name) for name in index)
 
     @property
     def roles(self) -> list[Role]:
         """Get all roles (predefined + custom)."""
-        if self._roles is None:
-            self._roles = self._load_roles()
-        return self._roles
+        return list(self.index.values())
 
     def _load_roles(self) -> list[Role]:
         """Load roles from TOML file and merge with predefined."""
@@ -83,23 +126,22 @@ class RolesManager:
 
         return roles
 
-    @staticmethod
-    def _load_custom_roles() -> list[Role]:
+    def _load_custom_roles(self) -> list[Role]:
         """Load custom roles from TOML file."""
-        if not ROLES_FILE.exists():
+        if not self.path.exists():
+            self._appendable = True
             return []
 
-        with open(ROLES_FILE, "rb") as file_:
-            data: dict[str, list[dict[str, str]]] = tomllib.load(file_)
-            custom = data.get("roles", [])
-            return [Role(name=r["name"], prompt=r["prompt"], is_predefined=False) for r in custom]
+        with open(self.path, "rb") as file_:
+            content = file_.read()
+        self._appendable = not content.strip() or content.lstrip().startswith(ROLE_TABLE_HEADER)
+        data: dict[str, list[dict[str, str]]] = tomllib.loads(content.decode())
+        custom = data.get("roles", [])
+        return [Role(name=r["name"], prompt=r["prompt"], is_predefined=False) for r in custom]
 
     def get_by_name(self, name: str) -> Role | None:
         """Get a role by its name."""
-        for role in self.roles:
-            if role.name == name:
-                return role
-        return None
+        return self.index.get(name)
 
     def get_default(self) -> Role:
         """Get the default role."""
@@ -108,14 +150,52 @@ class RolesManager:
             return role
         return self.roles[0]
 
+    def search(
+        self, query: str, limit: int = SEARCH_LIMIT, custom_only: bool = False
+    ) -> list[Role]:
+        """Roles matching `query`, best matches first.
+
+        Names starting with the query come first, then names with a word starting with
+        it, then names containing it, then names containing its letters in order. Matching
+        ignores case, and an empty query lists the first roles by name.
+        """
+        index = self.index
+        needle = query.casefold().strip()
+        matches: list[str] = []
+        position = bisect.bisect_left(self._sorted_keys, (needle, ""))
+        for key, name in self._sorted_keys[position:]:
+            if not key.startswith(needle) or len(matches) >= limit:
+                break
+            if not (custom_only and index[name].is_predefined):
+                matches.append(name)
+        if len(matches) < limit:
+            seen = set(matches)
+            ranked: list[tuple[int, int, str]] = []
+            for key, name in self._sorted_keys:
+                if name in seen or (custom_only and index[name].is_predefined):
+                    continue
+                rank = _match_rank(key, needle)
+                if rank is not None:
+                    ranked.append((rank, len(key), name))
+            matches.extend(name for _, _, name in heapq.nsmallest(limit - len(matches), ranked))
+        return [index[name] for name in matches]
+
     def add(self, name: str, prompt: str) -> Role:
-        """Add a new custom role."""
+        """Add a new custom role, appending it to the roles file."""
         if self.get_by_name(name):
             raise ValueError(f"Role '{name}' already exists")
 
         role = Role(name=name, prompt=prompt, is_predefined=False)
-        self._save_custom_roles([r for r in self.roles if not r.is_predefined] + [role])
-        self._roles = None
+        roles = [*self.roles, role]
+        if self._appendable:
+            self.path.parent.mkdir(exist_ok=True, parents=True)
+            # A single append keeps the file valid TOML for readers in other processes.
+            with open(self.path, "ab") as file_:
+                file_.write((b"\n" if file_.tell() else b"") + role.to_toml())
+        else:
+            self._save_custom_roles([r for r in roles if not r.is_predefined])
+        self._signature = self._file_signature()
+        self._set_index(roles)
         return role
 
     def delete(self, name: str) -> None:
@@ -126,24 +206,38 @@ class RolesManager:
         if role.is_predefined:
             raise ValueError(f"Cannot delete predefined role '{name}'")
 
-        remaining = [r for r in self.roles if r.name != name and not r.is_predefined]
-        self._save_custom_roles(remaining)
-        self._roles = None
+        remaining = [r for r in self.roles if r.name != name]
+        self._save_custom_roles([r for r in remaining if not r.is_predefined])
+        self._signature = self._file_signature()
+        self._set_index(remaining)
 
-    @staticmethod
-    def _save_custom_roles(roles: list[Role]) -> None:
-        """Save custom roles to TOML file."""
-        CONFIG_DIR.mkdir(exist_ok=True, parents=True)
+    def _save_custom_roles(self, roles: list[Role]) -> None:
+        """Atomically replace the roles file with the given custom roles."""
+        self.path.parent.mkdir(exist_ok=True, parents=True)
 
         if not roles:
-            if ROLES_FILE.exists():
-                ROLES_FILE.unlink()
+            self.path.unlink(missing_ok=True)
             return
 
-        data = {"roles": [r.to_dict() for r in roles]}
-        with open(ROLES_FILE, "wb") as f:
-            tomli_w.dump(data, f)
+        tmp_file = self.path.with_suffix(".tmp")
+        with open(tmp_file, "wb") as f:
+            f.write(b"\n".join(r.to_toml() for r in roles))
+        os.replace(tmp_file, self.path)
+        self._appendable = True
 
     def list_names(self) -> list[str]:
         """Get list of all role names."""
-        return [r.name for r in self.roles]
+        return list(self.index)
+
+
+def _match_rank(key: str, needle: str) -> int | None:
+    """How well a lowercase name matches a lowercase query, lower is better, None if not."""
+    position = key.find(needle)
+    if position > 0 and not key[position - 1].isalnum():
+        return 0
+    if position >= 0:
+        return 1
+    letters = iter(key)
+    if all(char in letters for char in needle):
+        return 2
+    return None
@@ -2,144 +2,233 @@
 
 import asyncio
 import random
+import time
+from collections import deque
+from collections.abc import AsyncGenerator
+from pathlib import Path
 from pprint import pformat
+from typing import TYPE_CHECKING, Any
 
-import httpx
-from rich.console import Console, ConsoleOptions
-from rich.live import Live
+from rich.console import Console, Group, RenderableType
 from rich.markdown import Markdown
 from rich.panel import Panel
-from rich.segment import Segment, Segments
 from rich.spinner import SPINNERS, Spinner
 
 from app import assets, config, utils
 from app.assets import COMMANDS
-from app.llm import OllamaError, OllamaHandler
-from app.roles import RolesManager
-
-console = Console()
+from app.cache import ResponseCache
+from app.catalog import ModelCatalog
+from app.context import ContextWindow, estimate_tokens
+from app.history import MessageHistory
+from app.llm import (
+    ContentDelta,
+    OllamaError,
+    OllamaHandler,
+    StreamDone,
+    StreamEvent,
+    ThinkingDelta,
+    chat_payload,
+)
+from app.render import (
+    THINKING_HEADER,
+    THINKING_SEPARATOR,
+    IncrementalMarkdown,
+    PlainStream,
+    RedrawThrottle,
+    create_scrolling_panel,
+)
+from app.retrieval import IndexLockedError, VectorIndex, context_message, numpy_available
+from app.roles import SEARCH_LIMIT, Role, RolesManager
+from app.stats import SUMMARY_METRICS, StatsRecorder, TurnMetrics
+from app.store import SessionInfo, SessionStore
+from app.terminal import LineReader
+from app.utils import lazy_import
 
+if TYPE_CHECKING:
+    import httpx
+    from rich.live import Live
+else:
+    httpx = lazy_import("httpx")
 
-def _create_scrolling_panel(
-    content: str,
-    title: str,
-    subtitle: str,
-    border_style: str,
-    max_height: int,
-    options: ConsoleOptions,
-) -> Panel:
-    """Create a panel showing only the last N lines of markdown content."""
-    md = Markdown(content)
-    lines = console.render_lines(md, options)
-
-    if len(lines) <= max_height:
-        return Panel(
-            renderable=md,
-            title=title,
-            subtitle=subtitle,
-            title_align="right",
-            padding=(0, 1),
-            border_style=border_style,
-            expand=False,
-        )
+console = Console()
 
-    visible_lines = lines[-max_height:]
-    segments = []
-    for i, line in enumerate(visible_lines):
-        segments.extend(line)
-        if i < len(visible_lines) - 1:
-            segments.append(Segment("\n"))
 
-    return Panel(
-        renderable=Segments(segments),
-        title=title,
-        subtitle=subtitle,
-        title_align="right",
-        padding=(0, 1),
-        border_style=border_style,
-        expand=False,
-    )
+def _format_subtitle(model: str, metrics: TurnMetrics, cached: bool = False) -> str:
+    """Panel subtitle with the model name and its generation speed."""
+    if cached:
+        return f"{model} · cached"
+    tokens_per_second = metrics.tokens_per_second
+    if tokens_per_second is None:
+        return model
+    return f"{model} · {tokens_per_second:.1f} tok/s"
 
 
 class ChatSession:
     """Manages a chat session with configuration, handler, and message history."""
 
-    def __init__(self) -> None:
+    def __init__(self, model: str | None = None, role: str | None = None) -> None:
         self.cfg = config.OllamaConfig.load()
-        self.handler = OllamaHandler(url=self.cfg.base_url, timeout=config.HTTP_TIMEOUT)
+        self.cfg.model = model or self.cfg.model
+        self.cfg.role = role or self.cfg.role
+        self.handler = OllamaHandler.from_config(self.cfg)
+        self.catalog = self._create_catalog()
+        self.cache = ResponseCache.from_config(self.cfg)
+        self._bypass_cache = False
+        self.index = VectorIndex()
+        self.stats = StatsRecorder(log_file=self.cfg.metrics_file)
         self.roles_manager = RolesManager()
-        role = self.roles_manager.get_by_name(self.cfg.role) or self.roles_manager.get_default()
-        self.messages: list[dict[str, str]] = [{"role": "system", "content": role.prompt}]
+        active_role = (
+            self.roles_manager.get_by_name(self.cfg.role) or self.roles_manager.get_default()
+        )
+        self.messages = MessageHistory([{"role": "system", "content": active_role.prompt}])
+        self.context = ContextWindow(summarize=self.cfg.context_strategy == "summarize")
+        self._summary_task: asyncio.Task[None] | None = None
+        self._heartbeat_task: asyncio.Task[None] | None = None
+        self._warm_up_task: asyncio.Task[None] | None = None
+        self._response_task: asyncio.Task[str | None] | None = None
+        self._reader = LineReader()
+        self._reader.on_typing = self._start_prefill
+        self._prefill_task: asyncio.Task[dict[str, Any] | None] | None = None
+        self._prefill_key: tuple[str, list[dict[str, str]]] | None = None
+        # Model, messages and token count of what the server has cached after the last turn.
+        self._server_context: tuple[str, list[dict[str, str]], int] | None = None
+        self._queued: deque[str] = deque()
+        self._busy = False
+        self.store = SessionStore()
+        self.session_id: str | None = None
+        self._persisted: int = 0
+
+    def _create_catalog(self) -> ModelCatalog:
+        """Model catalogue of the configured endpoints."""
+        return ModelCatalog(key=",".join(e.url for e in self.cfg.endpoint_list()))
 
-    def _refresh_handler(self) -> None:
+    async def _refresh_handler(self) -> None:
         """Recreate handler with current config."""
-        self.handler = OllamaHandler(url=self.cfg.base_url, timeout=config.HTTP_TIMEOUT)
+        self.catalog.cancel()
+        await self.handler.aclose()
+        self.handler = OllamaHandler.from_config(self.cfg)
+        self.catalog = self._create_catalog()
 
-    def _preload_current_model(self) -> None:
+    async def _model_names(self, model: str) -> set[str]:
+        """Available model names, fetching again if a cached list lacks `model`."""
+        fetched_at = self.catalog.fetched_at
+        names = {info.name for info in await self.catalog.get(self.handler)}
+        if model not in names and self.catalog.fetched_at == fetched_at:
+            names = {info.name for info in await self.catalog.get(self.handler, force=True)}
+        return names
+
+    def _notice(self, message: str) -> None:
+        """Print a message that can arrive while a line is being typed at the prompt."""
+        with self._reader.above():
+            console.print(message)
+
+    async def _warm_up(self) -> bool | None:
+        """Check that the current model exists while preloading it, concurrently.
+
+        Returns whether the model is available, or None when Ollama could not be reached.
+        """
+        model = self.cfg.model
+        models, loaded = await asyncio.gather(
+            self._model_names(model),
+            self.handler.preload_model(model, keep_alive=self.cfg.model_settings().keep_alive),
+            return_exceptions=True,
+        )
+        if isinstance(models, BaseException):
+            self._notice("[yellow]Could not check models - is Ollama running?[/yellow]")
+            return None
+        if model not in models:
+            self._notice(f"[yellow]Model '{model}' not found in Ollama.[/yellow]")
+            return False
+        if isinstance(loaded, BaseException) or not loaded:
+            self._notice("[yellow]Could not preload model - is Ollama running?[/yellow]")
+        else:
+            self._notice(f"[green]Model {model} ready![/green]")
+        return True
+
+    async def _preload_current_model(self) -> None:
         """Validate and preload current model with visual feedback."""
-        with console.status("[bold blue]Checking model availability...[/bold blue]"):
-            try:
-                models = asyncio.run(self.handler.list_models())
-                if self.cfg.model not in models:
-                    console.print(
-                        f"[yellow]Model '{self.cfg.model}' not found in Ollama.[/yellow]"
-                    )
-                    self.select_model()
-                    return
-            except (httpx.ConnectError, httpx.UnsupportedProtocol):
-                console.print("[yellow]Could not check models - is Ollama running?[/yellow]")
-                return
+        with console.status(f"[bold blue]Loading model {self.cfg.model}...[/bold blue]"):
+            available = await self._warm_up()
+        if available is False:
+            await self.select_model()
 
+    async def _background_warm_up(self) -> None:
+        """Warm up the model without holding the prompt, pointing to `/model` if it is missing."""
+        if await self._warm_up() is False:
+            self._notice("Run `/model` to select an available model.")
+
+    async def _wait_warm_up(self) -> None:
+        """Wait for the startup preload, if it is still running."""
+        if self._warm_up_task is None or self._warm_up_task.done():
+            return
         with console.status(f"[bold blue]Loading model {self.cfg.model}...[/bold blue]"):
-            try:
-                asyncio.run(self.handler.preload_model(self.cfg.model))
-                console.print(f"[green]Model {self.cfg.model} ready![/green]")
-            except (httpx.ConnectError, httpx.UnsupportedProtocol):
-                console.print("[yellow]Could not preload model - is Ollama running?[/yellow]")
+            await asyncio.shield(self._warm_up_task)
 
-    def select_model(self) -> None:
+    async def select_model(self) -> None:
         """Select model to use."""
         try:
-            models = asyncio.run(self.handler.list_models())
-            model = utils.item_selection_input(
+            models = {info.label(): info.name for info in await self.catalog.get(self.handler)}
+            label = utils.item_selection_input(
                 message="Select the model to use",
-                items=models,
+                items=list(models),
             )
-            self.cfg.model = model
+            self.cfg.model = models[label]
             self.cfg.save()
-            self._preload_current_model()
+            await self._preload_current_model()
         except (httpx.ConnectError, httpx.UnsupportedProtocol) as error:
             console.log(pformat(error))
             console.print("Tip: Make sure Ollama is running and run `/setup` to set the URL.")
         except KeyboardInterrupt:
             pass
 
-    def setup(self) -> None:
+    async def setup(self) -> None:
         """Run user preferences setup."""
         console.print("Enter new parameters. Leave empty to use current settings")
         try:
             new_url = utils.text_input("Enter Ollama URL")
             if new_url:
                 self.cfg.base_url = new_url
-                self._refresh_handler()
-            self.select_model()
+                if self.cfg.endpoints:
+                    console.print(
+                        "[yellow]Note:[/yellow] `endpoints` is set in config.toml and is used "
+                        "instead of this URL. Edit it there to change the hosts."
+                    )
+                await self._refresh_handler()
+            await self.select_model()
             self.cfg.save()
             if new_url:
                 console.print("Your settings have been saved!")
         except KeyboardInterrupt:
             pass
 
-    def select_role(self) -> None:
-        """Select a role to use."""
+    def _pick_role(self, message: str, query: str = "", custom_only: bool = False) -> Role | None:
+        """Let the user pick a role, searching by name first when there are many."""
+        roles = [r for r in self.roles_manager.roles if not (custom_only and r.is_predefined)]
+        if not roles:
+            console.print("No custom roles to delete." if custom_only else "No roles found.")
+            return None
+        if query or len(roles) > SEARCH_LIMIT:
+            if not query:
+                query = utils.text_input(f"Search {len(roles)} roles by name") or ""
+            roles = self.roles_manager.search(query, custom_only=custom_only)
+            if not roles:
+                console.print(f"No role matches '{query}'.")
+                return None
+        name = utils.item_selection_input(message=message, items=[r.name for r in roles])
+        return self.roles_manager.get_by_name(name)
+
+    def select_role(self, query: str = "") -> None:
+        """Select a role to use, optionally among the roles matching `query`."""
         try:
-            role_name = utils.item_selection_input(
-                message="Select a role",
-                items=self.roles_manager.list_names(),
-            )
-            role = self.roles_manager.get_by_name(role_name)
+            role = self._pick_role("Select a role", query)
             if role:
                 self.cfg.role = role.name
-                self.messages[0] = {"role": "system", "content": role.prompt}
+                system_message = {"role": "system", "content": role.prompt}
+                if self.cfg.role_switch == "append" and len(self.messages) > 1:
+                    # Keeps the conversation prefix unchanged, so Ollama can reuse its cache.
+                    self.messages.append(system_message)
+                else:
+                    self.messages[0] = system_message
                 self.cfg.save()
                 console.print(f"Role switched to: **{role.name}**")
         except KeyboardInterrupt:
@@ -164,68 +253,623 @@ class ChatSession:
     def delete_role(self) -> None:
         """Delete a custom role."""
         try:
-            custom_names = [r.name for r in self.roles_manager.roles if not r.is_predefined]
-            if not custom_names:
-                console.print("No custom roles to delete.")
+            role = self._pick_role("Select role to delete", custom_only=True)
+            if not role:
                 return
-            name = utils.item_selection_input(
-                message="Select role to delete",
-                items=custom_names,
+            self.roles_manager.delete(role.name)
+            console.print(f"Role '{role.name}' deleted successfully!")
+        except ValueError as error:
+            console.print(f"[red]Error:[/red] {error}")
+        except KeyboardInterrupt:
+            pass
+
+    def _persist(self) -> None:
+        """Append messages that are not stored yet to the active saved session."""
+        if self.session_id is None:
+            return
+        self.store.append(self.session_id, self.messages[self._persisted :])
+        self._persisted = len(self.messages)
+        self.store.update(self.session_id, model=self.cfg.model, role=self.cfg.role)
+
+    def save_session(self) -> None:
+        """Save the conversation and keep saving new messages as they are produced."""
+        if self.session_id is not None:
+            console.print(f"Session already saved as '{self.session_id}'.")
+            return
+        try:
+            first_query = next((m["content"] for m in self.messages if m["role"] == "user"), "")
+            title = utils.text_input("Enter session title") or first_query[:50] or "Untitled"
+            info = self.store.create(title=title, model=self.cfg.model, role=self.cfg.role)
+            self.session_id = info.id
+            self._persisted = 0
+            self._persist()
+            console.print(f"Session saved as '{info.id}'.")
+        except KeyboardInterrupt:
+            pass
+
+    def _select_session(self, message: str) -> SessionInfo:
+        """Let the user pick a saved session."""
+        sessions = {
+            f"{info.title} ({info.message_count} messages, {info.model}) [{info.id}]": info
+            for info in self.store.list_sessions()
+        }
+        if not sessions:
+            raise ValueError("No saved sessions")
+        return sessions[utils.item_selection_input(message=message, items=list(sessions))]
+
+    async def load_session(self) -> None:
+        """Resume a saved session, reading only the messages that fit the context budget."""
+        try:
+            info = self._select_session("Select session to load")
+            self.cfg.model = info.model
+            self.cfg.role = info.role
+            budget = self._context_budget()
+            self.messages.close()
+            self.messages = MessageHistory(self.store.load_tail(info.id, budget=budget))
+            role = self.roles_manager.get_by_name(info.role)
+            if role and self.messages:
+                self.messages[0] = {"role": "system", "content": role.prompt}
+            self.context.reset()
+            self.session_id = info.id
+            self._persisted = len(self.messages)
+            console.print(
+                f"Resumed '{info.title}': {len(self.messages)} of {info.message_count} "
+                "messages loaded."
             )
-            self.roles_manager.delete(name)
-            console.print(f"Role '{name}' deleted successfully!")
+            await self._preload_current_model()
+        except ValueError as error:
+            console.print(f"[red]Error:[/red] {error}")
+        except KeyboardInterrupt:
+            pass
+
+    def list_sessions(self) -> None:
+        """Show saved sessions."""
+        sessions = self.store.list_sessions()
+        if not sessions:
+            console.print("No saved sessions.")
+            return
+        from rich.table import Table  # pylint: disable=import-outside-toplevel
+
+        table = Table(title="Saved sessions", title_justify="left")
+        for column in ("Id", "Title", "Model", "Role", "Messages"):
+            table.add_column(column)
+        for info in sessions:
+            table.add_row(info.id, info.title, info.model, info.role, str(info.message_count))
+        console.print(table)
+
+    def delete_session(self) -> None:
+        """Delete a saved session."""
+        try:
+            info = self._select_session("Select session to delete")
+            self.store.delete(info.id)
+            if info.id == self.session_id:
+                self.session_id = None
+            console.print(f"Session '{info.title}' deleted successfully!")
         except ValueError as error:
             console.print(f"[red]Error:[/red] {error}")
         except KeyboardInterrupt:
             pass
 
-    async def _process_response(self) -> str | None:
-        """Process Ollama response in real time."""
+    def _chat_payload(self, messages: list[dict[str, str]]) -> dict[str, Any]:
+        """Request body for `/api/chat` with the current model settings."""
+        return chat_payload(self.cfg.model, messages, self.cfg.model_settings())
+
+    async def _heartbeat(self) -> None:
+        """Keep the current model loaded while the session is idle."""
+        while True:
+            await asyncio.sleep(self.cfg.heartbeat_interval)
+            if self._busy:
+                continue
+            try:
+                await self.handler.preload_model(
+                    self.cfg.model, keep_alive=self.cfg.model_settings().keep_alive
+                )
+            except (httpx.HTTPError, ValueError):
+                pass
+
+    def _response_events(self, payload: dict[str, Any]) -> AsyncGenerator[StreamEvent, Any]:
+        """Answer events, from the response cache when it is on."""
+        if self.cache is None:
+            return self.handler.stream_response(payload=payload)
+        bypass, self._bypass_cache = self._bypass_cache, False
+        return self.cache.stream(self.handler, payload, bypass=bypass)
+
+    def _context_budget(self) -> int:
+        """Token budget of the current model, bounded by its known context length."""
+        return self.cfg.context_budget(context_length=self.catalog.context_length(self.cfg.model))
+
+    def _context_messages(self, reserve: int = 0, commit: bool = True) -> list[dict[str, str]]:
+        """Messages that fit the context budget of the current model, minus `reserve`."""
+        return self.context.select(
+            self.messages, budget=self._context_budget() - reserve, commit=commit
+        )
+
+    async def _retrieve(self, query: str) -> dict[str, str] | None:
+        """Indexed chunks relevant to `query` as a system message, if there are any."""
+        if self.cfg.retrieval_top_k <= 0 or not self.index.chunk_count or not numpy_available():
+            return None
+        try:
+            results = await self.index.search(
+                self.handler, query, self.cfg.retrieval_top_k, self.cfg.retrieval_min_score
+            )
+        except (httpx.HTTPError, OllamaError) as error:
+            console.log(pformat(error))
+            return None
+        message = context_message(results, budget=self._context_budget() // 2)
+        if message:
+            sources = dict.fromkeys(Path(result.path).name for result in results)
+            console.print(f"[dim]Context from: {', '.join(sources)}[/dim]")
+        return message
+
+    def _start_prefill(self, draft: str) -> None:
+        """Send the history to Ollama while the next message is typed, so its prompt cache
+        is warm when the message is sent. A prefill of an older history is cancelled."""
+        if not self.cfg.prefill or self._busy or draft.startswith("/"):
+            return
+        messages = self._context_messages(commit=False)
+        key = (self.cfg.model, messages)
+        if self._prefill_task is not None:
+            if self._prefill_key == key:
+                return
+            self._prefill_task.cancel()
+        self._prefill_key = key
+        self._prefill_task = asyncio.create_task(self._prefill(self._chat_payload(messages)))
+
+    async def _prefill(self, payload: dict[str, Any]) -> dict[str, Any] | None:
+        """Ollama's answer to a prefill request, or None if it failed."""
+        try:
+            return await self.handler.prefill(payload)
+        except (httpx.HTTPError, OllamaError, ValueError):
+            return None
+
+    async def _settle_prefill(self, messages: list[dict[str, str]], metrics: TurnMetrics) -> None:
+        """Wait for the prefill of a prefix of `messages`, or cancel it if the history changed.
+
+        Waiting costs nothing extra: the prefill is evaluating the same prompt the request
+        would. The time it saved and the time waited are recorded in `metrics`.
+        """
+        task, key = self._prefill_task, self._prefill_key
+        self._prefill_task = self._prefill_key = None
+        if task is None or key is None:
+            return
+        model, prefix = key
+        if model != self.cfg.model or messages[: len(prefix)] != prefix:
+            task.cancel()
+            return
+        started = time.perf_counter()
+        data = await task
+        metrics.prefill_wait = time.perf_counter() - started
+        if data:
+            metrics.prefill_eval_duration = int(data.get("prompt_eval_duration") or 0)
+
+    def _schedule_summary(self) -> None:
+        """Fold messages evicted from the context into the rolling summary, in the background."""
+        if self._summary_task and not self._summary_task.done():
+            return
+        evicted = self.context.pending_summary(self.messages)
+        if evicted:
+            until = self.context.first_kept
+            self._summary_task = asyncio.create_task(self._summarize(evicted, until))
+
+    async def _summarize(self, evicted: list[dict[str, str]], until: int) -> None:
+        """Ask the model for a new rolling summary."""
+        parts: list[str] = []
+        try:
+            async for event in self.handler.stream_response(
+                payload=self._chat_payload(self.context.summary_request(evicted)),
+            ):
+                if isinstance(event, ContentDelta):
+                    parts.append(event.text)
+        except (httpx.HTTPError, OllamaError):
+            return
+        self.context.update_summary("".join(parts), until=until)
+
+    async def _process_response(self, retrieved: dict[str, str] | None = None) -> str | None:
+        """Process Ollama response in real time.
+
+        Retrieved document chunks are sent just before the newest message, for this turn only.
+        When the task is cancelled, the stream is closed so Ollama stops generating, and the
+        partial answer is returned.
+        """
         spinner_name = random.choice(list(filter(lambda x: x.startswith("dots"), SPINNERS)))
         spinner = Spinner(spinner_name, text="Waiting for response...")
-        panel_overhead: int = 5
-        content: str = ""
-        with Live(spinner, console=console, refresh_per_second=config.CLI_REFRESH_TIME) as live:
+        panel_overhead: int = 6 if self._reader.enabled else 5
+        metrics = TurnMetrics(model=self.cfg.model, host=self.cfg.base_url)
+        messages = self._context_messages(
+            reserve=estimate_tokens(retrieved["content"]) if retrieved else 0
+        )
+        if retrieved:
+            messages = messages[:-1] + [retrieved] + messages[-1:]
+        metrics.prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+        started = time.perf_counter()
+        answer: list[str] = []
+        cached = False
+        is_thinking = False
+        renderer = IncrementalMarkdown(console)
+        throttle = RedrawThrottle(self.cfg.refresh_rate, adaptive=self.cfg.render_mode == "auto")
+        plain: PlainStream | None = None
+        interrupted = False
+        events = self._response_events(self._chat_payload(messages))
+        from rich.live import Live  # pylint: disable=import-outside-toplevel
+
+        live: Live | None = None
+        animation: asyncio.Task[None] | None = None
+        if self.cfg.render_mode == "plain":
+            console.print(f"[bold]{self.cfg.role}[/bold] is typing :hourglass_flowing_sand:")
+            plain = PlainStream(console, throttle.min_interval)
+        else:
+            live = Live(self._with_prompt(spinner), console=console, auto_refresh=False)
+            live.start(refresh=True)
+            animation = asyncio.create_task(self._animate(live, throttle))
+
+        def show(text: str) -> None:
+            renderer.append(text)
+            if plain is not None:
+                plain.append(text)
+
+        try:
             try:
-                async for chunk in self.handler.stream_response(
-                    payload={"model": self.cfg.model, "messages": self.messages},
-                ):
-                    content = chunk
+                await self._settle_prefill(messages, metrics)
+                async for event in events:
+                    if metrics.ttft is None and not isinstance(event, StreamDone):
+                        metrics.ttft = time.perf_counter() - started
+                    if isinstance(event, ThinkingDelta):
+                        if not is_thinking:
+                            show(THINKING_HEADER)
+                            is_thinking = True
+                        show(event.text)
+                    elif isinstance(event, ContentDelta):
+                        if is_thinking:
+                            show(THINKING_SEPARATOR)
+                            is_thinking = False
+                        show(event.text)
+                        answer.append(event.text)
+                    elif isinstance(event, StreamDone):
+                        metrics.update_from_ollama(event.data)
+                        metrics.host = event.host or metrics.host
+                        cached = event.cached
+                    if live is None or not throttle.due():
+                        continue
+                    render_started = time.perf_counter()
                     max_content_height = max(1, console.size.height - panel_overhead)
-                    panel = _create_scrolling_panel(
-                        content=chunk,
+                    panel = create_scrolling_panel(
+                        renderer=renderer,
                         title=f"[bold]{self.cfg.role}[/bold] is typing :hourglass_flowing_sand:",
                         subtitle=self.cfg.model,
                         border_style="yellow",
                         max_height=max_content_height,
                         options=console.options,
                     )
-                    live.update(panel)
-                if content:
-                    panel = Panel(
-                        renderable=Markdown(content),
-                        title=f"{self.cfg.role} :heavy_check_mark:",
-                        subtitle=self.cfg.model,
-                        title_align="right",
-                        border_style="green",
-                    )
-                    live.update(panel)
-                    return content
-            except httpx.ConnectError as error:
-                console.log(pformat(error))
-            except OllamaError as error:
+                    live.update(self._with_prompt(panel))
+                    metrics.render_time += time.perf_counter() - render_started
+                    metrics.render_frames += 1
+                    self._draw(live, throttle)
+                    if throttle.too_slow:
+                        plain = self._fall_back_to_plain(live, renderer, throttle)
+                        live = None
+            except asyncio.CancelledError:
+                interrupted = True
+            except (httpx.HTTPError, OllamaError) as error:
                 console.log(pformat(error))
-        return None
+                return None
+            finally:
+                await events.aclose()
+                if animation is not None:
+                    animation.cancel()
+                if plain is not None:
+                    plain.flush()
+                    console.line()
+            if not answer:
+                status = "[dim]Interrupted.[/dim]" if interrupted else ""
+                if live is not None:
+                    live.update(status)
+                elif status:
+                    console.print(status)
+                return None
+            if interrupted:
+                title = f"{self.cfg.role} :stop_sign:"
+                subtitle = f"{self.cfg.model} · interrupted"
+            else:
+                title = f"{self.cfg.role} :heavy_check_mark:"
+                subtitle = _format_subtitle(self.cfg.model, metrics, cached)
+            panel = Panel(
+                renderable=Markdown(renderer.text),
+                title=title,
+                subtitle=subtitle,
+                title_align="right",
+                border_style="red" if interrupted else "green",
+            )
+            if live is not None:
+                live.update(panel)
+            else:
+                console.print(panel)
+        finally:
+            if live is not None:
+                live.stop()
+        metrics.wall_time = time.perf_counter() - started
+        if interrupted:
+            self._server_context = None
+        elif not cached:
+            self._track_server_context(messages, "".join(answer), metrics)
+            self.stats.record(metrics)
+        return "".join(answer)
+
+    def _track_server_context(
+        self, messages: list[dict[str, str]], answer: str, metrics: TurnMetrics
+    ) -> None:
+        """Count the prompt tokens the server could reuse from the previous turn, using the
+        server's own counts, and remember what it has cached after this turn."""
+        if self._server_context is not None:
+            model, prefix, tokens = self._server_context
+            if model == metrics.model and messages[: len(prefix)] == prefix:
+                metrics.reused_prompt_tokens = tokens
+        prefix = messages + [{"role": "assistant", "content": answer}]
+        self._server_context = (metrics.model, prefix, metrics.context_tokens)
+
+    @staticmethod
+    def _draw(live: "Live", throttle: RedrawThrottle) -> None:
+        """Draw a frame of the live display, timing how long the terminal takes."""
+        started = time.perf_counter()
+        live.refresh()
+        throttle.record(time.perf_counter() - started)
+
+    async def _animate(self, live: "Live", throttle: RedrawThrottle) -> None:
+        """Redraw the live display while no text arrives, for the spinner and typed line."""
+        while True:
+            await asyncio.sleep(throttle.interval)
+            if throttle.due():
+                self._draw(live, throttle)
+
+    @staticmethod
+    def _fall_back_to_plain(
+        live: "Live", renderer: IncrementalMarkdown, throttle: RedrawThrottle
+    ) -> PlainStream:
+        """Replace the live display with plain text appended as it arrives."""
+        live.transient = True
+        live.stop()
+        console.print(
+            f"[dim]Slow terminal ({throttle.frame_cost * 1000:.0f} ms per frame), "
+            "streaming plain text.[/dim]"
+        )
+        plain = PlainStream(console, throttle.min_interval)
+        plain.append(renderer.text)
+        return plain
+
+    def show_stats(self) -> None:
+        """Show p50/p95 timings per model for this session."""
+        if not self.stats.turns:
+            console.print("No statistics yet. Send a message first.")
+            return
+        from rich.table import Table  # pylint: disable=import-outside-toplevel
+
+        table = Table(title="Session statistics (p50 / p95)", title_justify="left")
+        table.add_column("Model", style="bold")
+        table.add_column("Turns", justify="right")
+        for label in SUMMARY_METRICS:
+            table.add_column(label, justify="right")
+        turns_by_model = self.stats.by_model()
+        for model, values in self.stats.summary().items():
+            cells = [
+                f"{value[0]:.1f} / {value[1]:.1f}" if value else "-"
+                for value in values.values()
+            ]
+            table.add_row(model, str(len(turns_by_model[model])), *cells)
+        console.print(table)
+
+    def show_cache(self) -> None:
+        """Show response cache usage and the most recently used answers."""
+        if self.cache is None:
+            console.print("The response cache is off. Set `cache = true` in config.toml.")
+            return
+        count, size = self.cache.usage()
+        lookups = self.cache.hits + self.cache.misses
+        hit_rate = f"{self.cache.hits / lookups:.0%}" if lookups else "-"
+        from rich.table import Table  # pylint: disable=import-outside-toplevel
+
+        table = Table(
+            title=(
+                f"Response cache: {count} answers, {size / 1024 / 1024:.1f} of "
+                f"{self.cache.max_bytes / 1024 / 1024:.0f} MB. This session: "
+                f"{self.cache.hits} hits, {self.cache.misses} misses ({hit_rate})"
+            ),
+            title_justify="left",
+        )
+        table.add_column("Model", style="bold")
+        table.add_column("Prompt", no_wrap=True, max_width=48)
+        table.add_column("Hits", justify="right")
+        table.add_column("Size", justify="right")
+        table.add_column("Last used")
+        for entry in self.cache.entries():
+            table.add_row(
+                entry.model,
+                entry.prompt.strip().splitlines()[0] if entry.prompt.strip() else "",
+                str(entry.hits),
+                f"{entry.size / 1024:.1f} kB",
+                time.strftime("%Y-%m-%d %H:%M", time.localtime(entry.accessed)),
+            )
+        console.print(table)
+
+    def clear_cache(self) -> None:
+        """Remove every cached answer."""
+        if self.cache is None:
+            console.print("The response cache is off.")
+            return
+        self.cache.clear()
+        console.print("Response cache cleared.")
+
+    def bypass_cache(self) -> None:
+        """Ask Ollama for the next answer even if it is cached."""
+        if self.cache is None:
+            console.print("The response cache is off.")
+            return
+        self._bypass_cache = True
+        console.print("The next message will skip the response cache.")
+
+    async def index_path(self, path_text: str) -> None:
+        """Index the text files of a file or directory for retrieval."""
+        if not numpy_available():
+            console.print(
+                'Indexing needs NumPy. Install it with `pip install "sai-chat[retrieval]"`.'
+            )
+            return
+        path = Path(path_text).expanduser()
+        if not path.exists():
+            console.print(f"[bold red]Error:[/bold red] path not found: {path}")
+            return
+        try:
+            with console.status(f"Indexing {path}...") as status:
+                report = await self.index.add_path(
+                    self.handler,
+                    path,
+                    self.cfg.embed_model,
+                    progress=status.update,
+                )
+        except (httpx.HTTPError, OllamaError) as error:
+            console.log(pformat(error))
+            return
+        except IndexLockedError as error:
+            console.print(f"[bold red]Error:[/bold red] {error}")
+            return
+        console.print(report.summary())
+
+    def show_index(self) -> None:
+        """Show what the retrieval index contains."""
+        if not self.index.files:
+            console.print("The index is empty. Add files with `/index <path>`.")
+            return
+        console.print(
+            f"{len(self.index.files)} files, {self.index.chunk_count} chunks, "
+            f"embedded with {self.index.model}."
+        )
+
+    def _with_prompt(self, renderable: RenderableType) -> RenderableType:
+        """Live content with the line being typed below it."""
+        return Group(renderable, self._reader) if self._reader.enabled else renderable
+
+    async def _typeahead(self) -> None:
+        """Handle lines typed while an answer is on its way.
+
+        `/stop`, `/stats` and `/cache` run at once. Prompts and other commands are queued
+        and run in order as soon as the answer is complete.
+        """
+        while True:
+            line = await self._reader.lines.get()
+            if line == "/stop":
+                self.stop_response()
+            elif line == "/stats":
+                self.show_stats()
+            elif line == "/cache":
+                self.show_cache()
+            elif line is None:
+                self._queued.append("/quit")
+            elif line:
+                self._queued.append(line)
+                console.print(f"[dim]Queued:[/dim] {line}", highlight=False)
+
+    async def compare(self, argument: str) -> None:
+        """Answer with several models at once, without changing the conversation.
+
+        `argument` is a comma separated list of models, optionally followed by a prompt.
+        Without a prompt, the last message sent is answered again.
+        """
+        names, _, prompt = argument.strip().partition(" ")
+        models = list(dict.fromkeys(name.strip() for name in names.split(",") if name.strip()))
+        if len(models) < 2:
+            console.print("Usage: `/compare model1,model2[,...] [prompt]`")
+            return
+        messages = self._context_messages()
+        if prompt.strip():
+            messages = messages + [{"role": "user", "content": prompt.strip()}]
+        while messages and messages[-1]["role"] != "user":
+            messages = messages[:-1]
+        if not messages:
+            console.print("Nothing to compare yet. Send a message first or add a prompt.")
+            return
+
+        from app.compare import ModelComparison  # pylint: disable=import-outside-toplevel
+
+        comparison = ModelComparison(self.handler, self.cfg, console, models, messages)
+        task = asyncio.create_task(comparison.run())
+        self._busy = True
+        try:
+            with utils.cancel_on_interrupt(task):
+                lanes = await task
+        finally:
+            self._busy = False
+        for lane in lanes:
+            if not lane.error:
+                self.stats.record(lane.metrics)
+        console.print(comparison.summary())
+
+    def stop_response(self) -> None:
+        """Stop the answer being streamed, keeping what was received."""
+        if self._response_task is None or self._response_task.done():
+            console.print("Nothing to stop.")
+            return
+        self._response_task.cancel()
 
-    def chat(self, query: str) -> None:
+    async def chat(self, query: str) -> None:
         """Send a message and get a response."""
-        self.messages.append({"role": "user", "content": query})
-        response = asyncio.run(self._process_response())
-        if response:
-            self.messages.append({"role": "assistant", "content": response})
+        typeahead = asyncio.create_task(self._typeahead()) if self._reader.enabled else None
+        asked = len(self.messages)
+        self._busy = True
+        try:
+            self._response_task = asyncio.create_task(self._answer(query))
+            with utils.cancel_on_interrupt(self._response_task):
+                response = await self._response_task
+        finally:
+            self._busy = False
+            self._response_task = None
+            if typeahead:
+                typeahead.cancel()
+        if not response:
+            if len(self.messages) > asked:
+                self.messages.pop()
+            return
+        self.messages.append({"role": "assistant", "content": response})
+        self._persist()
+        self.messages.spill(until=self.context.first_kept)
+        self._schedule_summary()
+
+    async def _answer(self, query: str) -> str | None:
+        """Whole turn for `query`, from waiting for the model to the answer, so Ctrl-C at any
+        point cancels the turn. None when there is no answer to keep."""
+        try:
+            await self._wait_warm_up()
+            self.messages.append({"role": "user", "content": query})
+            retrieved = await self._retrieve(query)
+        except asyncio.CancelledError:
+            console.print("[dim]Interrupted.[/dim]")
+            return None
+        return await self._process_response(retrieved)
 
     def run(self) -> None:
-        """Run the main chat loop."""
+        """Run the main chat loop on a single event loop for the whole process."""
+        asyncio.run(self._run())
+
+    async def _run(self) -> None:
+        """Main chat loop, sharing the handler connection pool across turns."""
+        if self.cfg.heartbeat_interval > 0:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        try:
+            await self._loop()
+        finally:
+            for task in (
+                self._summary_task,
+                self._heartbeat_task,
+                self._warm_up_task,
+                self._prefill_task,
+            ):
+                if task:
+                    task.cancel()
+            self.catalog.cancel()
+            if self.cache is not None:
+                self.cache.close()
+            self.messages.close()
+            await self.handler.aclose()
+
+    async def _loop(self) -> None:
+        """Read and dispatch user input until `/quit`."""
         main_panel = Panel(
             renderable=Markdown(assets.WELCOME_MESSAGE + assets.HELP_MESSAGE),
             padding=(0, 1),
@@ -233,38 +877,79 @@ class ChatSession:
             expand=False,
         )
         console.print(main_panel)
-        self._preload_current_model()
+        self._warm_up_task = asyncio.create_task(self._background_warm_up())
 
-        while True:
-            query = input("> ")
-            if query == "/setup":
-                main_panel.renderable = Markdown(
-                    assets.CURRENT_SETTINGS.format(
-                        model=self.cfg.model, url=self.cfg.base_url, role=self.cfg.role
-                    )
-                )
-                console.print(main_panel)
-                self.setup()
-            elif query == "/help":
-                main_panel.renderable = Markdown(assets.HELP_MESSAGE)
-                console.print(main_panel)
-            elif query == "/model":
-                self.select_model()
-            elif query == "/roles":
-                self.select_role()
-            elif query == "/role add":
-                self.add_role()
-            elif query == "/role delete":
-                self.delete_role()
-            elif query == "/quit":
-                console.print("Goodbye! :wave:")
-                break
-            elif not query:
-                pass
-            elif query.startswith("/") and query not in COMMANDS:
-                console.print(
-                    "[bold red]Error:[/bold red] not a valid command. "
-                    "Type `/help` to see available commands."
+        self._reader.start()
+        try:
+            while True:
+                if self._queued:
+                    query = self._queued.popleft()
+                    console.print(f"{self._reader.prompt}{query}", markup=False, highlight=False)
+                else:
+                    try:
+                        query = await self._reader.readline()
+                    except EOFError:
+                        query = "/quit"
+                if not await self._dispatch(query, main_panel):
+                    break
+        finally:
+            self._reader.stop()
+
+    async def _dispatch(self, query: str, main_panel: Panel) -> bool:
+        """Run a command or send a message. Returns False on `/quit`."""
+        if query == "/setup":
+            main_panel.renderable = Markdown(
+                assets.CURRENT_SETTINGS.format(
+                    model=self.cfg.model, url=self.cfg.base_url, role=self.cfg.role
                 )
-            else:
-                self.chat(query)
+            )
+            console.print(main_panel)
+            await self.setup()
+        elif query == "/help":
+            main_panel.renderable = Markdown(assets.HELP_MESSAGE)
+            console.print(main_panel)
+        elif query == "/model":
+            await self.select_model()
+        elif query == "/roles" or query.startswith("/roles "):
+            self.select_role(query.removeprefix("/roles").strip())
+        elif query == "/role add":
+            self.add_role()
+        elif query == "/role delete":
+            self.delete_role()
+        elif query == "/session save":
+            self.save_session()
+        elif query == "/session load":
+            await self.load_session()
+        elif query == "/session list":
+            self.list_sessions()
+        elif query == "/session delete":
+            self.delete_session()
+        elif query == "/stats":
+            self.show_stats()
+        elif query == "/cache":
+            self.show_cache()
+        elif query == "/cache clear":
+            self.clear_cache()
+        elif query == "/cache bypass":
+            self.bypass_cache()
+        elif query == "/quit":
+            console.print("Goodbye! :wave:")
+            return False
+        elif query == "/stop":
+            self.stop_response()
+        elif query.startswith("/compare"):
+            await self.compare(query.removeprefix("/compare"))
+        elif query == "/index":
+            self.show_index()
+        elif query.startswith("/index "):
+            await self.index_path(query.removeprefix("/index ").strip())
+        elif not query:
+            pass
+        elif query.startswith("/") and query not in COMMANDS:
+            console.print(
+                "[bold red]Error:[/bold red] not a valid command. "
+                "Type `/help` to see available commands."
+            )
+        else:
+            await self.chat(query)
+        return True
@@ -0,0 +1,164 @@
+"""Per-turn performance metrics."""
+
+import json
+import math
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable
+
+NANOSECONDS: int = 1_000_000_000
+STATS_WINDOW: int = 500
+
+OLLAMA_TIMINGS = (
+    "total_duration",
+    "load_duration",
+    "prompt_eval_count",
+    "prompt_eval_duration",
+    "eval_count",
+    "eval_duration",
+)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of a non-empty list of values."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+@dataclass
+class TurnMetrics:
+    """Timings of a single chat turn.
+
+    Durations reported by Ollama are kept in nanoseconds, as received.
+    Client-side timings are in seconds.
+    """
+
+    model: str
+    host: str
+    timestamp: float = field(default_factory=time.time)
+    ttft: float | None = None
+    wall_time: float = 0.0
+    render_time: float = 0.0
+    render_frames: int = 0
+    prompt_tokens: int = 0
+    total_duration: int = 0
+    load_duration: int = 0
+    prompt_eval_count: int = 0
+    prompt_eval_duration: int = 0
+    eval_count: int = 0
+    eval_duration: int = 0
+    reused_prompt_tokens: int = 0
+    prefill_eval_duration: int = 0
+    prefill_wait: float = 0.0
+
+    def update_from_ollama(self, data: dict[str, Any]) -> None:
+        """Copy the timing fields of Ollama's final `done` message."""
+        for key in OLLAMA_TIMINGS:
+            setattr(self, key, int(data.get(key) or 0))
+
+    @property
+    def tokens_per_second(self) -> float | None:
+        """Generation speed measured by the server."""
+        if not self.eval_count or not self.eval_duration:
+            return None
+        return self.eval_count * NANOSECONDS / self.eval_duration
+
+    @property
+    def prompt_tokens_per_second(self) -> float | None:
+        """Prompt evaluation speed measured by the server."""
+        if not self.prompt_eval_count or not self.prompt_eval_duration:
+            return None
+        return self.prompt_eval_count * NANOSECONDS / self.prompt_eval_duration
+
+    @property
+    def context_tokens(self) -> int:
+        """Tokens in the server's cache after this turn: the whole prompt and the answer."""
+        return self.reused_prompt_tokens + self.prompt_eval_count + self.eval_count
+
+    @property
+    def prompt_cache_saving(self) -> float | None:
+        """Prompt evaluation time saved by the server cache, in seconds.
+
+        The reused tokens come from the server's counts of the previous turn, when this
+        turn's prompt starts with the previous prompt and answer, and are priced at this
+        turn's measured evaluation speed.
+        """
+        if not self.prompt_eval_count or not self.prompt_eval_duration:
+            return None
+        per_token = self.prompt_eval_duration / self.prompt_eval_count / NANOSECONDS
+        return self.reused_prompt_tokens * per_token
+
+    @property
+    def prefill_saving(self) -> float | None:
+        """Prompt evaluation time done ahead by a prefill while the message was typed,
+        minus the time the turn waited for it to finish, in seconds."""
+        if not self.prefill_eval_duration:
+            return None
+        return self.prefill_eval_duration / NANOSECONDS - self.prefill_wait
+
+    def to_dict(self) -> dict[str, Any]:
+        """Convert metrics to a dictionary for JSON serialization."""
+        data = asdict(self)
+        data["tokens_per_second"] = self.tokens_per_second
+        data["prompt_cache_saving"] = self.prompt_cache_saving
+        data["prefill_saving"] = self.prefill_saving
+        return data
+
+
+# Session summary columns. Extractors return None when a value is not available.
+SUMMARY_METRICS: dict[str, Callable[[TurnMetrics], float | None]] = {
+    "TTFT (ms)": lambda m: m.ttft * 1000 if m.ttft is not None else None,
+    "tok/s": lambda m: m.tokens_per_second,
+    "prompt eval (ms)": lambda m: m.prompt_eval_duration / 1e6 if m.prompt_eval_count else None,
+    "cache saved (ms)": lambda m: (
+        m.prompt_cache_saving * 1000 if m.prompt_cache_saving is not None else None
+    ),
+    "prefill saved (ms)": lambda m: (
+        m.prefill_saving * 1000 if m.prefill_saving is not None else None
+    ),
+    "load (ms)": lambda m: m.load_duration / 1e6,
+    "render (ms)": lambda m: m.render_time * 1000,
+    "total (s)": lambda m: m.wall_time,
+}
+
+
+class StatsRecorder:
+    """Collects turn metrics for the session and optionally appends them to a JSONL file.
+
+    Only the last `window` turns are kept in memory, so a long-running session does not
+    grow; every turn is still written to the log file.
+    """
+
+    def __init__(self, log_file: Path | None = None, window: int = STATS_WINDOW) -> None:
+        self.log_file = log_file
+        self.turns: deque[TurnMetrics] = deque(maxlen=window)
+
+    def record(self, metrics: TurnMetrics) -> None:
+        """Store the metrics of a finished turn."""
+        self.turns.append(metrics)
+        if self.log_file:
+            self.log_file.parent.mkdir(exist_ok=True, parents=True)
+            with open(self.log_file, "a", encoding="utf-8") as file_:
+                file_.write(json.dumps(metrics.to_dict()) + "\n")
+
+    def by_model(self) -> dict[str, list[TurnMetrics]]:
+        """Recorded turns grouped by model."""
+        grouped: dict[str, list[TurnMetrics]] = {}
+        for turn in self.turns:
+            grouped.setdefault(turn.model, []).append(turn)
+        return grouped
+
+    def summary(self) -> dict[str, dict[str, tuple[float, float] | None]]:
+        """p50 and p95 of every summary metric, per model."""
+        result: dict[str, dict[str, tuple[float, float] | None]] = {}
+        for model, turns in self.by_model().items():
+            result[model] = {}
+            for label, extract in SUMMARY_METRICS.items():
+                values = [v for v in map(extract, turns) if v is not None]
+                result[model][label] = (
+                    (percentile(values, 50), percentile(values, 95)) if values else None
+                )
+        return result
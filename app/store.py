@@ -0,0 +1,171 @@
+"""Persistent chat sessions.
+
+Each session is an append-only JSONL log of its messages plus a file of 8-byte offsets,
+one per message, so the newest messages can be read without parsing the whole log.
+A small JSON index keeps the metadata of every session.
+"""
+
+import json
+import os
+import secrets
+import struct
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+from app.config import CONFIG_DIR
+from app.context import estimate_tokens
+
+SESSIONS_DIR = CONFIG_DIR / "sessions"
+
+OFFSET = struct.Struct("<Q")
+
+
+@dataclass
+class SessionInfo:
+    """Metadata of a stored session."""
+
+    id: str
+    title: str
+    model: str
+    role: str
+    created: float = field(default_factory=time.time)
+    updated: float = 0.0
+    message_count: int = 0
+
+    def to_dict(self) -> dict[str, Any]:
+        """Convert to a dictionary for the index, without the derived fields."""
+        data = asdict(self)
+        del data["updated"], data["message_count"]
+        return data
+
+
+class SessionStore:
+    """Stores sessions under `~/.sai/sessions`."""
+
+    def __init__(self, root: Path = SESSIONS_DIR) -> None:
+        self.root = root
+        self.index_file = root / "index.json"
+        self._index: dict[str, dict[str, Any]] | None = None
+
+    def _log_file(self, session_id: str) -> Path:
+        return self.root / f"{session_id}.jsonl"
+
+    def _offsets_file(self, session_id: str) -> Path:
+        return self.root / f"{session_id}.idx"
+
+    @property
+    def index(self) -> dict[str, dict[str, Any]]:
+        """Session metadata by id."""
+        if self._index is None:
+            if self.index_file.exists():
+                with open(self.index_file, "rb") as file_:
+                    self._index = json.load(file_)
+            else:
+                self._index = {}
+        return self._index
+
+    def _save_index(self) -> None:
+        """Atomically replace the index file."""
+        self.root.mkdir(exist_ok=True, parents=True)
+        tmp_file = self.index_file.with_suffix(".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as file_:
+            json.dump(self.index, file_, ensure_ascii=False)
+        os.replace(tmp_file, self.index_file)
+
+    def create(self, title: str, model: str, role: str) -> SessionInfo:
+        """Register a new, empty session."""
+        session_id = time.strftime("%Y%m%d-%H%M%S-") + secrets.token_hex(2)
+        info = SessionInfo(id=session_id, title=title, model=model, role=role)
+        self.index[session_id] = info.to_dict()
+        self._save_index()
+        return info
+
+    def update(self, session_id: str, **fields: str) -> None:
+        """Change metadata of a session, e.g. its model or role."""
+        record = self.index[session_id]
+        if any(record.get(key) != value for key, value in fields.items()):
+            record.update(fields)
+            self._save_index()
+
+    def get(self, session_id: str) -> SessionInfo | None:
+        """Metadata of a session, with its message count and last update time."""
+        record = self.index.get(session_id)
+        if record is None:
+            return None
+        info = SessionInfo(**record)
+        offsets_file = self._offsets_file(session_id)
+        if offsets_file.exists():
+            stat = offsets_file.stat()
+            info.message_count = stat.st_size // OFFSET.size
+            info.updated = stat.st_mtime
+        return info
+
+    def list_sessions(self) -> list[SessionInfo]:
+        """All sessions, most recently updated first."""
+        sessions = [info for info in map(self.get, self.index) if info]
+        return sorted(sessions, key=lambda info: info.updated or info.created, reverse=True)
+
+    def append(self, session_id: str, messages: list[dict[str, str]]) -> None:
+        """Append messages to the session log."""
+        if not messages:
+            return
+        self.root.mkdir(exist_ok=True, parents=True)
+        with (
+            open(self._log_file(session_id), "ab") as log,
+            open(self._offsets_file(session_id), "ab") as offsets,
+        ):
+            position = log.tell()
+            lines: list[bytes] = []
+            positions: list[bytes] = []
+            for message in messages:
+                line = json.dumps(message, ensure_ascii=False).encode() + b"\n"
+                lines.append(line)
+                positions.append(OFFSET.pack(position))
+                position += len(line)
+            # The log is written first, so an offset never points past its end.
+            log.write(b"".join(lines))
+            log.flush()
+            offsets.write(b"".join(positions))
+
+    def load_tail(self, session_id: str, budget: int) -> list[dict[str, str]]:
+        """First message of a session and the newest messages that fit `budget` tokens.
+
+        Messages are read backwards from the end of the log, so the cost depends on the
+        budget and not on the length of the session.
+        """
+        offsets_file = self._offsets_file(session_id)
+        count = offsets_file.stat().st_size // OFFSET.size if offsets_file.exists() else 0
+        if not count:
+            return []
+
+        with open(offsets_file, "rb") as offsets, open(self._log_file(session_id), "rb") as log:
+
+            def read(position: int) -> dict[str, str]:
+                offsets.seek(position * OFFSET.size)
+                (start,) = OFFSET.unpack(offsets.read(OFFSET.size))
+                log.seek(start)
+                message: dict[str, str] = json.loads(log.readline())
+                return message
+
+            head = read(0)
+            used = estimate_tokens(head["content"])
+            tail: list[dict[str, str]] = []
+            for position in range(count - 1, 0, -1):
+                message = read(position)
+                used += estimate_tokens(message["content"])
+                if used > budget and tail:
+                    break
+                tail.append(message)
+        tail.reverse()
+        return [head] + tail
+
+    def delete(self, session_id: str) -> None:
+        """Remove a session and its files."""
+        if session_id not in self.index:
+            raise ValueError(f"Session '{session_id}' not found")
+        del self.index[session_id]
+        self._save_index()
+        self._log_file(session_id).unlink(missing_ok=True)
+        self._offsets_file(session_id).unlink(missing_ok=True)
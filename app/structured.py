@@ -0,0 +1,283 @@
+"""Incremental validation of streamed JSON output.
+
+Answers requested with a `format` are checked character by character while they stream,
+so output that can no longer become valid is rejected at the first wrong character
+instead of after the whole generation. Validation covers JSON syntax and this subset of
+JSON Schema: `type`, `properties`, `required`, `additionalProperties: false`, `items`,
+`enum` and `const`. Other keywords are ignored.
+"""
+
+import json
+import re
+from collections.abc import AsyncGenerator
+from dataclasses import dataclass, field
+from typing import Any
+
+from app.llm import ContentDelta, OllamaError, StreamDone, StreamEvent, ToolCalls
+
+NUMBER = re.compile(r"-?(0|[1-9]\d*)(\.\d+)?([eE][+-]?\d+)?")
+NUMBER_CHARS = frozenset("0123456789+-.eE")
+LITERALS = {"t": "true", "f": "false", "n": "null"}
+WHITESPACE = frozenset(" \t\n\r")
+ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+VALUE_TYPES = {"{": "object", "[": "array", '"': "string", "t": "boolean", "f": "boolean"}
+
+
+class StructuredOutputError(OllamaError):
+    """Exception raised when streamed output does not match the requested format."""
+
+
+def _types(schema: dict[str, Any]) -> set[str] | None:
+    kind = schema.get("type")
+    if kind is None:
+        return None
+    return {kind} if isinstance(kind, str) else set(kind)
+
+
+@dataclass
+class _Container:
+    """An object or array being parsed, and where the parser is inside it."""
+
+    kind: str
+    schema: dict[str, Any]
+    state: str
+    keys: set[str] = field(default_factory=set)
+    key: str = ""
+
+
+class JSONStreamValidator:
+    """Parses JSON fed in arbitrary pieces, failing at the first invalid character.
+
+    Errors are raised as `StructuredOutputError` as soon as the output can no longer
+    become a document matching the schema. Work and memory are proportional to the size
+    of the current scalar and the nesting depth, not to the whole output.
+    """
+
+    def __init__(self, schema: dict[str, Any] | None = None) -> None:
+        self.schema = schema or {}
+        self.position = 0
+        self._stack: list[_Container] = []
+        self._done = False
+        self._started = False
+        # Scalar being read: its kind, schema and characters so far.
+        self._scalar: str | None = None
+        self._scalar_schema: dict[str, Any] = {}
+        self._buffer: list[str] = []
+        self._escape: str | None = None
+        self._is_key = False
+
+    @property
+    def started(self) -> bool:
+        """Whether anything other than whitespace was received."""
+        return self._started
+
+    def _fail(self, reason: str) -> StructuredOutputError:
+        return StructuredOutputError(f"Invalid output at character {self.position}: {reason}")
+
+    def feed(self, text: str) -> None:
+        """Validate the next piece of output."""
+        for char in text:
+            self._feed_char(char)
+            self.position += 1
+
+    def close(self) -> None:
+        """Check that the output is a complete document."""
+        if self._scalar == "number":
+            self._end_scalar()
+        if not self._done:
+            raise self._fail("the output ended before the JSON document was complete")
+
+    def _feed_char(self, char: str) -> None:
+        if self._scalar is not None:
+            if self._scalar_char(char):
+                return
+        if char in WHITESPACE:
+            return
+        if self._done:
+            raise self._fail(f"unexpected {char!r} after the JSON document")
+        self._started = True
+        if not self._stack:
+            self._start_value(char, self.schema)
+            return
+        container = self._stack[-1]
+        if container.kind == "object":
+            self._object_char(container, char)
+        else:
+            self._array_char(container, char)
+
+    def _object_char(self, container: _Container, char: str) -> None:
+        state = container.state
+        if state in ("key_or_end", "key") and char == '"':
+            self._scalar, self._is_key, self._buffer = "string", True, []
+            self._scalar_schema = {}
+        elif state == "key_or_end" and char == "}":
+            self._end_container()
+        elif state == "colon" and char == ":":
+            container.state = "value"
+        elif state == "value":
+            properties = container.schema.get("properties", {})
+            extra = container.schema.get("additionalProperties")
+            schema = properties.get(container.key, extra if isinstance(extra, dict) else {})
+            container.state = "comma_or_end"
+            self._start_value(char, schema)
+        elif state == "comma_or_end" and char in ",}":
+            if char == ",":
+                container.state = "key"
+            else:
+                self._end_container()
+        else:
+            raise self._fail(f"unexpected {char!r} in an object")
+
+    def _array_char(self, container: _Container, char: str) -> None:
+        state = container.state
+        if state == "value_or_end" and char == "]":
+            self._end_container()
+        elif state in ("value_or_end", "value"):
+            items = container.schema.get("items")
+            container.state = "comma_or_end"
+            self._start_value(char, items if isinstance(items, dict) else {})
+        elif state == "comma_or_end" and char in ",]":
+            if char == ",":
+                container.state = "value"
+            else:
+                self._end_container()
+        else:
+            raise self._fail(f"unexpected {char!r} in an array")
+
+    def _start_value(self, char: str, schema: dict[str, Any]) -> None:
+        if char in VALUE_TYPES:
+            kind = VALUE_TYPES[char]
+        elif char == "n":
+            kind = "null"
+        elif char == "-" or char.isdigit():
+            kind = "number"
+        else:
+            raise self._fail(f"unexpected {char!r} where a value was expected")
+        allowed = _types(schema)
+        if allowed is not None and kind not in allowed:
+            if not (kind == "number" and "integer" in allowed):
+                raise self._fail(f"expected {' or '.join(sorted(allowed))}, got {kind}")
+        if kind == "object":
+            self._stack.append(_Container("object", schema, "key_or_end"))
+        elif kind == "array":
+            self._stack.append(_Container("array", schema, "value_or_end"))
+        else:
+            self._scalar = kind if kind in ("string", "number") else "literal"
+            self._scalar_schema = schema
+            self._is_key = False
+            self._buffer = [] if kind == "string" else [char]
+
+    def _scalar_char(self, char: str) -> bool:
+        """Add a character to the scalar being read.
+
+        Returns False when the character ends a number and belongs to what follows it.
+        """
+        if self._scalar == "string":
+            self._string_char(char)
+        elif self._scalar == "number":
+            if char not in NUMBER_CHARS:
+                self._end_scalar()
+                return False
+            self._buffer.append(char)
+        else:
+            self._buffer.append(char)
+            text = "".join(self._buffer)
+            literal = LITERALS[text[0]]
+            if not literal.startswith(text):
+                raise self._fail(f"invalid literal {text!r}")
+            if text == literal:
+                self._end_scalar()
+        return True
+
+    def _string_char(self, char: str) -> None:
+        if self._escape is not None:
+            self._escape += char
+            if self._escape[0] == "u":
+                if len(self._escape) == 5:
+                    try:
+                        self._buffer.append(chr(int(self._escape[1:], 16)))
+                    except ValueError as error:
+                        raise self._fail("invalid unicode escape") from error
+                    self._escape = None
+            elif self._escape in ESCAPES:
+                self._buffer.append(ESCAPES[self._escape])
+                self._escape = None
+            else:
+                raise self._fail(f"invalid escape \\{self._escape}")
+        elif char == "\\":
+            self._escape = ""
+        elif char == '"':
+            self._end_scalar()
+        elif char < " ":
+            raise self._fail("control character in a string")
+        else:
+            self._buffer.append(char)
+            enum = self._scalar_schema.get("enum")
+            if not self._is_key and enum is not None:
+                text = "".join(self._buffer)
+                if not any(isinstance(v, str) and v.startswith(text) for v in enum):
+                    raise self._fail(f"{text!r} does not start any of {enum}")
+
+    def _end_scalar(self) -> None:
+        kind, text = self._scalar, "".join(self._buffer)
+        self._scalar = None
+        if kind == "string" and self._is_key:
+            container = self._stack[-1]
+            properties = container.schema.get("properties", {})
+            if container.schema.get("additionalProperties") is False and text not in properties:
+                raise self._fail(f"unexpected property {text!r}")
+            container.key = text
+            container.keys.add(text)
+            container.state = "colon"
+            return
+        if kind == "number":
+            if not NUMBER.fullmatch(text):
+                raise self._fail(f"invalid number {text!r}")
+            value: Any = json.loads(text)
+            allowed = _types(self._scalar_schema)
+            fraction = isinstance(value, float) and not value.is_integer()
+            if allowed is not None and fraction and "number" not in allowed:
+                raise self._fail(f"expected integer, got {text}")
+        else:
+            value = text if kind == "string" else json.loads(text)
+        self._check_value(value, self._scalar_schema)
+        self._end_value()
+
+    def _check_value(self, value: Any, schema: dict[str, Any]) -> None:
+        if "enum" in schema and value not in schema["enum"]:
+            raise self._fail(f"{value!r} is not one of {schema['enum']}")
+        if "const" in schema and value != schema["const"]:
+            raise self._fail(f"{value!r} is not {schema['const']!r}")
+
+    def _end_container(self) -> None:
+        container = self._stack.pop()
+        if container.kind == "object":
+            missing = [k for k in container.schema.get("required", []) if k not in container.keys]
+            if missing:
+                raise self._fail(f"missing required properties {missing}")
+        self._end_value()
+
+    def _end_value(self) -> None:
+        if not self._stack:
+            self._done = True
+
+
+async def validate_stream(
+    events: AsyncGenerator[StreamEvent, Any], validator: JSONStreamValidator
+) -> AsyncGenerator[StreamEvent, Any]:
+    """Pass events through, validating the answer and closing the stream on invalid output.
+
+    A turn that only calls tools has no answer and is not validated.
+    """
+    calls_tools = False
+    try:
+        async for event in events:
+            if isinstance(event, ContentDelta):
+                validator.feed(event.text)
+            elif isinstance(event, ToolCalls):
+                calls_tools = True
+            elif isinstance(event, StreamDone) and not calls_tools:
+                validator.close()
+            yield event
+    finally:
+        await events.aclose()
@@ -0,0 +1,174 @@
+"""Line input that keeps working while the chat is busy.
+
+The terminal is switched to non-canonical mode without echo, and keystrokes are read by
+an event loop callback instead of a blocking `input()`. The line being typed is kept
+here and drawn by the reader itself when idle, or as part of the live answer panel while
+a response streams, so the next prompt can be typed and edited at any time.
+"""
+
+import asyncio
+import codecs
+import os
+import shutil
+import sys
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from rich.text import Text
+
+from app.utils import async_input
+
+try:
+    import termios
+except ImportError:  # Windows
+    termios = None  # type: ignore[assignment]
+
+BACKSPACE = ("\x7f", "\x08")
+CTRL_D = "\x04"
+CTRL_U = "\x15"
+CTRL_W = "\x17"
+ESCAPE = "\x1b"
+
+
+class LineReader:
+    """Reads lines from the terminal on the event loop, with basic line editing.
+
+    Supported keys: backspace, Ctrl-U (clear line), Ctrl-W (delete word) and Ctrl-D
+    (end of input on an empty line). Other escape sequences, such as arrow keys, are
+    ignored. Without a POSIX terminal, lines are read with a blocking `input()` in a
+    thread and nothing can be typed ahead.
+    """
+
+    def __init__(self, prompt: str = "> ") -> None:
+        self.prompt = prompt
+        self.draft = ""
+        self.lines: asyncio.Queue[str | None] = asyncio.Queue()
+        self.waiting = False
+        self._fd = sys.stdin.fileno()
+        self._saved_mode: list[Any] | None = None
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._escape: str | None = None
+        # Called with the draft when a new line starts being typed at the prompt.
+        self.on_typing: Callable[[str], None] | None = None
+
+    @property
+    def enabled(self) -> bool:
+        """Whether keystrokes are read on the event loop."""
+        return self._saved_mode is not None
+
+    def start(self) -> None:
+        """Switch the terminal to character mode and start reading keystrokes."""
+        if termios is None or not os.isatty(self._fd) or self.enabled:
+            return
+        self._saved_mode = termios.tcgetattr(self._fd)
+        mode = termios.tcgetattr(self._fd)
+        mode[3] &= ~(termios.ECHO | termios.ICANON)
+        mode[6][termios.VMIN] = 1
+        mode[6][termios.VTIME] = 0
+        termios.tcsetattr(self._fd, termios.TCSANOW, mode)
+        asyncio.get_running_loop().add_reader(self._fd, self._on_readable)
+
+    def stop(self) -> None:
+        """Stop reading and restore the terminal mode."""
+        if self._saved_mode is None:
+            return
+        asyncio.get_running_loop().remove_reader(self._fd)
+        termios.tcsetattr(self._fd, termios.TCSANOW, self._saved_mode)
+        self._saved_mode = None
+
+    def visible_line(self) -> str:
+        """Prompt and the end of the draft that fits the terminal width."""
+        room = max(1, shutil.get_terminal_size().columns - len(self.prompt) - 1)
+        return self.prompt + self.draft[-room:]
+
+    def redraw(self) -> None:
+        """Draw the prompt line again, e.g. after something was printed over it."""
+        sys.stdout.write("\r\x1b[2K" + self.visible_line())
+        sys.stdout.flush()
+
+    @contextmanager
+    def above(self) -> Iterator[None]:
+        """Print something above the prompt line, e.g. from a background task, and draw the
+        prompt and the draft again below it."""
+        if self.waiting:
+            sys.stdout.write("\r\x1b[2K")
+            sys.stdout.flush()
+        try:
+            yield
+        finally:
+            if self.waiting:
+                self.redraw()
+
+    def __rich__(self) -> Text:
+        return Text(self.visible_line(), style="dim")
+
+    async def readline(self) -> str:
+        """Next line typed, showing the prompt while waiting for it."""
+        if not self.enabled:
+            return await async_input(self.prompt)
+        if self.lines.empty():
+            self.redraw()
+            self.waiting = True
+            try:
+                line = await self.lines.get()
+            finally:
+                self.waiting = False
+        else:  # Typed ahead while busy, show it as if it was typed now
+            line = self.lines.get_nowait()
+            if line is not None:
+                sys.stdout.write(f"\r\x1b[2K{self.prompt}{line}\n")
+        if line is None:
+            raise EOFError
+        return line
+
+    def _submit(self, line: str | None) -> None:
+        if self.waiting:
+            sys.stdout.write("\n")
+            sys.stdout.flush()
+        self.lines.put_nowait(line)
+
+    def _on_readable(self) -> None:
+        data = os.read(self._fd, 1024)
+        if not data:
+            self._submit(None)
+            self.stop()
+            return
+        had_draft = bool(self.draft)
+        for char in self._decoder.decode(data):
+            self._feed(char)
+        if self.waiting:
+            self.redraw()
+            if not had_draft and self.draft and self.on_typing is not None:
+                self.on_typing(self.draft)
+
+    def _feed(self, char: str) -> None:
+        """Apply one typed character to the draft."""
+        if self._escape is not None:
+            # Skip escape sequences: ESC, an optional [ or O, parameters, a final char.
+            if not self._escape and char in "[O":
+                self._escape = char
+            elif self._escape and char in "0123456789;":
+                pass
+            else:
+                self._escape = None
+            return
+        if char == ESCAPE:
+            self._escape = ""
+        elif char in "\r\n":
+            line, self.draft = self.draft, ""
+            self._submit(line)
+        elif char in BACKSPACE:
+            self.draft = self.draft[:-1]
+        elif char == CTRL_U:
+            self.draft = ""
+        elif char == CTRL_W:
+            self.draft = self.draft.rstrip().rpartition(" ")[0]
+            self.draft += " " if self.draft else ""
+        elif char == CTRL_D:
+            if not self.draft:
+                self._submit(None)
+        elif char == "\t":
+            self.draft += " "
+        elif char.isprintable():
+            self.draft += char
@@ -0,0 +1,268 @@
+"""Local tools the model can call.
+
+Tools are plain Python functions registered with the `tool` decorator. Their JSON schema
+is derived from the signature unless one is given, and the arguments sent by the model
+are validated against it before the call. Functions can be sync or async; sync ones run
+in a worker thread so several tools can run at once.
+
+The file tools only reach paths under `tool_root`, the working directory by default, and
+are only enabled when named, since piped input could ask the model to read local files.
+More tools can be loaded from the files listed in the `tool_files` setting:
+
+    from app.tools import tool
+
+    @tool
+    def word_count(text: str) -> int:
+        \"\"\"Count the words of a text.\"\"\"
+        return len(text.split())
+"""
+
+import asyncio
+import importlib.util
+import inspect
+import json
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, TypeVar, get_type_hints, overload
+
+from app import config
+from app.structured import JSONStreamValidator, StructuredOutputError
+
+JSON_TYPES: dict[Any, str] = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    list: "array",
+    dict: "object",
+}
+MAX_READ_BYTES: int = 64 * 1024
+MAX_DIRECTORY_ENTRIES: int = 500
+
+Function = TypeVar("Function", bound=Callable[..., Any])
+
+
+class ToolError(Exception):
+    """Exception raised when a tool cannot be found, loaded or called."""
+
+
+def _parameters(function: Callable[..., Any]) -> dict[str, Any]:
+    """JSON schema of the arguments of a function, from its type hints."""
+    hints = get_type_hints(function)
+    properties: dict[str, Any] = {}
+    required: list[str] = []
+    for name, parameter in inspect.signature(function).parameters.items():
+        origin = getattr(hints.get(name), "__origin__", hints.get(name))
+        properties[name] = {"type": JSON_TYPES[origin]} if origin in JSON_TYPES else {}
+        if parameter.default is inspect.Parameter.empty:
+            required.append(name)
+    return {"type": "object", "properties": properties, "required": required}
+
+
+@dataclass
+class Tool:
+    """A function the model can call."""
+
+    name: str
+    description: str
+    parameters: dict[str, Any]
+    function: Callable[..., Any]
+    # Only enabled when named, not when every tool is.
+    opt_in: bool = False
+
+    @classmethod
+    def from_function(
+        cls,
+        function: Callable[..., Any],
+        name: str | None = None,
+        description: str | None = None,
+        parameters: dict[str, Any] | None = None,
+        opt_in: bool = False,
+    ) -> "Tool":
+        """Tool calling `function`, described by its name, docstring and signature."""
+        return cls(
+            name=name or function.__name__,
+            description=description or inspect.getdoc(function) or "",
+            parameters=parameters or _parameters(function),
+            function=function,
+            opt_in=opt_in,
+        )
+
+    def schema(self) -> dict[str, Any]:
+        """Definition of the tool for the `tools` field of a chat request."""
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": self.parameters,
+            },
+        }
+
+    def check_arguments(self, arguments: dict[str, Any]) -> None:
+        """Raise `ToolError` if the arguments do not match the parameters schema."""
+        validator = JSONStreamValidator(self.parameters)
+        try:
+            validator.feed(json.dumps(arguments))
+            validator.close()
+        except StructuredOutputError as error:
+            raise ToolError(f"Invalid arguments for {self.name}: {error}") from error
+
+
+class ToolRegistry:
+    """Tools by name, run concurrently when the model calls several at once."""
+
+    def __init__(self, timeout: float = config.DEFAULT_TOOL_TIMEOUT) -> None:
+        self.timeout = timeout
+        self.root = Path.cwd().resolve()
+        self.tools: dict[str, Tool] = {}
+
+    @overload
+    def register(self, function: Function) -> Function: ...
+
+    @overload
+    def register(
+        self,
+        function: None = None,
+        *,
+        name: str | None = None,
+        description: str | None = None,
+        parameters: dict[str, Any] | None = None,
+        opt_in: bool = False,
+    ) -> Callable[[Function], Function]: ...
+
+    def register(
+        self,
+        function: Function | None = None,
+        *,
+        name: str | None = None,
+        description: str | None = None,
+        parameters: dict[str, Any] | None = None,
+        opt_in: bool = False,
+    ) -> Function | Callable[[Function], Function]:
+        """Register a function as a tool. Usable as `@tool` or `@tool(name=...)`.
+
+        With `opt_in`, the tool is only enabled when it is asked for by name.
+        """
+
+        def decorator(function: Function) -> Function:
+            item = Tool.from_function(function, name, description, parameters, opt_in)
+            self.tools[item.name] = item
+            return function
+
+        return decorator(function) if function is not None else decorator
+
+    @staticmethod
+    def load_file(path: Path) -> None:
+        """Run a Python file whose `@tool` functions register in the default registry."""
+        spec = importlib.util.spec_from_file_location(f"sai_tools_{path.stem}", path)
+        if spec is None or spec.loader is None:
+            raise ToolError(f"Cannot load tools from {path}")
+        module = importlib.util.module_from_spec(spec)
+        try:
+            spec.loader.exec_module(module)
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            raise ToolError(
+                f"Cannot load tools from {path}: {error.__class__.__name__}: {error}"
+            ) from error
+
+    def subset(self, names: Iterable[str]) -> "ToolRegistry":
+        """Registry with only the named tools."""
+        selected = ToolRegistry(timeout=self.timeout)
+        selected.root = self.root
+        for name in names:
+            if name not in self.tools:
+                available = ", ".join(sorted(self.tools))
+                raise ToolError(f"Unknown tool '{name}'. Available: {available}")
+            selected.tools[name] = self.tools[name]
+        return selected
+
+    def schemas(self) -> list[dict[str, Any]]:
+        """Definitions of every tool for a chat request."""
+        return [item.schema() for item in self.tools.values()]
+
+    async def _invoke(self, item: Tool, arguments: dict[str, Any]) -> Any:
+        if inspect.iscoroutinefunction(item.function):
+            coroutine = item.function(**arguments)
+        else:
+            coroutine = asyncio.to_thread(item.function, **arguments)
+        return await asyncio.wait_for(coroutine, timeout=self.timeout)
+
+    async def call(self, call: dict[str, Any]) -> dict[str, Any]:
+        """Run one tool call and return its result as a `tool` message.
+
+        Errors are reported to the model in the message instead of being raised, so it
+        can correct the call.
+        """
+        function = call.get("function", {})
+        name = str(function.get("name", ""))
+        arguments = function.get("arguments") or {}
+        try:
+            if isinstance(arguments, str):
+                arguments = json.loads(arguments)
+            item = self.tools.get(name)
+            if item is None:
+                raise ToolError(f"Unknown tool '{name}'")
+            item.check_arguments(arguments)
+            result = await self._invoke(item, arguments)
+            content = result if isinstance(result, str) else json.dumps(result, default=str)
+        except TimeoutError:
+            content = f"Error: {name} did not finish within {self.timeout:g}s"
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            content = f"Error: {error.__class__.__name__}: {error}"
+        return {"role": "tool", "tool_name": name, "content": content}
+
+    async def run(self, calls: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Run the tool calls of one answer concurrently, returning results in call order."""
+        return list(await asyncio.gather(*(self.call(c) for c in calls)))
+
+    @classmethod
+    def from_config(cls, cfg: config.OllamaConfig, names: Iterable[str] = ()) -> "ToolRegistry":
+        """The named tools, or all of them except the opt-in ones, from the built-in tools
+        and those of `tool_files`."""
+        for path in cfg.tool_files:
+            cls.load_file(path)
+        registry.root = (cfg.tool_root or Path.cwd()).resolve()
+        default = [name for name, item in registry.tools.items() if not item.opt_in]
+        selected = registry.subset(list(names) or default)
+        selected.timeout = cfg.tool_timeout
+        return selected
+
+
+registry = ToolRegistry()
+tool = registry.register
+
+
+@tool
+def current_time() -> str:
+    """Current local date and time in ISO 8601 format."""
+    return time.strftime("%Y-%m-%dT%H:%M:%S%z")
+
+
+def _confined(path: str) -> Path:
+    """Resolved `path`, relative to the tool root, which it must not leave."""
+    resolved = (registry.root / path).resolve()
+    if not resolved.is_relative_to(registry.root):
+        raise ToolError(f"{path} is outside of {registry.root}")
+    return resolved
+
+
+@tool(opt_in=True)
+def read_file(path: str, max_bytes: int = MAX_READ_BYTES) -> str:
+    """Read a text file under the working directory. Long files are cut after `max_bytes`
+    bytes."""
+    limit = max(0, min(max_bytes, MAX_READ_BYTES))
+    with open(_confined(path), "rb") as file_:
+        data = file_.read(limit + 1)
+    text = data[:limit].decode("utf-8", errors="replace")
+    return text + ("\n[truncated]" if len(data) > limit else "")
+
+
+@tool(opt_in=True)
+def list_directory(path: str = ".") -> list[str]:
+    """Names of the entries of a directory under the working directory, with a trailing
+    slash for directories."""
+    entries = sorted(_confined(path).iterdir())[:MAX_DIRECTORY_ENTRIES]
+    return [entry.name + ("/" if entry.is_dir() else "") for entry in entries]
@@ -1,9 +1,82 @@
 """Utility functions."""
-import inquirer
+import asyncio
+import importlib.util
+import signal
+import sys
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from types import FrameType, ModuleType
+from typing import Any
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Import a module on first attribute access, to keep startup fast."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+async def async_input(prompt: str) -> str:
+    """Read a line from the terminal without blocking the event loop.
+
+    A daemon thread is used instead of the default executor, so a pending read never
+    keeps the process alive on exit.
+    """
+    loop = asyncio.get_running_loop()
+    future: asyncio.Future[str] = loop.create_future()
+
+    def _resolve(value: str | None, error: BaseException | None) -> None:
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value or "")
+
+    def _read() -> None:
+        value: str | None = None
+        error: BaseException | None = None
+        try:
+            value = input(prompt)
+        except (EOFError, OSError) as exc:
+            error = exc
+        try:
+            loop.call_soon_threadsafe(_resolve, value, error)
+        except RuntimeError:  # The loop was closed while waiting for input
+            pass
+
+    threading.Thread(target=_read, daemon=True).start()
+    return await future
+
+
+@contextmanager
+def cancel_on_interrupt(task: "asyncio.Task[Any]") -> Iterator[None]:
+    """Make Ctrl-C cancel `task` instead of the whole program, within the block."""
+    loop = asyncio.get_running_loop()
+
+    def _handler(signum: int, frame: FrameType | None) -> None:  # pylint: disable=unused-argument
+        loop.call_soon_threadsafe(task.cancel)
+
+    previous = signal.signal(signal.SIGINT, _handler)
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGINT, previous)
 
 
 def item_selection_input(message: str, items: list[str]) -> str:
     """Display a selection interface in the terminal."""
+    import inquirer  # pylint: disable=import-outside-toplevel
+
     question = inquirer.List(
         name="value",
         message=message,
@@ -17,6 +90,8 @@ def item_selection_input(message: str, items: list[str]) -> str:
 
 def text_input(message: str) -> str | None:
     """Display a text input interface in the terminal."""
+    import inquirer  # pylint: disable=import-outside-toplevel
+
     question = inquirer.Text(
         name="value",
         message=message,
@@ -0,0 +1,51 @@
+"""Run every benchmark with a regression threshold and fail if any of them regressed.
+
+Each benchmark runs in its own process with its default limits; extra arguments are not
+forwarded, run a benchmark module directly to change them. Separate processes keep the
+imports, memory tracing and resident memory of one benchmark out of the others, which is
+why these are scripts and not pytest-benchmark tests.
+
+Usage: python -m benchmarks [NAME ...]
+"""
+
+import importlib.util
+import subprocess
+import sys
+import time
+
+SUITE = (
+    "bench_ttft",
+    "bench_render",
+    "bench_session",
+    "bench_startup",
+    "bench_retrieval",
+    "bench_connection_reuse",
+)
+REQUIRES = {"bench_retrieval": "numpy"}
+
+
+def main() -> None:
+    """Run the selected benchmarks, all by default."""
+    names = sys.argv[1:] or list(SUITE)
+    unknown = [name for name in names if name not in SUITE]
+    if unknown:
+        sys.exit(f"Unknown benchmarks: {', '.join(unknown)}. Available: {', '.join(SUITE)}")
+    results: dict[str, str] = {}
+    for name in names:
+        requirement = REQUIRES.get(name)
+        if requirement and importlib.util.find_spec(requirement) is None:
+            results[name] = f"skipped ({requirement} not installed)"
+            continue
+        print(f"== {name}", flush=True)
+        started = time.perf_counter()
+        returncode = subprocess.call([sys.executable, "-m", f"benchmarks.{name}"])
+        elapsed = time.perf_counter() - started
+        results[name] = f"{'ok' if returncode == 0 else 'REGRESSION'} in {elapsed:.0f}s"
+    print()
+    for name, result in results.items():
+        print(f"{name:<16} {result}")
+    sys.exit(1 if any(r.startswith("REGRESSION") for r in results.values()) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Per-turn time-to-first-token with a fresh client and loop per turn vs. a pooled handler.
+
+Fails when the pooled handler's median is not below `--max-ratio` times the median with a
+fresh client per turn.
+
+Usage: python -m benchmarks.bench_connection_reuse [--turns N] [--url URL] [--max-ratio X]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from typing import Any
+
+import httpx
+
+from app.llm import OllamaHandler
+from benchmarks.stub_server import StubServer
+
+PAYLOAD: dict[str, Any] = {
+    "model": "stub:latest",
+    "messages": [{"role": "user", "content": "hi"}],
+}
+
+
+async def _fresh_client_turn(url: str) -> float:
+    """One turn the way sai used to do it: new client, new connection."""
+    start = time.perf_counter()
+    ttft = 0.0
+    async with httpx.AsyncClient(timeout=60) as client:
+        async with client.stream("POST", f"{url}/api/chat", json=PAYLOAD) as response:
+            async for _ in response.aiter_bytes():
+                ttft = ttft or time.perf_counter() - start
+    return ttft
+
+
+def run_before(url: str, turns: int) -> list[float]:
+    """A new event loop and a new client for every turn."""
+    return [asyncio.run(_fresh_client_turn(url)) for _ in range(turns)]
+
+
+async def _run_after(url: str, turns: int) -> list[float]:
+    handler = OllamaHandler(url=url, timeout=60)
+    results: list[float] = []
+    try:
+        for _ in range(turns):
+            start = time.perf_counter()
+            ttft = 0.0
+            async for _chunk in handler.stream_response(PAYLOAD):
+                ttft = ttft or time.perf_counter() - start
+            results.append(ttft)
+    finally:
+        await handler.aclose()
+    return results
+
+
+def run_after(url: str, turns: int) -> list[float]:
+    """One event loop and one pooled handler for all turns."""
+    return asyncio.run(_run_after(url, turns))
+
+
+def _report(name: str, samples: list[float]) -> float:
+    """Print the statistics of a variant and return its median."""
+    millis = sorted(s * 1000 for s in samples)
+    print(
+        f"{name:<8} mean {statistics.mean(millis):7.3f} ms  "
+        f"p50 {statistics.median(millis):7.3f} ms  "
+        f"p95 {millis[int(len(millis) * 0.95) - 1]:7.3f} ms"
+    )
+    return statistics.median(millis)
+
+
+def main() -> None:
+    """Run both variants and print time-to-first-token statistics."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--url", help="Benchmark a real Ollama instead of the local stub")
+    parser.add_argument("--model", help="Model to use with --url")
+    parser.add_argument("--max-ratio", type=float, default=0.9)
+    args = parser.parse_args()
+
+    if args.url:
+        PAYLOAD["model"] = args.model or PAYLOAD["model"]
+        before = _report("before", run_before(args.url, args.turns))
+        after = _report("after", run_after(args.url, args.turns))
+    else:
+        with StubServer() as server:
+            before = _report("before", run_before(server.url, args.turns))
+            after = _report("after", run_after(server.url, args.turns))
+    ratio = after / before if before else 0.0
+    status = "ok" if ratio <= args.max_ratio else "REGRESSION"
+    print(f"after / before p50 {ratio:6.2f} x  (limit {args.max_ratio:g} x)  {status}")
+    sys.exit(1 if ratio > args.max_ratio else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Client CPU time per streamed token spent building the answer panel, with thresholds.
+
+Feeds a generated Markdown answer token by token to `IncrementalMarkdown` and builds and
+renders the scrolling panel to lines of segments after every token, the worst case
+without frame limiting. Nothing is written out, so terminal output is not measured.
+Fails when the median CPU time per token exceeds its limit, or when tokens late in the
+answer cost much more than early ones, i.e. rendering is no longer incremental.
+
+Usage: python -m benchmarks.bench_render [--tokens N] [--max-us-per-token US] [--max-growth X]
+"""
+
+import argparse
+import io
+import re
+import statistics
+import sys
+import time
+from collections.abc import Iterator
+
+from rich.console import Console
+
+from app.render import IncrementalMarkdown, create_scrolling_panel
+
+PARAGRAPH = (
+    "Streaming answers are rendered as they arrive, so the cost of each token must not "
+    "depend on how long the answer already is. Closed blocks like this one are cached. "
+)
+# Code blocks and lists long enough that rendering them again in full for every token shows.
+CODE_LINE = "for index, item in enumerate(rows[{n}]):\n    print(index, item)\n"
+CODE = "```python\n" + "".join(CODE_LINE.format(n=n) for n in range(20)) + "```\n"
+LIST = "".join(f"- item {n} with `code` and **bold** text\n" for n in range(40))
+
+
+def answer_tokens(count: int) -> Iterator[str]:
+    """`count` tokens of an answer mixing paragraphs, code blocks and lists."""
+    blocks = (PARAGRAPH + "\n\n", CODE + "\n", LIST + "\n")
+    produced = 0
+    while True:
+        for block in blocks:
+            for word in re.findall(r"\S+\s*", block):
+                yield word
+                produced += 1
+                if produced == count:
+                    return
+
+
+def measure(tokens: int, width: int, height: int) -> list[float]:
+    """CPU seconds spent per token to build and render the panel."""
+    console = Console(file=io.StringIO(), width=width, height=height, force_terminal=True)
+    renderer = IncrementalMarkdown(console)
+    timings: list[float] = []
+    for token in answer_tokens(tokens):
+        started = time.process_time()
+        renderer.append(token)
+        panel = create_scrolling_panel(
+            renderer=renderer,
+            title="bench",
+            subtitle="stub:latest",
+            border_style="yellow",
+            max_height=height - 5,
+            options=console.options,
+        )
+        console.render_lines(panel, console.options)
+        timings.append(time.process_time() - started)
+    return timings
+
+
+def main() -> None:
+    """Run the rendering benchmark and fail on regressions."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, default=4000)
+    parser.add_argument("--width", type=int, default=100)
+    parser.add_argument("--height", type=int, default=40)
+    parser.add_argument("--max-us-per-token", type=float, default=15000.0)
+    parser.add_argument("--max-growth", type=float, default=3.0)
+    args = parser.parse_args()
+
+    timings = measure(args.tokens, args.width, args.height)
+    quarter = len(timings) // 4
+    first = statistics.median(timings[:quarter]) * 1e6
+    last = statistics.median(timings[-quarter:]) * 1e6
+    median = statistics.median(timings) * 1e6
+    growth = last / first if first else 0.0
+
+    failed = False
+    for name, value, limit, unit in (
+        ("cpu per token p50", median, args.max_us_per_token, "us"),
+        ("last / first quarter", growth, args.max_growth, "x"),
+    ):
+        status = "ok" if value <= limit else "REGRESSION"
+        failed = failed or value > limit
+        print(f"{name:<22} {value:8.1f} {unit:<2}  (limit {limit:g} {unit})  {status}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
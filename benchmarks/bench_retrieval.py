@@ -0,0 +1,76 @@
+"""Search latency of the retrieval index, with a regression threshold.
+
+Fills a temporary index with random vectors, then times the cosine search of random
+queries. Embedding is not included, so no Ollama instance is needed. Requires NumPy.
+
+Usage: python -m benchmarks.bench_retrieval [--chunks N] [--dim D] [--max-ms MS]
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.retrieval import IndexedFile, VectorIndex
+
+CHUNKS_PER_FILE = 1000
+
+
+def build_index(root: Path, chunks: int, dim: int) -> VectorIndex:
+    """Index of `chunks` random vectors, spread over files of CHUNKS_PER_FILE chunks."""
+    rng = np.random.default_rng(0)
+    index = VectorIndex(root)
+    index.model = "bench"
+    for first in range(0, chunks, CHUNKS_PER_FILE):
+        count = min(CHUNKS_PER_FILE, chunks - first)
+        key = f"/bench/file{first // CHUNKS_PER_FILE}.md"
+        texts = [f"chunk {first + i}" for i in range(count)]
+        vectors = rng.standard_normal((count, dim), dtype=np.float32)
+        index.add_file(key, IndexedFile(mtime=0.0, size=0, sha256=""), texts, vectors)
+    index.save()
+    return index
+
+
+def main() -> None:
+    """Run the search benchmark and fail on regressions."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--max-ms", type=float, default=100.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    with tempfile.TemporaryDirectory() as root:
+        started = time.perf_counter()
+        build_index(Path(root), args.chunks, args.dim)
+        build_time = time.perf_counter() - started
+        index = VectorIndex(Path(root))
+        cold_started = time.perf_counter()
+        index.nearest(rng.standard_normal(args.dim), args.k)
+        cold = (time.perf_counter() - cold_started) * 1000
+        timings = []
+        for _ in range(args.queries):
+            query = rng.standard_normal(args.dim)
+            started = time.perf_counter()
+            index.nearest(query, args.k)
+            timings.append((time.perf_counter() - started) * 1000)
+
+    median = statistics.median(timings)
+    p95 = statistics.quantiles(timings, n=20)[-1]
+    print(f"index: {args.chunks} chunks x {args.dim} dims, built in {build_time:.1f}s")
+    print(f"first search (cold map)  {cold:8.1f} ms")
+    print(f"search p50               {median:8.1f} ms")
+    print(f"search p95               {p95:8.1f} ms")
+    status = "ok" if median <= args.max_ms else "REGRESSION"
+    print(f"limit {args.max_ms:.0f} ms: {status}")
+    sys.exit(0 if median <= args.max_ms else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Memory growth and time-to-first-token of a long headless chat session, with thresholds.
+
+Runs `ChatSession.chat` for many turns against the stub server, with the console
+writing to the null device and a temporary home directory. The model catalogue is
+fetched first, from `/api/tags` and `/api/show`, as at startup, and must report the
+stub's context length. Memory is traced with
+`tracemalloc` from the start and compared over the second half of the turns, once
+the context window and the statistics window are full, so it should stay flat: the
+growth per turn covers the history, the metrics and anything the session keeps by
+mistake. Rich caches the width of up to 4096 rendered strings; that cache is cleared
+before each measurement, as it takes thousands of turns to fill. The resident set size
+is compared over the same turns, to also catch memory held outside Python objects; it is
+read from `/proc` and not checked where that is not available.
+
+Usage: python -m benchmarks.bench_session [--turns N] [--max-kb-per-turn KB]
+       [--max-rss-kb-per-turn KB] [--max-ttft-ms MS]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from rich.cells import cached_cell_len
+from rich.console import Console
+
+from benchmarks.stub_server import StubServer
+
+WARM_UP_TURNS = 20
+STATM = Path("/proc/self/statm")
+
+
+def resident_bytes() -> int | None:
+    """Resident set size of this process, where `/proc` is available."""
+    try:
+        return int(STATM.read_text(encoding="ascii").split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+async def _run_turns(
+    turns: int, tokens: int
+) -> tuple[float, float | None, list[float], float, int, int | None]:
+    """Traced bytes and resident bytes per turn over the second half, recent times to first
+    token, wall time per turn, the number of messages still in memory and the context
+    length the model catalogue reported."""
+    import app.session  # pylint: disable=import-outside-toplevel
+
+    session = app.session.ChatSession()
+    half = turns // 2
+    tracemalloc.start()
+    try:
+        # Like the startup check, so turns are budgeted with the catalogue's context length.
+        await session.catalog.get(session.handler)
+        context_length = session.catalog.context_length(session.cfg.model)
+        for turn in range(WARM_UP_TURNS):
+            await session.chat(f"warm up {turn}")
+        before, rss_before = tracemalloc.get_traced_memory()[0], resident_bytes()
+        started = time.perf_counter()
+        for turn in range(turns):
+            if turn == half:
+                cached_cell_len.cache_clear()
+                before = tracemalloc.get_traced_memory()[0]
+                rss_before = resident_bytes()
+            await session.chat(f"question {turn}: " + "word " * tokens)
+        wall = (time.perf_counter() - started) / turns
+        cached_cell_len.cache_clear()
+        growth = (tracemalloc.get_traced_memory()[0] - before) / (turns - half)
+        rss_after = resident_bytes()
+        rss_growth = (
+            (rss_after - rss_before) / (turns - half)
+            if rss_before is not None and rss_after is not None
+            else None
+        )
+        tracemalloc.stop()
+        resident = len(session.messages) - session.messages.spilled
+    finally:
+        session.messages.close()
+        await session.handler.aclose()
+    ttfts = [turn.ttft for turn in session.stats.turns if turn.ttft is not None]
+    return growth, rss_growth, ttfts, wall, resident, context_length
+
+
+def main() -> None:
+    """Run the session benchmark and fail on regressions."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--max-kb-per-turn", type=float, default=0.5)
+    parser.add_argument("--max-rss-kb-per-turn", type=float, default=2.0)
+    parser.add_argument("--max-ttft-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home, StubServer(tokens=args.tokens) as server:
+        os.environ["HOME"] = home
+        config_dir = Path(home) / ".sai"
+        config_dir.mkdir()
+        (config_dir / "config.toml").write_text(
+            f'[ollama]\nbase_url = "{server.url}"\nmodel = "stub:latest"\n', encoding="utf-8"
+        )
+        import app.session  # pylint: disable=import-outside-toplevel
+
+        with open(os.devnull, "w", encoding="utf-8") as devnull:
+            app.session.console = Console(file=devnull, width=100, height=40)
+            growth, rss_growth, ttfts, wall, resident, context_length = asyncio.run(
+                _run_turns(args.turns, args.tokens)
+            )
+
+    kb_per_turn = growth / 1024
+    ttft = statistics.median(ttfts) * 1000
+    print(f"{args.turns} turns of {args.tokens} tokens, {wall * 1000:.1f} ms per turn")
+    print(f"messages in memory at the end: {resident}")
+    print(f"context length from the catalogue: {context_length}")
+    if context_length != server.context_length:
+        print(f"expected the stub's context length {server.context_length}  REGRESSION")
+        sys.exit(1)
+    checks = [
+        ("memory growth", kb_per_turn, args.max_kb_per_turn, "KB/turn"),
+        ("ttft p50", ttft, args.max_ttft_ms, "ms"),
+    ]
+    if rss_growth is None:
+        print("rss growth     not measured (no /proc/self/statm)")
+    else:
+        checks.insert(1, ("rss growth", rss_growth / 1024, args.max_rss_kb_per_turn, "KB/turn"))
+    failed = False
+    for name, value, limit, unit in checks:
+        status = "ok" if value <= limit else "REGRESSION"
+        failed = failed or value > limit
+        print(f"{name:<14} {value:8.2f} {unit:<7}  (limit {limit:g} {unit})  {status}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
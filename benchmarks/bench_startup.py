@@ -0,0 +1,108 @@
+"""Startup time of the `sai` entry point, with a regression threshold.
+
+Measures the wall time until the first `> ` prompt is printed in a pseudo-terminal, and
+the cumulative import time of `app.session` reported by `python -X importtime`.
+Exits with status 1 when a median exceeds its threshold.
+
+Usage: python -m benchmarks.bench_startup [--runs N] [--max-prompt-ms MS] [--max-import-ms MS]
+"""
+
+import argparse
+import os
+import re
+import select
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.stub_server import StubServer
+
+ROOT = Path(__file__).resolve().parent.parent
+IMPORT_LINE = re.compile(r"import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)")
+PROMPT = b"> "
+
+
+def _environment(home: str) -> dict[str, str]:
+    env = dict(os.environ, HOME=home, PYTHONPATH=str(ROOT))
+    env.pop("PYTHONSTARTUP", None)
+    return env
+
+
+def time_to_prompt(home: str, timeout: float = 10.0) -> float:
+    """Seconds from process start to the first prompt in a pseudo-terminal."""
+    master, slave = os.openpty()
+    start = time.perf_counter()
+    process = subprocess.Popen(  # pylint: disable=consider-using-with
+        [sys.executable, "-m", "app"],
+        stdin=slave,
+        stdout=slave,
+        stderr=slave,
+        env=_environment(home),
+        close_fds=True,
+    )
+    os.close(slave)
+    output = b""
+    try:
+        while PROMPT not in output:
+            remaining = timeout - (time.perf_counter() - start)
+            if remaining <= 0:
+                raise TimeoutError(f"No prompt after {timeout}s: {output[-200:]!r}")
+            ready, _, _ = select.select([master], [], [], remaining)
+            if ready:
+                output += os.read(master, 4096)
+        return time.perf_counter() - start
+    finally:
+        process.kill()
+        process.wait()
+        os.close(master)
+
+
+def import_time(home: str, module: str = "app.session") -> float:
+    """Cumulative import time of `module` in seconds, from `-X importtime`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=_environment(home),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match and match.group(3) == module:
+            return int(match.group(1)) / 1_000_000
+    raise ValueError(f"{module} not found in -X importtime output")
+
+
+def main() -> None:
+    """Run the startup benchmarks and fail on regressions."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--max-prompt-ms", type=float, default=600.0)
+    parser.add_argument("--max-import-ms", type=float, default=600.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home, StubServer() as server:
+        config_dir = Path(home) / ".sai"
+        config_dir.mkdir()
+        (config_dir / "config.toml").write_text(
+            f'[ollama]\nbase_url = "{server.url}"\nmodel = "stub:latest"\n', encoding="utf-8"
+        )
+        prompt = statistics.median(time_to_prompt(home) for _ in range(args.runs)) * 1000
+        imports = statistics.median(import_time(home) for _ in range(args.runs)) * 1000
+
+    failed = False
+    for name, value, limit in (
+        ("time to prompt", prompt, args.max_prompt_ms),
+        ("import app.session", imports, args.max_import_ms),
+    ):
+        status = "ok" if value <= limit else "REGRESSION"
+        failed = failed or value > limit
+        print(f"{name:<20} {value:8.1f} ms  (limit {limit:.0f} ms)  {status}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Client time-to-first-token and streaming throughput of `OllamaHandler`, with thresholds.
+
+Streams from the stub server with a fixed server latency, so the client overhead is the
+time to first token minus that latency. The stream is also read cut into small byte
+chunks that split NDJSON lines, as a proxy or a slow network may deliver it.
+
+Usage: python -m benchmarks.bench_ttft [--turns N] [--latency S] [--max-overhead-ms MS]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from typing import Any
+
+from app.llm import ContentDelta, OllamaHandler
+from benchmarks.stub_server import StubServer
+
+PAYLOAD: dict[str, Any] = {
+    "model": "stub:latest",
+    "messages": [{"role": "user", "content": "hi"}],
+}
+
+
+async def _measure(url: str, turns: int) -> tuple[list[float], list[float]]:
+    """Time to first token and total time of each turn, over one pooled handler."""
+    handler = OllamaHandler(url=url, timeout=60)
+    ttfts: list[float] = []
+    totals: list[float] = []
+    try:
+        for _ in range(turns):
+            started = time.perf_counter()
+            ttft = 0.0
+            async for event in handler.stream_response(PAYLOAD):
+                if isinstance(event, ContentDelta) and not ttft:
+                    ttft = time.perf_counter() - started
+            ttfts.append(ttft)
+            totals.append(time.perf_counter() - started)
+    finally:
+        await handler.aclose()
+    return ttfts, totals
+
+
+def run(turns: int, latency: float, tokens: int, chunk_size: int) -> tuple[float, float]:
+    """Median client overhead to the first token in ms, and tokens/s received."""
+    with StubServer(tokens=tokens, latency=latency, chunk_size=chunk_size) as server:
+        ttfts, totals = asyncio.run(_measure(server.url, turns))
+    overhead = (statistics.median(ttfts) - latency) * 1000
+    return overhead, tokens / statistics.median(totals)
+
+
+def main() -> None:
+    """Run the time-to-first-token benchmark and fail on regressions."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.01, help="server delay in seconds")
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--max-overhead-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    failed = False
+    for name, chunk_size in (("whole lines", 0), ("split lines", 7)):
+        overhead, rate = run(args.turns, args.latency, args.tokens, chunk_size)
+        status = "ok" if overhead <= args.max_overhead_ms else "REGRESSION"
+        failed = failed or overhead > args.max_overhead_ms
+        print(
+            f"{name:<12} ttft overhead p50 {overhead:7.2f} ms  {rate:9.0f} tok/s  "
+            f"(limit {args.max_overhead_ms:.0f} ms)  {status}"
+        )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""Minimal Ollama stand-in server used by the benchmarks.
+
+It can also be run on its own, to point `sai` at it instead of a real Ollama:
+
+Usage: python -m benchmarks.stub_server [--port PORT] [--tokens N] [--token-rate TOK_S]
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Self
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves `/api/tags`, `/api/ps`, `/api/show`, `/api/embed` and `/api/chat`, streaming
+    chat answers by default.
+
+    Everything is served over keep-alive HTTP/1.1.
+    """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: "StubServer"
+
+    def log_message(self, format: str, *args: Any) -> None:  # pylint: disable=redefined-builtin
+        """Silence request logging."""
+
+    def _send_json(self, data: dict[str, Any]) -> None:
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Handle model listing."""
+        if self.server.failing:
+            self.send_error(503)
+        elif self.path == "/api/tags":
+            models = [self.server.tags_entry(name) for name in self.server.models]
+            self._send_json({"models": models})
+        elif self.path == "/api/ps":
+            self._send_json({"models": [{"model": name} for name in sorted(self.server.loaded)]})
+        else:
+            self.send_error(404)
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        """Handle chat, embedding and model detail requests, streaming NDJSON when messages
+        are given."""
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if self.path not in ("/api/chat", "/api/embed", "/api/show"):
+            self.send_error(404)
+            return
+        if self.server.failing:
+            self.send_error(503)
+            return
+        if payload.get("model") not in self.server.models:
+            self.send_response(404)
+            body = json.dumps({"error": f"model '{payload.get('model')}' not found"}).encode()
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path == "/api/show":
+            self.server.show_requests += 1
+            self._send_json(
+                {
+                    "details": self.server.tags_entry(payload["model"])["details"],
+                    "model_info": {"stub.context_length": self.server.context_length},
+                }
+            )
+            return
+        self.server.loaded.add(payload["model"])
+        self.server.requests += 1
+        if self.path == "/api/embed":
+            inputs = payload.get("input", [])
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            embeddings = [self.server.embedding(text) for text in inputs]
+            self._send_json({"model": payload["model"], "embeddings": embeddings})
+            return
+        if not payload.get("messages"):
+            self._send_json({"model": payload.get("model"), "done": True})
+            return
+        if payload.get("stream") is False:
+            time.sleep(self.server.latency)
+            count = payload.get("options", {}).get("num_predict", self.server.tokens)
+            content = "".join(f"tok{i} " for i in range(count))
+            self._send_json(
+                {
+                    "message": {"role": "assistant", "content": content},
+                    "done": True,
+                    "prompt_eval_count": 10,
+                    "prompt_eval_duration": max(1, int(self.server.latency * 1e9)),
+                    "eval_count": count,
+                }
+            )
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            self._stream_tokens()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _write_lines(self, lines: bytes) -> None:
+        """Send NDJSON lines, cut into pieces of `chunk_size` bytes when it is set."""
+        size = self.server.chunk_size or len(lines)
+        for start in range(0, len(lines), size):
+            self._write_chunk(lines[start : start + size])
+
+    def _stream_tokens(self) -> None:
+        started = time.perf_counter()
+        time.sleep(self.server.latency)
+        eval_started = time.perf_counter()
+        pending: list[bytes] = []
+        for i in range(self.server.tokens):
+            line = {"message": {"role": "assistant", "content": f"tok{i} "}, "done": False}
+            pending.append(json.dumps(line).encode() + b"\n")
+            if len(pending) >= self.server.lines_per_write:
+                self._write_lines(b"".join(pending))
+                pending.clear()
+            if self.server.token_delay:
+                time.sleep(self.server.token_delay)
+        eval_duration = max(1, int((time.perf_counter() - eval_started) * 1e9))
+        done = {
+            "message": {"content": ""},
+            "done": True,
+            "total_duration": int((time.perf_counter() - started) * 1e9),
+            "load_duration": 100_000,
+            "prompt_eval_count": 10,
+            "prompt_eval_duration": 200_000,
+            "eval_count": self.server.tokens,
+            "eval_duration": eval_duration,
+        }
+        pending.append(json.dumps(done).encode() + b"\n")
+        self._write_lines(b"".join(pending))
+        self._write_chunk(b"")
+
+
+class StubServer(ThreadingHTTPServer):
+    """Threaded stub server running in the background on a random local port.
+
+    `latency` is the delay before the first token and `token_delay` the delay between
+    tokens. `lines_per_write` NDJSON lines are written at once, and with
+    `chunk_size`, writes are cut into pieces of that many bytes regardless of line
+    boundaries, like a proxy or a slow network may do. Chat requests with `stream: false`
+    get one JSON answer after `latency`, reported as the prompt evaluation time, with
+    `num_predict` tokens when set. Embeddings are deterministic unit vectors of
+    `embed_dim` dimensions derived from the text. `/api/show` reports `context_length`.
+    """
+
+    daemon_threads = True
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        models: list[str] | None = None,
+        tokens: int = 20,
+        latency: float = 0.0,
+        token_delay: float = 0.0,
+        lines_per_write: int = 1,
+        chunk_size: int = 0,
+        embed_dim: int = 768,
+        context_length: int = 8192,
+        port: int = 0,
+    ) -> None:
+        super().__init__(("127.0.0.1", port), StubHandler)
+        self.models = models or ["stub:latest"]
+        self.tokens = tokens
+        self.latency = latency
+        self.token_delay = token_delay
+        self.lines_per_write = max(1, lines_per_write)
+        self.chunk_size = chunk_size
+        self.embed_dim = embed_dim
+        self.context_length = context_length
+        self.failing = False
+        self.loaded: set[str] = set()
+        self.requests = 0
+        self.show_requests = 0
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """Base URL of the running server."""
+        host, port = self.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def tags_entry(self, name: str) -> dict[str, Any]:
+        """`/api/tags` entry of a model, with a digest derived from its name."""
+        return {
+            "model": name,
+            "digest": hashlib.sha256(name.encode()).hexdigest(),
+            "size": 1_000_000_000,
+            "details": {"family": "stub", "quantization_level": "Q4_0"},
+        }
+
+    def embedding(self, text: str) -> list[float]:
+        """Deterministic unit vector for a text."""
+        seed = hashlib.sha256(text.encode()).digest()
+        values: list[float] = []
+        counter = 0
+        while len(values) < self.embed_dim:
+            block = hashlib.sha256(seed + counter.to_bytes(4, "little")).digest()
+            values.extend(value / 2**31 - 1 for value in struct.unpack("<8I", block))
+            counter += 1
+        del values[self.embed_dim :]
+        norm = math.sqrt(sum(value * value for value in values)) or 1.0
+        return [value / norm for value in values]
+
+    def __enter__(self) -> Self:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def main() -> None:
+    """Serve until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--model", action="append", dest="models")
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to first token")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="tokens/s, 0 = no limit")
+    parser.add_argument("--lines-per-write", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=0)
+    args = parser.parse_args()
+
+    server = StubServer(
+        models=args.models,
+        tokens=args.tokens,
+        latency=args.latency,
+        token_delay=1 / args.token_rate if args.token_rate > 0 else 0.0,
+        lines_per_write=args.lines_per_write,
+        chunk_size=args.chunk_size,
+        port=args.port,
+    )
+    print(f"Serving {', '.join(server.models)} on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
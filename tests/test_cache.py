@@ -0,0 +1,97 @@
+"""Tests of `ResponseCache.stream` with answers read to the end or rejected on the way."""
+
+import asyncio
+from collections.abc import AsyncGenerator
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app.cache import ResponseCache
+from app.llm import ContentDelta, StreamDone, StreamEvent
+from app.structured import JSONStreamValidator, StructuredOutputError, validate_stream
+
+PAYLOAD: dict[str, Any] = {
+    "model": "stub:latest",
+    "messages": [{"role": "user", "content": "hi"}],
+    "format": "json",
+}
+
+
+class FakeHandler:
+    """Handler that answers every request with the same text."""
+
+    def __init__(self, answer: str) -> None:
+        self.answer = answer
+        self.calls = 0
+        self.closed = 0
+
+    async def stream_response(self, payload: dict[str, Any]) -> AsyncGenerator[StreamEvent, Any]:
+        self.calls += 1
+        try:
+            for token in self.answer.split(" "):
+                yield ContentDelta(token)
+            yield StreamDone({"done": True, "eval_count": 3})
+        finally:
+            self.closed += 1
+
+
+async def _read(
+    cache: ResponseCache, handler: FakeHandler, validate: bool = False
+) -> list[StreamEvent]:
+    events = cache.stream(handler, PAYLOAD)  # type: ignore[arg-type]
+    if validate:
+        events = validate_stream(events, JSONStreamValidator())
+    return [event async for event in events]
+
+
+def test_answer_is_replayed(tmp_path: Path) -> None:
+    cache = ResponseCache(path=tmp_path / "cache.sqlite3")
+    handler = FakeHandler('{"a": 1}')
+    first = asyncio.run(_read(cache, handler))
+    second = asyncio.run(_read(cache, handler))
+    assert handler.calls == 1
+    assert "".join(e.text for e in second if isinstance(e, ContentDelta)) == '{"a":1}'
+    assert isinstance(first[-1], StreamDone) and isinstance(second[-1], StreamDone)
+    assert second[-1].cached
+    cache.close()
+
+
+def test_rejected_answer_is_not_stored(tmp_path: Path) -> None:
+    cache = ResponseCache(path=tmp_path / "cache.sqlite3")
+    handler = FakeHandler('{"a": 1')
+    for _ in range(2):
+        with pytest.raises(StructuredOutputError):
+            asyncio.run(_read(cache, handler, validate=True))
+    assert handler.calls == 2
+    assert cache.usage() == (0, 0)
+    cache.close()
+
+
+def test_unread_stream_is_not_stored(tmp_path: Path) -> None:
+    cache = ResponseCache(path=tmp_path / "cache.sqlite3")
+
+    async def read_until_done() -> None:
+        events = cache.stream(FakeHandler('{"a": 1}'), PAYLOAD)  # type: ignore[arg-type]
+        async for event in events:
+            if isinstance(event, StreamDone):
+                break
+        await events.aclose()
+
+    asyncio.run(read_until_done())
+    assert cache.usage() == (0, 0)
+    cache.close()
+
+
+def test_closing_the_stream_closes_the_request(tmp_path: Path) -> None:
+    cache = ResponseCache(path=tmp_path / "cache.sqlite3")
+    handler = FakeHandler('{"a": 1}')
+
+    async def read_first_event() -> int:
+        events = cache.stream(handler, PAYLOAD)  # type: ignore[arg-type]
+        await anext(events)
+        await events.aclose()
+        return handler.closed
+
+    assert asyncio.run(read_first_event()) == 1
+    cache.close()
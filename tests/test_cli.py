@@ -0,0 +1,64 @@
+"""Tests of the non-interactive mode: prompt input and output to a closed pipe."""
+
+import io
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from app.cli import EXIT_BROKEN_PIPE, build_prompt
+from benchmarks.stub_server import StubServer
+
+
+class Pipe(io.StringIO):
+    """Piped stdin that records whether it was read."""
+
+    read_called = False
+
+    def isatty(self) -> bool:
+        return False
+
+    def read(self, size: int | None = -1) -> str:
+        self.read_called = True
+        return super().read(size)
+
+
+def test_piped_input_is_the_prompt_without_p() -> None:
+    assert build_prompt(None, Pipe("diff")) == "diff"
+
+
+def test_p_does_not_read_stdin() -> None:
+    stdin = Pipe("input of a while-read loop")
+    assert build_prompt("hi", stdin) == "hi"
+    assert not stdin.read_called
+
+
+def test_dash_adds_stdin_and_a_path_adds_a_file(tmp_path: Path) -> None:
+    assert build_prompt("Summarize", Pipe("notes"), "-") == "Summarize\n\nnotes"
+    notes = tmp_path / "notes.md"
+    notes.write_text("file notes", encoding="utf-8")
+    stdin = Pipe("ignored")
+    assert build_prompt("Summarize", stdin, str(notes)) == "Summarize\n\nfile notes"
+    assert not stdin.read_called
+
+
+def test_closed_stdout_exits_quietly(tmp_path: Path) -> None:
+    (tmp_path / ".sai").mkdir()
+    with StubServer(tokens=20000) as server:
+        (tmp_path / ".sai" / "config.toml").write_text(
+            f'[ollama]\nbase_url = "{server.url}"\nmodel = "stub:latest"\n', encoding="utf-8"
+        )
+        env = {**os.environ, "HOME": str(tmp_path), "PYTHONPATH": os.getcwd()}
+        process = subprocess.Popen(
+            [sys.executable, "-m", "app", "-p", "hi", "--no-cache"],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=env,
+        )
+        assert process.stdout is not None and process.stderr is not None
+        assert process.stdout.read(20)
+        process.stdout.close()
+        stderr = process.stderr.read()
+        assert process.wait(timeout=30) == EXIT_BROKEN_PIPE
+    assert b"Traceback" not in stderr and b"BrokenPipe" not in stderr
@@ -0,0 +1,196 @@
+"""Tests of endpoint ranking, health tracking and failover against local stub servers."""
+
+import asyncio
+import socket
+import time
+from collections.abc import Iterator
+from contextlib import ExitStack, contextmanager
+
+import httpx
+import pytest
+
+from app.endpoints import BASE_BACKOFF, MAX_BACKOFF, Endpoint, EndpointPool
+from app.llm import ContentDelta, OllamaError, OllamaHandler, StreamDone, http2_available
+from benchmarks.stub_server import StubServer
+
+MODEL = "stub:latest"
+PAYLOAD = {"model": MODEL, "messages": [{"role": "user", "content": "hi"}]}
+
+
+def _closed_url() -> str:
+    """URL of a local port nothing listens on."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+@contextmanager
+def _servers(*models: list[str]) -> Iterator[list[StubServer]]:
+    with ExitStack() as stack:
+        yield [stack.enter_context(StubServer(models=names, tokens=3)) for names in models]
+
+
+def _handler(*urls: str) -> OllamaHandler:
+    return OllamaHandler(url=urls[0], timeout=5, endpoints=[Endpoint(url=url) for url in urls])
+
+
+async def _answer(handler: OllamaHandler) -> tuple[str, str]:
+    """Answer text and the host that served it."""
+    text, host = "", ""
+    async for event in handler.stream_response(PAYLOAD):
+        if isinstance(event, ContentDelta):
+            text += event.text
+        elif isinstance(event, StreamDone):
+            host = event.host
+    return text, host
+
+
+def test_ranking_prefers_loaded_then_available_then_least_loaded() -> None:
+    idle = Endpoint(url="idle", models={MODEL})
+    busy = Endpoint(url="busy", models={MODEL}, loaded={MODEL}, in_flight=4, weight=2.0)
+    loaded = Endpoint(url="loaded", models={MODEL}, loaded={MODEL}, in_flight=1)
+    other = Endpoint(url="other", models={"other:latest"})
+    ejected = Endpoint(url="ejected", models={MODEL}, loaded={MODEL})
+    ejected.mark_failure()
+    pool = EndpointPool([other, ejected, idle, busy, loaded])
+    assert [e.url for e in pool.ranked(MODEL)] == ["loaded", "busy", "idle", "other", "ejected"]
+
+
+def test_unknown_models_rank_by_load_in_config_order() -> None:
+    first, second, third = Endpoint(url="a"), Endpoint(url="b", in_flight=1), Endpoint(url="c")
+    assert [e.url for e in EndpointPool([first, second, third]).ranked(MODEL)] == ["a", "c", "b"]
+
+
+def test_backoff_doubles_up_to_the_limit_and_resets() -> None:
+    endpoint = Endpoint(url="a")
+    backoffs = []
+    for _ in range(10):
+        endpoint.mark_failure()
+        backoffs.append(endpoint.ejected_until - time.monotonic())
+        assert not endpoint.healthy
+    assert backoffs[0] == pytest.approx(BASE_BACKOFF, abs=0.1)
+    assert backoffs[1] == pytest.approx(2 * BASE_BACKOFF, abs=0.1)
+    assert backoffs[-1] == pytest.approx(MAX_BACKOFF, abs=0.1)
+    endpoint.mark_success()
+    assert endpoint.healthy and endpoint.failures == 0
+
+
+def test_routes_to_the_endpoint_with_the_model_loaded() -> None:
+    async def run(urls: list[str], servers: list[StubServer]) -> None:
+        servers[1].loaded.add(MODEL)
+        handler = _handler(*urls)
+        await handler.refresh_view()
+        assert await _answer(handler) == ("tok0 tok1 tok2 ", urls[1])
+        assert [server.requests for server in servers] == [0, 1]
+        await handler.aclose()
+
+    with _servers([MODEL], [MODEL]) as servers:
+        asyncio.run(run([server.url for server in servers], servers))
+
+
+def test_in_flight_is_released_after_a_complete_and_an_abandoned_stream() -> None:
+    async def run(url: str) -> None:
+        handler = _handler(url)
+        endpoint = handler.pool.primary
+        await _answer(handler)
+        assert endpoint.in_flight == 0
+        events = handler.stream_response(PAYLOAD)
+        await anext(events)
+        assert endpoint.in_flight == 1
+        await events.aclose()
+        assert endpoint.in_flight == 0
+        await handler.aclose()
+
+    with _servers([MODEL]) as (server,):
+        asyncio.run(run(server.url))
+
+
+def test_fails_over_on_server_errors_and_ejects_the_host() -> None:
+    async def run(urls: list[str]) -> None:
+        handler = _handler(*urls)
+        assert (await _answer(handler))[1] == urls[1]
+        failing = handler.pool.endpoints[0]
+        assert not failing.healthy and failing.failures >= 1 and failing.in_flight == 0
+        # The ejected host is tried last until it recovers.
+        assert handler.pool.ranked(MODEL)[-1] is failing
+        await handler.aclose()
+
+    with _servers([MODEL], [MODEL]) as servers:
+        servers[0].failing = True
+        asyncio.run(run([server.url for server in servers]))
+
+
+def test_fails_over_on_connection_errors() -> None:
+    async def run(urls: list[str]) -> None:
+        handler = _handler(*urls)
+        assert (await _answer(handler))[1] == urls[1]
+        assert not handler.pool.endpoints[0].healthy
+        await handler.aclose()
+
+    with _servers([MODEL]) as (server,):
+        asyncio.run(run([_closed_url(), server.url]))
+
+
+def test_missing_model_fails_over_without_ejecting() -> None:
+    async def run(urls: list[str]) -> None:
+        handler = _handler(*urls)
+        assert (await _answer(handler))[1] == urls[1]
+        assert handler.pool.endpoints[0].healthy
+        await handler.aclose()
+
+    with _servers(["other:latest"], [MODEL]) as servers:
+        asyncio.run(run([server.url for server in servers]))
+
+
+def test_not_found_is_reported_over_other_failures() -> None:
+    async def run(urls: list[str]) -> None:
+        handler = _handler(*urls)
+        with pytest.raises(OllamaError, match="not found"):
+            await _answer(handler)
+        await handler.aclose()
+
+    with _servers([MODEL], ["other:latest"]) as servers:
+        servers[0].failing = True
+        asyncio.run(run([server.url for server in servers]))
+
+
+def test_transport_error_is_raised_when_every_host_is_down() -> None:
+    async def run() -> None:
+        handler = _handler(_closed_url(), _closed_url())
+        with pytest.raises(httpx.TransportError):
+            await _answer(handler)
+        assert not any(endpoint.healthy for endpoint in handler.pool.endpoints)
+        await handler.aclose()
+
+    asyncio.run(run())
+
+
+def test_refresh_brings_a_recovered_host_back() -> None:
+    async def run(servers: list[StubServer]) -> None:
+        handler = _handler(*(server.url for server in servers))
+        await _answer(handler)
+        recovered = handler.pool.endpoints[0]
+        assert not recovered.healthy
+        servers[0].failing = False
+        await handler.refresh_view()
+        assert recovered.healthy and recovered.failures == 0
+        assert recovered.models == {MODEL}
+        await handler.aclose()
+
+    with _servers([MODEL], [MODEL]) as servers:
+        servers[0].failing = True
+        asyncio.run(run(servers))
+
+
+def test_http2_falls_back_with_one_warning_without_h2(
+    monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+) -> None:
+    monkeypatch.setattr("importlib.util.find_spec", lambda name: None)
+    http2_available.cache_clear()
+    try:
+        handlers = [OllamaHandler("http://127.0.0.1:1", 5, http2=True) for _ in range(2)]
+        assert not any(handler.http2 for handler in handlers)
+        assert capsys.readouterr().err.count("sai-chat[http2]") == 1
+    finally:
+        http2_available.cache_clear()
@@ -0,0 +1,67 @@
+"""Fuzz tests of `iter_ndjson` with streams split at random byte offsets."""
+
+import asyncio
+import json
+import random
+from collections.abc import AsyncIterator
+from typing import Any
+
+import pytest
+
+from app.llm import iter_ndjson
+
+MESSAGES: list[dict[str, Any]] = [
+    {"message": {"role": "assistant", "content": "Hello"}, "done": False},
+    {"message": {"role": "assistant", "content": " ñandú café 日本語 🤖🚀"}, "done": False},
+    {"message": {"role": "assistant", "content": 'quotes " and \\ and \n newlines'}},
+    {"message": {"role": "assistant", "content": ""}, "done": True, "eval_count": 42},
+]
+
+
+def _body(messages: list[dict[str, Any]], rng: random.Random) -> bytes:
+    """NDJSON body with blank lines here and there, and no newline after the last line."""
+    lines = [json.dumps(message, ensure_ascii=False).encode() for message in messages]
+    body = b""
+    for line in lines:
+        body += b"\n" * rng.randint(0, 2) + line + b"\n"
+    return body.rstrip(b"\n") if rng.random() < 0.5 else body
+
+
+def _split(data: bytes, rng: random.Random) -> list[bytes]:
+    """`data` cut at random offsets, including inside multi-byte UTF-8 characters."""
+    cuts = sorted(rng.sample(range(1, len(data)), k=rng.randint(0, min(30, len(data) - 1))))
+    return [data[start:end] for start, end in zip([0, *cuts], [*cuts, len(data)])]
+
+
+async def _chunks(parts: list[bytes]) -> AsyncIterator[bytes]:
+    for part in parts:
+        yield part
+
+
+async def _decode(parts: list[bytes]) -> list[dict[str, Any]]:
+    return [item async for item in iter_ndjson(_chunks(parts))]
+
+
+@pytest.mark.parametrize("seed", range(500))
+def test_random_splits(seed: int) -> None:
+    rng = random.Random(seed)
+    messages = rng.choices(MESSAGES, k=rng.randint(1, 12))
+    parts = _split(_body(messages, rng), rng)
+    assert asyncio.run(_decode(parts)) == messages
+
+
+def test_split_inside_multibyte_character() -> None:
+    data = json.dumps({"content": "🤖"}, ensure_ascii=False).encode() + b"\n"
+    emoji = data.index("🤖".encode())
+    for offset in range(emoji + 1, emoji + 4):
+        assert asyncio.run(_decode([data[:offset], data[offset:]])) == [{"content": "🤖"}]
+
+
+def test_one_byte_chunks() -> None:
+    data = b"\n".join(json.dumps(m, ensure_ascii=False).encode() for m in MESSAGES) + b"\n"
+    parts = [data[i : i + 1] for i in range(len(data))]
+    assert asyncio.run(_decode(parts)) == MESSAGES
+
+
+def test_blank_lines_only() -> None:
+    assert not asyncio.run(_decode([b"\n", b"  \n", b"\r\n"]))
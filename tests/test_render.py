@@ -0,0 +1,86 @@
+"""Tests of `IncrementalMarkdown` against a full render of the same Markdown."""
+
+import random
+import re
+
+import pytest
+from rich.console import Console
+from rich.markdown import Markdown
+from rich.segment import Segment
+
+from app.render import IncrementalMarkdown
+
+DOCUMENTS: list[str] = [
+    "Here is a list:\n\n- one\n- two\n  - nested\n- three\n\nAnd a closing line.\n",
+    "1. first\n2. second\n\n3. third\n\nText.\n\n1. again\n",
+    "Some code:\n\n```python\ndef f(x):\n\n    return x\n```\n\nDone.\n",
+    "> a quote\n> on two lines\n\n> another quote\n\nText after the quotes.\n",
+    "Intro.\n\n| name | value |\n|------|-------|\n| a    | 1     |\n| b    | 2     |\n\nEnd.\n",
+    "# Title\n\nA paragraph.\n\n---\n\nAfter the break.\n\n***\n",
+    "See [the docs][docs] and [home].\n\nMore text.\n\n[docs]: https://example.com/docs\n"
+    "[home]: https://example.com\n",
+    "- item\n\n> quote after a list\n\n~~~\nplain code\n~~~\n\n## Heading\n\ntext\n",
+]
+
+PIECES: list[str] = [
+    "Para words here **bold**.\n",
+    "\n",
+    "- item `x`\n",
+    "- item two\n",
+    "  - nested\n",
+    "1. first\n",
+    "2. second\n",
+    "```python\n",
+    "x = 1\n",
+    "    y = [1,\n",
+    "```\n",
+    "> quote\n",
+    "# Head\n",
+    "text line\n",
+    "~~~\n",
+    "---\n",
+    "| a | b |\n",
+    "[ref]: https://example.com\n",
+]
+
+
+def _text(lines: list[list[Segment]]) -> list[str]:
+    return ["".join(segment.text for segment in line).rstrip() for line in lines]
+
+
+def _streamed(document: str, rng: random.Random, console: Console) -> list[str]:
+    """Lines of `document` fed token by token, with a render after some of the tokens."""
+    renderer = IncrementalMarkdown(console)
+    for token in re.findall(r"\S+\s*|\s+", document):
+        renderer.append(token)
+        if rng.random() < 0.5:
+            renderer.render_lines(console.options)
+    assert renderer.text == document
+    return _text(renderer.render_lines(console.options))
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_documents_render_as_a_whole(document: str) -> None:
+    console = Console(width=60)
+    expected = _text(console.render_lines(Markdown(document), console.options))
+    assert _streamed(document, random.Random(0), console) == expected
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_random_documents(seed: int) -> None:
+    rng = random.Random(seed)
+    console = Console(width=50)
+    document = "".join(rng.choices(PIECES, k=rng.randint(3, 25)))
+    expected = _text(console.render_lines(Markdown(document), console.options))
+    assert _streamed(document, rng, console) == expected
+
+
+def test_link_definition_applies_to_rendered_blocks() -> None:
+    console = Console(width=60)
+    renderer = IncrementalMarkdown(console)
+    renderer.append("A [link][ref] here.\n\nNext paragraph.\n\n")
+    assert "[link][ref]" in "".join(_text(renderer.render_lines(console.options)))
+    renderer.append("[ref]: https://example.com\n")
+    lines = _text(renderer.render_lines(console.options))
+    assert lines == _text(console.render_lines(Markdown(renderer.text), console.options))
+    assert "[link][ref]" not in "".join(lines)
@@ -0,0 +1,72 @@
+"""Tests of the index files when `/index` runs in more than one process."""
+
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from app.retrieval import IndexedFile, IndexLockedError, VectorIndex
+
+np = pytest.importorskip("numpy")
+
+MODEL = "embed:latest"
+
+
+class FakeHandler:
+    """Handler that embeds texts as vectors derived from their length."""
+
+    async def embed(self, model: str, inputs: list[str]) -> list[list[float]]:
+        return [[float(len(text)), 1.0, 0.0] for text in inputs]
+
+
+def _sizes(index: VectorIndex) -> list[int]:
+    files = (index.vectors_file, index.chunks_file, index.offsets_file)
+    return [path.stat().st_size for path in files]
+
+
+def _append_unsaved(index: VectorIndex, key: str) -> None:
+    index.model = MODEL
+    index.add_file(key, IndexedFile(mtime=0.0, size=1, sha256=key), ["a", "b"], np.ones((2, 3)))
+
+
+def test_load_keeps_rows_of_a_running_index(tmp_path: Path) -> None:
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "note.txt").write_text("hello", encoding="utf-8")
+    writer = VectorIndex(tmp_path / "index")
+    with writer._locked():  # pylint: disable=protected-access
+        _append_unsaved(writer, "first")
+        writer.save()
+        _append_unsaved(writer, "second")
+        sizes = _sizes(writer)
+        reader = VectorIndex(tmp_path / "index")
+        assert _sizes(writer) == sizes
+        assert reader.count == 2
+        with pytest.raises(IndexLockedError):
+            asyncio.run(reader.add_path(FakeHandler(), docs, MODEL))  # type: ignore[arg-type]
+        assert _sizes(writer) == sizes
+        writer.save()
+
+    report = asyncio.run(reader.add_path(FakeHandler(), docs, MODEL))  # type: ignore[arg-type]
+    assert report.added == 1
+    assert set(reader.files) == {"first", "second", str((docs / "note.txt").resolve())}
+    assert reader.count == 5
+    assert _sizes(reader)[0] == 5 * 3 * 4
+
+
+def test_add_path_drops_rows_of_an_interrupted_index(tmp_path: Path) -> None:
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "note.txt").write_text("hello", encoding="utf-8")
+    crashed = VectorIndex(tmp_path / "index")
+    _append_unsaved(crashed, "first")
+    crashed.save()
+    _append_unsaved(crashed, "lost")
+
+    index = VectorIndex(tmp_path / "index")
+    asyncio.run(index.add_path(FakeHandler(), docs, MODEL))  # type: ignore[arg-type]
+    assert "lost" not in index.files
+    assert index.count == 3
+    assert _sizes(index)[0] == 3 * 3 * 4
+    (result,) = index.nearest(np.array([5.0, 1.0, 0.0]), k=1)
+    assert result.text == "hello"